@@ -4,6 +4,58 @@ import { supabase } from '../lib/supabase'
 
 const router = express.Router()
 
+const rawUrl = process.env.ML_ENGINE_URL || 'http://localhost:5001'
+const ML_ENGINE_URL = rawUrl.startsWith('http') ? rawUrl : `http://${rawUrl}`
+const ML_SERIES_URL = `${ML_ENGINE_URL}/api/series`
+
+// 7-day rolling average from the ML engine's in-memory series store, or
+// null when the engine is down or the store doesn't hold the whole window
+// (it is per worker and only sees points pushed since startup)
+async function mlRollingAvg(warehouseId: string, metricId: string): Promise<number | null> {
+    try {
+        const params = new URLSearchParams({ warehouse_id: warehouseId, metric_id: metricId })
+        const res = await fetch(`${ML_SERIES_URL}?${params}`)
+        if (!res.ok) return null
+        const series: any = await res.json()
+        const week = series.windows?.['7d']
+        if (week?.complete !== true) return null
+        return typeof week.mean === 'number' ? +week.mean.toFixed(2) : null
+    } catch (err) {
+        return null
+    }
+}
+
+// Keep the ML engine's series store current with a new snapshot (best effort)
+function pushSnapshotToML(snapshot: any) {
+    fetch(`${ML_SERIES_URL}/ingest`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ snapshots: [snapshot] })
+    }).catch(() => { /* the engine reloads history from exports on restart */ })
+}
+
+// Rolling 7-day average of one metric, scanning metric_snapshots
+async function dbRollingAvg(warehouseId: string, metricId: string) {
+    const startDate = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString()
+    const { data: snapshots, error } = await supabase
+        .from('metric_snapshots')
+        .select('timestamp, metric_tree')
+        .eq('warehouse_id', warehouseId)
+        .gte('timestamp', startDate)
+
+    // Extract the specific metric scores from each snapshot
+    const scores: number[] = []
+    for (const snap of (snapshots || [])) {
+        const metricData = snap.metric_tree?.[metricId]
+        if (metricData && metricData.score !== undefined) {
+            scores.push(metricData.score)
+        }
+    }
+
+    const avg = scores.length > 0 ? +(scores.reduce((a, b) => a + b, 0) / scores.length).toFixed(2) : 0
+    return { avg, error }
+}
+
 // GET /api/admin/warehouses - Get all warehouses for admin
 router.get('/warehouses', async (req: Request, res: Response) => {
     try {
@@ -89,30 +141,17 @@ router.post('/warehouse-setup', async (req: Request, res: Response) => {
         // 2. Process Metrics (Calculate Rolling Avg & Predicted Score)
         const { metric_id, staff_count, hours_of_day, day_of_week, order_volume } = metrics
 
-        // Fetch last 7 days of snapshots for rolling avg
-        const startDate = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString()
-        const { data: snapshots } = await supabase
-            .from('metric_snapshots')
-            .select('timestamp, metric_tree')
-            .eq('warehouse_id', warehouse.id)
-            .gte('timestamp', startDate)
-
-        const scores: number[] = []
-        for (const snap of (snapshots || [])) {
-            const metricData = snap.metric_tree?.[metric_id]
-            if (metricData && metricData.score !== undefined) {
-                scores.push(metricData.score)
-            }
-        }
-
-        const rolling_7d_avg = scores.length > 0 ? +(scores.reduce((a, b) => a + b, 0) / scores.length).toFixed(2) : 0
+        // Rolling avg from the ML engine's series store if it holds the whole
+        // window, else the last 7 days of snapshots
+        const rolling_7d_avg = await mlRollingAvg(warehouse.id, metric_id)
+            ?? (await dbRollingAvg(warehouse.id, metric_id)).avg
 
         // Calculate Prediction via ML Engine (score.py)
         let predicted_score = 0
         let status = 'active'
 
         try {
-            const mlRes = await fetch('http://localhost:5001/api/calculate-score', {
+            const mlRes = await fetch(`${ML_ENGINE_URL}/api/calculate-score`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -238,13 +277,15 @@ router.post('/warehouse-setup', async (req: Request, res: Response) => {
             }
         }
 
-        await supabase.from('metric_snapshots').insert({
+        const newSnapshot = {
             warehouse_id: warehouse.id,
             timestamp: new Date().toISOString(),
             root_score: predicted_score,
             root_status: status,
             metric_tree: metricTree
-        })
+        }
+        await supabase.from('metric_snapshots').insert(newSnapshot)
+        pushSnapshotToML(newSnapshot)
 
         res.json({
             message: 'Warehouse and metrics updated successfully',
@@ -316,29 +357,15 @@ router.post('/rolling-avg', async (req: Request, res: Response) => {
             return res.status(400).json({ error: 'All fields are required: warehouse_id, metric_id, staff_count, hours_of_day, day_of_week' })
         }
 
-        // Fetch last 7 days of snapshots for this warehouse
-        const startDate = new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString()
-        const { data: snapshots, error } = await supabase
-            .from('metric_snapshots')
-            .select('timestamp, metric_tree')
-            .eq('warehouse_id', warehouse_id)
-            .gte('timestamp', startDate)
-            .order('timestamp', { ascending: true })
-
-        if (error) return res.status(500).json({ error: error.message })
-
-        // Extract the specific metric scores from each snapshot
-        const scores: number[] = []
-        for (const snap of (snapshots || [])) {
-            const metricData = snap.metric_tree?.[metric_id]
-            if (metricData && metricData.score !== undefined) {
-                scores.push(metricData.score)
-            }
+        // Rolling 7-day average: ML engine series store when it covers the
+        // window, database scan otherwise
+        let rolling_7d_avg = await mlRollingAvg(warehouse_id, metric_id)
+        if (rolling_7d_avg === null) {
+            const { avg, error } = await dbRollingAvg(warehouse_id, metric_id)
+            if (error) return res.status(500).json({ error: error.message })
+            rolling_7d_avg = avg
         }
 
-        // Calculate rolling 7-day average
-        const rolling_7d_avg = scores.length > 0 ? +(scores.reduce((a, b) => a + b, 0) / scores.length).toFixed(2) : 0
-
         // Operational factor: adjust prediction based on staffing and time
         // More staff → higher score, peak hours (10-18) → higher throughput
         const staffFactor = Math.min(staff_count / 50, 1.2)  // normalized around 50 staff
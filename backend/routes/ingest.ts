@@ -3,6 +3,9 @@ import { supabase } from '../lib/supabase'
 
 const router = express.Router()
 
+const rawUrl = process.env.ML_ENGINE_URL || 'http://localhost:5001'
+const ML_ENGINE_URL = rawUrl.startsWith('http') ? rawUrl : `http://${rawUrl}`
+
 // POST /api/ingest
 router.post('/', async (req: Request, res: Response) => {
   try {
@@ -55,6 +58,31 @@ router.post('/', async (req: Request, res: Response) => {
       return res.status(500).json({ error: 'Failed to ingest data' })
     }
 
+    // Keep the ML engine's rolling-window series store current (best effort)
+    fetch(`${ML_ENGINE_URL}/api/series/ingest`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ snapshots: [snapshot] })
+    }).catch(() => { /* the engine reloads history from exports on restart */ })
+
+    // Feed the event to the ML engine's online detector without holding up
+    // the ingest response on it (best effort)
+    const controller = new AbortController()
+    const timeout = setTimeout(() => controller.abort(), 2000)
+    fetch(`${ML_ENGINE_URL}/api/detector/events`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        events: [{ warehouse_id, metric_id, value: parseFloat(score), timestamp: snapshot.timestamp }]
+      }),
+      signal: controller.signal
+    })
+      .then((mlRes) => {
+        if (!mlRes.ok) console.warn(`Online anomaly detector update failed: HTTP ${mlRes.status}`)
+      })
+      .catch((err) => console.warn('Online anomaly detector unavailable:', err))
+      .finally(() => clearTimeout(timeout))
+
     res.status(201).json({
       message: 'Data successfully ingested and analyzed',
       data: {
@@ -196,16 +196,20 @@ router.post('/sync', async (req: Request, res: Response) => {
         const oa_score = tree.oa?.score ?? 95
         const dfr_score = tree.dfr?.score ?? 97
 
-        // 3. Run ML predictions in parallel
-        const [wptResult, otdResult, poiActualResult] = await Promise.allSettled([
-            proxyToML('/api/predict/wpt', { label_score, pick_score, pack_score }),
-            proxyToML('/api/predict/otd', { label_score, pick_score, pack_score, wpt_score_actual: tree.wpt?.score ?? 75, tt_score }),
-            proxyToML('/api/predict/poi-actual', { label_score, pick_score, pack_score, wpt_score_actual: tree.wpt?.score ?? 75, tt_score }),
-        ])
+        // 3. Run the WPT -> OTD / POI Actual cascade in a single ML call,
+        //    chaining the predicted WPT into the OTD and POI models
+        let cascade: any = null
+        try {
+            cascade = await proxyToML('/api/predict/cascade', {
+                label_score, pick_score, pack_score, tt_score, oa_score, dfr_score, warehouse_id,
+            })
+        } catch (error) {
+            console.error('ML cascade error:', error)
+        }
 
-        const predictedWpt = wptResult.status === 'fulfilled' ? wptResult.value.wpt_score : tree.wpt?.score ?? 0
-        const predictedOtd = otdResult.status === 'fulfilled' ? otdResult.value.otd_score : tree.otd?.score ?? 0
-        const predictedPoiActual = poiActualResult.status === 'fulfilled' ? poiActualResult.value.poi_actual_score : tree.poi?.score ?? 0
+        const predictedWpt = cascade ? cascade.wpt_score : tree.wpt?.score ?? 0
+        const predictedOtd = cascade ? cascade.otd_score : tree.otd?.score ?? 0
+        const predictedPoiActual = cascade ? cascade.poi_actual_score : tree.poi?.score ?? 0
 
         // 4. Determine statuses
         const getStatus = (score: number) => score >= 80 ? 'healthy' : score >= 60 ? 'warn' : 'critical'
@@ -309,9 +313,9 @@ router.post('/sync', async (req: Request, res: Response) => {
                 label: label_score,
             },
             modelsUsed: {
-                wpt: wptResult.status === 'fulfilled',
-                otd: otdResult.status === 'fulfilled',
-                poiActual: poiActualResult.status === 'fulfilled',
+                wpt: cascade !== null,
+                otd: cascade !== null,
+                poiActual: cascade !== null,
             }
         })
 
@@ -1,5 +1,5 @@
 from flask import Flask, request, jsonify
-import pandas as pd
+from datetime import datetime
 import sys
 import os
 
@@ -11,9 +11,24 @@ try:
     print("Successfully imported calculate_score function")
 except ImportError as e:
     print(f"Error importing calculate_score: {e}")
-    def calculate_score(data):
+    def calculate_score(data, rolling_avg=None):
         return 75.0  # Fallback score
 
+# Rolling 7-day averages per (warehouse, metric), loaded from a
+# metric_snapshots export when ML_SERIES_SNAPSHOTS is set
+SERIES = None
+try:
+    from timeseries import TimeSeriesStore
+    SERIES = TimeSeriesStore()
+    if os.environ.get('ML_SERIES_SNAPSHOTS'):
+        SERIES.load_file(os.environ['ML_SERIES_SNAPSHOTS'])
+except (ImportError, OSError, ValueError) as e:
+    print(f"Error loading rolling averages: {e}")
+
+
+def lookup_rolling_avg(warehouse_id, metric_id):
+    return SERIES.mean(warehouse_id, metric_id) if SERIES is not None else None
+
 app = Flask(__name__)
 
 @app.route('/api/calculate-score', methods=['POST'])
@@ -26,19 +41,20 @@ def calculate_score_endpoint():
             return jsonify({'error': 'No data provided'}), 400
         
         # Calculate score using the function from score.py
-        score = calculate_score(data)
+        score = calculate_score(data, lookup_rolling_avg)
         
-        # Calculate rolling 7-day average if we have historical data
+        # Rolling 7-day average from the series store, if it has the metric
         rolling_avg = None
-        if 'orders_volume' in data:
-            # Simplified rolling average calculation
-            # In production, this would query actual historical data
+        if 'warehouse_id' in data and 'metric_id' in data:
+            rolling_avg = lookup_rolling_avg(data['warehouse_id'], data['metric_id'])
+        if rolling_avg is None and 'orders_volume' in data:
+            # Simplified rolling average when there's no history
             rolling_avg = data.get('orders_volume', 100) * 0.9
         
         response = {
             'score': float(score),
             'rolling_avg_7d': rolling_avg,
-            'timestamp': pd.Timestamp.now().isoformat(),
+            'timestamp': datetime.now().isoformat(),
             'formula_used': 'Score = (0.4 * normalized_volume) + (0.3 * staff_efficiency) + (0.2 * rolling_avg_7d) + (0.1 * time_factor)'
         }
         
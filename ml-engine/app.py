@@ -4,14 +4,42 @@ Serves trained ML models for anomaly detection, z-score forecasting,
 root cause classification, and score predictions.
 """
 
+import json
 import os
 import pickle
+import sys
+import threading
+import time
 import traceback
-from flask import Flask, request, jsonify
+
+# Start of this module's import, for the startup report (see startup_report)
+IMPORT_STARTED = time.perf_counter()
+
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from score import calculate_score
+from score import calculate_score, calculate_scores
+from encoder import CompiledPipeline, SharedFeatureView, compile_pipeline
+from forest import flatten_forest, predict_votes
+from artifacts import artifact_path, load_artifact, share_encoder
+from cache import MISS, PredictionCache
+from batcher import MicroBatcher
+from registry import ModelRegistry
+from timeseries import TimeSeriesStore
+from detector import OnlineAnomalyDetector
+import metrics
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that records response serialization time."""
+
+    def dumps(self, obj, **kwargs):
+        with metrics.stage("serialize"):
+            return super().dumps(obj, **kwargs)
+
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)
 
 # =====================
@@ -19,59 +47,753 @@ CORS(app)
 # =====================
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "saved_models")
 
+# Encode request features with the compiled numpy encoder instead of the
+# pipeline's ColumnTransformer (set ML_COMPILED_FEATURES=0 to disable)
+COMPILED_FEATURES = os.environ.get("ML_COMPILED_FEATURES", "1") == "1"
 
-def load_model(filename):
-    """Safely load a pickle model file."""
+# Forest inference engine: "flat" evaluates the exported node arrays with
+# numpy (forest.py), "sklearn" calls the pickled estimator's predict
+INFERENCE_ENGINE = os.environ.get("ML_INFERENCE_ENGINE", "flat")
+
+
+# (artifact path, artifact mtime) already warned about as stale
+_STALE_WARNED = set()
+
+
+def resolve_model_path(filename, warn=True):
+    """
+    Path of the file to load for a model. A memory-mapped .flat artifact
+    next to the pickle (see artifacts.py) is preferred when the flat engine
+    and compiled features are both enabled and the artifact is not older
+    than the pickle. warn=False keeps quiet about a missing file.
+    """
     path = os.path.join(MODELS_DIR, filename)
+    flat_path = artifact_path(path)
+    if COMPILED_FEATURES and INFERENCE_ENGINE == "flat" and os.path.exists(flat_path):
+        flat_mtime = os.path.getmtime(flat_path)
+        if not os.path.exists(path) or flat_mtime >= os.path.getmtime(path):
+            return flat_path
+        # The watcher resolves every poll; say it once per artifact version
+        stale = (flat_path, flat_mtime)
+        if stale not in _STALE_WARNED:
+            _STALE_WARNED.add(stale)
+            print(f"[WARN] Stale artifact ignored (older than pickle): {flat_path}")
     if os.path.exists(path):
-        with open(path, "rb") as f:
-            return pickle.load(f)
-    print(f"[WARN] Model not found: {path}")
+        return path
+    if warn:
+        print(f"[WARN] Model not found: {path}")
     return None
 
 
-# Global model cache
-MODEL_CACHE = {}
+def read_model(path):
+    """Load a .flat artifact or a pickle file."""
+    if path.endswith(".flat"):
+        return load_artifact(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def load_model(filename):
+    """Safely load a model file."""
+    path = resolve_model_path(filename)
+    return read_model(path) if path else None
+
+
+# Map friendly names to filenames
+MODEL_FILES = {
+    "anomaly": "Anomaly_model.pkl",
+    "z_score": "z_model.pkl",
+    "root_cause": "root_cause_model.pkl",
+    "poi": "poi_model.pkl",
+    "poi_actual": "model_poi_actual_score.pkl",
+    "wpt": "model_wpt.pkl",
+    "otd": "model_otd.pkl",
+    "anomaly_joint": "anomaly_joint_model.pkl",
+}
+
+# Models only trained on request (ML_TRAIN_JOINT=1 in train_all.py); their
+# absence is normal, and the routes fall back to the separate models
+OPTIONAL_MODELS = {"anomaly_joint"}
+
+# Per-row prediction cache (ML_CACHE_SIZE=0 disables it). ML_CACHE_PRECISION
+# rounds numeric features to that many decimals before keying, so
+# near-identical payloads share an entry.
+_precision = os.environ.get("ML_CACHE_PRECISION")
+PREDICTION_CACHE = PredictionCache(
+    max_size=int(os.environ.get("ML_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("ML_CACHE_TTL", 300)),
+    precision=int(_precision) if _precision else None,
+)
+
+# Coalesce concurrent single-row predictions per model into one batched
+# call (ML_MICROBATCH=1); only useful with threaded workers
+MICROBATCH = os.environ.get("ML_MICROBATCH", "0") == "1"
+BATCHER = MicroBatcher(
+    max_batch=int(os.environ.get("ML_MICROBATCH_SIZE", 64)),
+    max_wait=float(os.environ.get("ML_MICROBATCH_WAIT_MS", 2)) / 1000,
+)
+
+# Warm-up state reported by /api/health: "lazy" (no preload requested),
+# "warming" (preload_models running) or "ready"
+WARMUP_STATE = "lazy"
+
 
 def get_model(model_name):
-    """Lazy load a model and cache it."""
-    if model_name in MODEL_CACHE:
-        return MODEL_CACHE[model_name]
-    
-    # Map friendly names to filenames
-    model_files = {
-        "anomaly": "Anomaly_model.pkl",
-        "z_score": "z_model.pkl",
-        "root_cause": "root_cause_model.pkl",
-        "poi": "poi_model.pkl",
-        "poi_actual": "model_poi_actual_score.pkl",
-        "wpt": "model_wpt.pkl",
-        "otd": "model_otd.pkl"
+    """Lazy load a model and cache it (current version from the registry)."""
+    return REGISTRY.get(model_name)
+
+
+def warm_model(model):
+    """Run one dummy prediction (all features imputed) through a model."""
+    row = {name: float("nan") for name in model.feature_names_in_}
+    features = model_input(model, [row])
+    model.predict(features)
+    if hasattr(model, "predict_proba"):
+        model.predict_proba(features)
+
+
+# Heavy libraries the serving path doesn't import until first use. The
+# ones in ML_WARM_IMPORTS are imported by preload_models() instead, so
+# under gunicorn the master pays for them once before forking and no
+# request does. pandas is only needed for sklearn pipelines and
+# calculate-score; sklearn is pulled in by unpickling .pkl models.
+HEAVY_MODULES = ["pandas", "sklearn", "scipy"]
+WARM_IMPORTS = [name for name in os.environ.get("ML_WARM_IMPORTS", "pandas").split(",") if name]
+STARTUP = {"import_seconds": None, "warm_imports": {}}
+
+
+def warm_imports():
+    """Import the deferred heavy modules now, recording how long each took."""
+    import importlib
+
+    for name in WARM_IMPORTS:
+        if name in STARTUP["warm_imports"]:
+            continue
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"[WARN] Could not warm import {name}: {e}")
+            continue
+        STARTUP["warm_imports"][name] = round(time.perf_counter() - start, 3)
+
+
+def startup_report():
+    """Import time of app.py, warm-up imports and which heavy modules are loaded."""
+    return {
+        "import_seconds": STARTUP["import_seconds"],
+        "warm_imports": dict(STARTUP["warm_imports"]),
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules],
     }
-    
-    filename = model_files.get(model_name)
-    if not filename:
+
+
+def preload_models():
+    """
+    Load, compile and warm every model up front. Under gunicorn this runs
+    in the master before workers fork (see gunicorn.conf.py), so the model
+    arrays are shared copy-on-write instead of loaded once per worker.
+    """
+    global WARMUP_STATE
+    WARMUP_STATE = "warming"
+    start = time.time()
+    warm_imports()
+    for model_name in MODEL_FILES:
+        get_model(model_name)  # the registry warms each model as it loads
+    WARMUP_STATE = "ready"
+    loaded = [name for name, model in MODEL_CACHE.items() if model is not None]
+    print(f"[OK] Preloaded {len(loaded)}/{len(MODEL_FILES)} models in {time.time() - start:.1f}s")
+
+
+def compile_model(model_name, pipeline):
+    """Swap in the compiled encoder and/or flat forest engine as configured."""
+    if isinstance(pipeline, CompiledPipeline):
+        return pipeline  # already compiled (memory-mapped artifact)
+    flat = INFERENCE_ENGINE == "flat"
+    if not (COMPILED_FEATURES or flat):
+        return pipeline
+    try:
+        estimator = flatten_forest(pipeline.steps[-1][1]) if flat else None
+        return compile_pipeline(pipeline, compiled_features=COMPILED_FEATURES, estimator=estimator)
+    except (ValueError, AttributeError) as e:
+        print(f"[WARN] Could not compile {model_name}, using sklearn pipeline: {e}")
+        return pipeline
+
+
+def model_input(model, rows):
+    """
+    Shape a list of feature dicts for a model: compiled pipelines encode
+    the dicts directly, sklearn pipelines need a DataFrame.
+    """
+    if isinstance(model, CompiledPipeline):
+        return rows
+    import pandas as pd
+    return pd.DataFrame(rows)
+
+
+class SharedEncoding:
+    """
+    Feature rows encoded at most once per shared preprocessor. Models that
+    are SharedFeatureViews of the same encoder (e.g. anomaly and z-score)
+    take their columns of one matrix instead of each encoding the rows.
+    """
+
+    def __init__(self, rows, matrices=None):
+        self.rows = rows
+        # id(shared encoder) -> (shared encoder, matrix)
+        self._matrices = {} if matrices is None else matrices
+        self._lock = threading.Lock()
+
+    def matrix(self, model):
+        """model's feature matrix for the rows, or None if it has no shared encoder."""
+        encoder = getattr(model, "encoder", None)
+        if not isinstance(encoder, SharedFeatureView):
+            return None
+        with self._lock:
+            entry = self._matrices.get(id(encoder.shared))
+            if entry is None:
+                with metrics.stage("preprocess"):
+                    entry = self._matrices[id(encoder.shared)] = (encoder.shared, encoder.shared.transform(self.rows))
+        return encoder.select(entry[1])
+
+    def set_column(self, name, values):
+        """Replace one numeric input column (e.g. a value predicted upstream) in place."""
+        with self._lock:
+            for row, value in zip(self.rows, values):
+                row[name] = value
+            for shared, Xt in self._matrices.values():
+                if name in shared.num_columns:
+                    Xt[:, shared.num_columns.index(name)] = shared.encode_numeric(name, values)
+
+    def take(self, indices):
+        """The same encoding restricted to rows[indices]."""
+        if len(indices) == len(self.rows):
+            return self
+        with self._lock:
+            matrices = {key: (shared, Xt[indices]) for key, (shared, Xt) in self._matrices.items()}
+        return SharedEncoding([self.rows[i] for i in indices], matrices)
+
+
+def estimator_method(estimator, method):
+    """estimator.<method>; "predict_votes" also works on sklearn forests."""
+    if method == "predict_votes" and not hasattr(estimator, "predict_votes"):
+        return lambda X: predict_votes(estimator, X)
+    return getattr(estimator, method)
+
+
+def run_model(model_name, model, rows, method="predict", shared=None):
+    """
+    Call model.<method> on feature rows, through the micro-batcher if
+    enabled. shared (a SharedEncoding of the same rows) lets models with
+    a shared preprocessor skip their own encoding; micro-batching, which
+    encodes whole batches across requests, takes precedence.
+    """
+    if shared is not None and not MICROBATCH:
+        Xt = shared.matrix(model)
+        if Xt is not None:
+            with metrics.stage("predict"):
+                return list(estimator_method(model.estimator, method)(Xt))
+
+    if isinstance(model, CompiledPipeline):
+        preprocess, estimator = model.transform, model.estimator
+    else:
+        preprocess, estimator = model[:-1].transform, model.steps[-1][1]
+
+    def call(batch_rows):
+        with metrics.stage("preprocess"):
+            X = preprocess(model_input(model, batch_rows))
+        with metrics.stage("predict"):
+            return estimator_method(estimator, method)(X)
+
+    if MICROBATCH:
+        return BATCHER.run((model_name, method, id(model)), rows, call)
+    return list(call(rows))
+
+
+def predict_rows(model_name, model, rows, method="predict", shared=None):
+    """
+    Call model.<method> ("predict", "predict_proba" or, for classifiers,
+    "predict_votes") on a list of feature dicts, one output per row. Rows
+    already in PREDICTION_CACHE are served from it; the rest go through
+    the model in a single call.
+    """
+    # Keyed by the version file's sha256, so a request still holding a model
+    # that has since been swapped out can't cache its outputs under the new
+    # one (the swap's invalidate() may already have run)
+    version = REGISTRY.version_of(model_name, model)
+    if not PREDICTION_CACHE.enabled or version is None:
+        return run_model(model_name, model, rows, method, shared)
+
+    keys = [PREDICTION_CACHE.key(model_name, method, row, version.sha256) for row in rows]
+    results = [PREDICTION_CACHE.get(key) for key in keys]
+    missing = [i for i, value in enumerate(results) if value is MISS]
+    if missing:
+        outputs = run_model(model_name, model, [rows[i] for i in missing], method,
+                            shared.take(missing) if shared is not None else None)
+        for i, value in zip(missing, outputs):
+            results[i] = value
+            PREDICTION_CACHE.put(keys[i], value)
+    return results
+
+
+def _load_for_serving(model_name, path):
+    model = read_model(path)
+    if model is None:
         return None
-        
-    model = load_model(filename)
-    MODEL_CACHE[model_name] = model
-    return model
+    model = compile_model(model_name, model)
+    # Pickled models pick up their shared preprocessor here; artifacts
+    # already reference it
+    return share_encoder(model, path) if path.endswith(".pkl") else model
+
+
+# Versioned registry of loaded models. New versions are loaded and warmed
+# beside the one in service and swapped in atomically; the swap drops the
+# model's cached predictions.
+REGISTRY = ModelRegistry(
+    MODEL_FILES,
+    resolve=lambda model_name: resolve_model_path(MODEL_FILES[model_name], model_name not in OPTIONAL_MODELS),
+    load=_load_for_serving,
+    warm=warm_model,
+    on_swap=PREDICTION_CACHE.invalidate,
+)
+
+# Global model cache (current version of each model, kept by the registry)
+MODEL_CACHE = REGISTRY.models
+
+# Poll saved_models every N seconds and hot-swap changed files (0 = off)
+MODEL_WATCH_INTERVAL = float(os.environ.get("ML_MODEL_WATCH_INTERVAL", 0))
+
+# =====================
+# METRICS
+# =====================
+@app.before_request
+def _start_request_metrics():
+    request.environ["ml.start"] = time.perf_counter()
+    metrics.set_endpoint(request.endpoint or "unmatched")
+    # Parse JSON bodies up front (Flask caches the result for the handler);
+    # streamed bodies are left for the route to read incrementally
+    if request.is_json and request.endpoint not in STREAMED_ENDPOINTS:
+        with metrics.stage("json_parse"):
+            request.get_json(silent=True)
+
+
+@app.after_request
+def _finish_request_metrics(response):
+    start = request.environ.get("ml.start")
+    if start is not None:
+        endpoint = request.endpoint or "unmatched"
+        metrics.observe("ml_request_duration_seconds", time.perf_counter() - start, (("endpoint", endpoint),))
+        metrics.inc("ml_requests_total", (("endpoint", endpoint), ("status", str(response.status_code))))
+        if response.status_code >= 500:
+            metrics.inc("ml_request_errors_total", (("endpoint", endpoint),))
+    return response
+
+
+@app.teardown_request
+def _clear_request_metrics(exc):
+    metrics.set_endpoint(None)
+
+
+metrics.register_gauge(
+    "ml_model_load_seconds", "gauge", "Load + warm-up time of the model version in service.",
+    lambda: [((("model", name),), v.load_seconds) for name, v in list(REGISTRY.versions.items())],
+)
+metrics.register_gauge(
+    "ml_model_version", "gauge", "Version number of the model in service (increments on reload).",
+    lambda: [((("model", name),), v.version) for name, v in list(REGISTRY.versions.items())],
+)
+metrics.register_gauge(
+    "ml_prediction_cache_lookups_total", "counter", "Prediction cache lookups, by result.",
+    lambda: [((("result", "hit"),), PREDICTION_CACHE.hits), ((("result", "miss"),), PREDICTION_CACHE.misses)],
+)
+metrics.register_gauge(
+    "ml_prediction_cache_hit_ratio", "gauge", "Share of prediction cache lookups served from the cache.",
+    lambda: [((), PREDICTION_CACHE.stats()["hit_rate"])],
+)
+metrics.register_gauge(
+    "ml_prediction_cache_entries", "gauge", "Rows currently held in the prediction cache.",
+    lambda: [((), PREDICTION_CACHE.stats()["size"])],
+)
+metrics.register_gauge(
+    "ml_microbatch_queue_depth", "gauge", "Rows waiting in open micro-batches, by model and method.",
+    lambda: [((("model", key[0]), ("method", key[1])), depth) for key, depth in BATCHER.queue_depth().items()],
+)
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus text-format metrics for this process."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 
 # =====================
 # HEALTH CHECK
 # =====================
 @app.route("/api/health", methods=["GET"])
 def health():
+    # Not ready until a requested preload has finished warming every model
+    if WARMUP_STATE == "warming":
+        return jsonify({
+            "status": "warming",
+            "loaded_models": list(MODEL_CACHE.keys())
+        }), 503
+
     # Check what's currently loaded
     return jsonify({
         "status": "ok",
-        "loaded_models": list(MODEL_CACHE.keys())
+        "warmup": WARMUP_STATE,
+        "loaded_models": list(MODEL_CACHE.keys()),
+        "prediction_cache": PREDICTION_CACHE.stats(),
+        "microbatch": BATCHER.stats() if MICROBATCH else None,
+        "series": SERIES.stats(),
+        "detector": DETECTOR.stats(),
+        "startup": startup_report(),
     })
 
 
+# =====================
+# MODEL VERSIONS + HOT RELOAD
+# =====================
+@app.route("/api/models", methods=["GET"])
+def list_models():
+    """Version, source file hash/mtime and training metadata of each model."""
+    return jsonify(REGISTRY.describe())
+
+
+@app.route("/api/models/reload", methods=["POST"])
+def reload_models():
+    """
+    Load new versions of changed model files and swap them in once warmed.
+    Optional input:
+    {
+        "models": ["wpt", "otd"],   # default: all
+        "force": false,             # reload even if the file is unchanged
+        "wait": false               # block until the swap is done
+    }
+    Reloads only the process that serves this request; with several
+    workers, set ML_MODEL_WATCH_INTERVAL so every worker picks files up.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        names = data.get("models")
+        unknown = [n for n in names or [] if n not in MODEL_FILES]
+        if unknown:
+            return jsonify({"error": f"Unknown models: {unknown}"}), 400
+
+        if data.get("wait"):
+            reloaded = REGISTRY.reload(names, force=bool(data.get("force")))
+            return jsonify({"reloaded": reloaded, "models": REGISTRY.describe()})
+
+        REGISTRY.reload_async(names, force=bool(data.get("force")))
+        return jsonify({"status": "reloading", "models": REGISTRY.describe()}), 202
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# =====================
+# ROLLING-WINDOW TIME SERIES
+# =====================
+# Rolling 1h/24h/7d metric windows per (warehouse, metric), optionally
+# filled from a metric_snapshots export (.json, .ndjson or .csv) at startup
+SERIES = TimeSeriesStore()
+SERIES_SNAPSHOTS = os.environ.get("ML_SERIES_SNAPSHOTS")
+if SERIES_SNAPSHOTS:
+    try:
+        _loaded = SERIES.load_file(SERIES_SNAPSHOTS)
+        print(f"[OK] Loaded {_loaded} points into {len(SERIES)} series from {SERIES_SNAPSHOTS}")
+        # The export is taken at deploy time, so it runs up to startup
+        if SERIES.oldest is not None:
+            SERIES.complete_since = min(SERIES.complete_since, SERIES.oldest)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Could not load series snapshots from {SERIES_SNAPSHOTS}: {e}")
+
+
+def rolling_avg_7d(warehouse_id, metric_id):
+    """True 7-day rolling average from the series store, or None."""
+    return SERIES.mean(warehouse_id, metric_id, "7d")
+
+
+def with_rolling_avg(data):
+    """data with rolling_avg_7d filled from the series store if it's missing."""
+    if not isinstance(data, dict) or "rolling_avg_7d" in data:
+        return data
+    value = rolling_avg_7d(data.get("warehouse_id", "WH-001"), data.get("metric_id", "poi"))
+    return data if value is None else dict(data, rolling_avg_7d=round(value, 4))
+
+
+@app.route("/api/series", methods=["GET"])
+def get_series():
+    """
+    Rolling window means for ?warehouse_id=...&metric_id=..., or store
+    totals without parameters.
+    """
+    warehouse_id = request.args.get("warehouse_id")
+    metric_id = request.args.get("metric_id")
+    if warehouse_id is None or metric_id is None:
+        return jsonify(SERIES.stats())
+    described = SERIES.describe(warehouse_id, metric_id)
+    if described is None:
+        return jsonify({"error": f"No series for {warehouse_id}/{metric_id}"}), 404
+    return jsonify(described)
+
+
+@app.route("/api/series/ingest", methods=["POST"])
+def ingest_series():
+    """
+    Add observations to the series store.
+    Expected input:
+    {
+        "events": [
+            {"warehouse_id": "WH-001", "metric_id": "poi", "value": 82.5,
+             "timestamp": "2025-01-01T09:30:00Z"},    # timestamp optional
+            ...
+        ]
+    }
+    or rows of a metric_snapshots export:
+    {
+        "snapshots": [ {"warehouse_id": ..., "timestamp": ..., "metric_tree": {...}}, ... ]
+    }
+    """
+    try:
+        data = request.get_json()
+        if isinstance(data, dict) and isinstance(data.get("snapshots"), list):
+            added = SERIES.load_snapshots(data["snapshots"])
+            return jsonify({"added": added, **SERIES.stats()})
+
+        events = data.get("events") if isinstance(data, dict) else data
+        if not isinstance(events, list) or not all(isinstance(e, dict) for e in events):
+            return jsonify({"error": "An 'events' or 'snapshots' array of objects is required"}), 400
+        errors = SERIES.add_many(events)
+        failed = [{"index": i, "error": e} for i, e in enumerate(errors) if e]
+        return jsonify({"added": len(events) - len(failed), "errors": failed, **SERIES.stats()})
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# =====================
+# ONLINE ANOMALY DETECTOR
+# =====================
+# Seasonal EWMA baselines per (warehouse, metric) for high-rate ingestion;
+# saved to ML_DETECTOR_STATE every ML_DETECTOR_SNAPSHOT_INTERVAL seconds
+# (0 = only on request) and restored from it at startup. Under gunicorn
+# every worker merges its baselines into that one file (see detector.py)
+DETECTOR = OnlineAnomalyDetector(
+    alpha=float(os.environ.get("ML_DETECTOR_ALPHA", 0.05)),
+    threshold=float(os.environ.get("ML_DETECTOR_THRESHOLD", 3.0)),
+    min_count=int(os.environ.get("ML_DETECTOR_MIN_COUNT", 10)),
+)
+# Runtime state, kept apart from the deploy artifacts in saved_models
+STATE_DIR = os.path.join(os.path.dirname(__file__), "state")
+DETECTOR_STATE = os.environ.get("ML_DETECTOR_STATE", os.path.join(STATE_DIR, "online_detector.json"))
+DETECTOR_SNAPSHOT_INTERVAL = float(os.environ.get("ML_DETECTOR_SNAPSHOT_INTERVAL", 60))
+if DETECTOR_STATE and os.path.exists(DETECTOR_STATE):
+    try:
+        print(f"[OK] Restored {DETECTOR.restore(DETECTOR_STATE)} detector baselines from {DETECTOR_STATE}")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARN] Could not restore detector state from {DETECTOR_STATE}: {e}")
+
+
+@app.route("/api/detector/events", methods=["POST"])
+def detector_events():
+    """
+    Score a batch of events with the online detector and learn from them.
+    Expected input:
+    {
+        "events": [
+            {"warehouse_id": "WH-001", "metric_id": "poi", "value": 72.4,
+             "hour_of_day": 14, "day_of_week": 3},    # or "timestamp"
+            ...
+        ]
+    }
+    Results come back in input order: z_score, is_anomaly, the expected
+    value and std it was compared with, or an "error" entry.
+    """
+    try:
+        data = request.get_json()
+        events = data.get("events") if isinstance(data, dict) else data
+        if not isinstance(events, list) or not events or not all(isinstance(e, dict) for e in events):
+            return jsonify({"error": "A non-empty 'events' array of objects is required"}), 400
+        if len(events) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large: {len(events)} events (max {MAX_BATCH_SIZE})"}), 413
+
+        with metrics.stage("predict"):
+            results = DETECTOR.observe_many(events)
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "anomaly_count": sum(1 for r in results if r.get("is_anomaly")),
+            "error_count": sum(1 for r in results if "error" in r),
+        })
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/detector", methods=["GET"])
+def get_detector():
+    """Baselines for ?warehouse_id=...&metric_id=..., or detector totals."""
+    warehouse_id = request.args.get("warehouse_id")
+    metric_id = request.args.get("metric_id")
+    if warehouse_id is None or metric_id is None:
+        return jsonify(DETECTOR.stats())
+    described = DETECTOR.describe(warehouse_id, metric_id)
+    if described is None:
+        return jsonify({"error": f"No baseline for {warehouse_id}/{metric_id}"}), 404
+    return jsonify(described)
+
+
+@app.route("/api/detector/snapshot", methods=["POST"])
+def snapshot_detector():
+    """Save the detector baselines to ML_DETECTOR_STATE now."""
+    try:
+        saved = DETECTOR.save(DETECTOR_STATE)
+        return jsonify({"saved": saved, "path": DETECTOR_STATE})
+    except OSError as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # =====================
 # ANOMALY DETECTION + Z-SCORE
 # =====================
+ANALYZE_REQUIRED = ["score", "rolling_avg_7d", "hour_of_day", "orders_volume", "staff_count"]
+
+# Upper bound on records accepted by a single /api/analyze/batch call
+MAX_BATCH_SIZE = int(os.environ.get("ML_MAX_BATCH_SIZE", 5000))
+
+
+def analyze_features(data):
+    """Build the feature row shared by the anomaly and z-score models."""
+    return {
+        "hour_of_day": data["hour_of_day"],
+        "day_of_week": data.get("day_of_week", 0),
+        "score": data["score"],
+        "orders_volume": data["orders_volume"],
+        "staff_count": data["staff_count"],
+        "rolling_avg_7d": data["rolling_avg_7d"],
+        "warehouse_id": data.get("warehouse_id", "WH-001"),
+        "metric_id": data.get("metric_id", "poi"),
+    }
+
+
+def _as_number(value):
+    """value as an int/float (numeric strings parsed), or None if it isn't numeric."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def validate_analyze_record(data):
+    """
+    (record, error) for one analyze record: a copy with numeric strings
+    parsed to numbers, or None and the reason it's unusable. Every analyze
+    route goes through this, so they all accept the same input.
+    """
+    if not isinstance(data, dict):
+        return None, "Record must be a JSON object"
+    missing = [f for f in ANALYZE_REQUIRED if f not in data]
+    if missing:
+        return None, f"Missing fields: {missing}"
+    record = dict(data)
+    for field in ANALYZE_REQUIRED + ["day_of_week"]:
+        if field not in record:
+            continue
+        value = _as_number(record[field])
+        if value is None:
+            return None, f"Field '{field}' must be numeric"
+        record[field] = value
+    return record, None
+
+
+def _analyze_separately(records, rows, shared):
+    """is_anomaly, confidence, vote spread and z-score lists from the two separate models."""
+    anomaly_model = get_model("anomaly")
+    z_score_model = get_model("z_score")
+
+    # Anomaly Detection
+    spread = [None] * len(records)
+    if anomaly_model and hasattr(anomaly_model, "predict_proba"):
+        # Label, probabilities and tree disagreement from one forest pass
+        votes = predict_rows("anomaly", anomaly_model, rows, "predict_votes", shared)
+        is_anomaly = [bool(label) for label, _, _ in votes]
+        confidence = [float(proba[1]) for _, proba, _ in votes]  # Probability of anomaly class
+        spread = [float(s) for _, _, s in votes]
+    elif anomaly_model:
+        predictions = predict_rows("anomaly", anomaly_model, rows, shared=shared)
+        is_anomaly = [bool(p) for p in predictions]
+        confidence = [0.5] * len(records)
+    else:
+        # Heuristic fallback
+        is_anomaly = [data["score"] < 60 for data in records]
+        confidence = [0.7 if flag else 0.3 for flag in is_anomaly]
+
+    # Z-Score Prediction
+    if z_score_model:
+        z_scores = [float(z) for z in predict_rows("z_score", z_score_model, rows, shared=shared)]
+    else:
+        # Online detector baseline if it has one, else heuristic fallback
+        z_scores = []
+        for data in records:
+            z_score = 0.0
+            baseline = DETECTOR.score(
+                data.get("warehouse_id", "WH-001"), data.get("metric_id", "poi"), data["score"],
+                data["hour_of_day"], data.get("day_of_week", 0),
+            )
+            if baseline["warm"]:
+                z_score = baseline["z_score"]
+            elif data["rolling_avg_7d"] > 0:
+                z_score = (data["score"] - data["rolling_avg_7d"]) / max(data["rolling_avg_7d"] * 0.1, 1)
+            z_scores.append(z_score)
+
+    return is_anomaly, confidence, spread, z_scores
+
+
+def score_analyze(records):
+    """
+    Run anomaly detection and z-score prediction over validated records.
+    Each model is called once for the whole list; results keep input order.
+    The joint anomaly + z-score model, when trained, replaces both.
+    """
+    joint_model = get_model("anomaly_joint")
+    with metrics.stage("feature_build"):
+        rows = [analyze_features(data) for data in records]
+    # The models share dataset1's preprocessor: encode the rows once
+    shared = SharedEncoding(rows)
+
+    if joint_model:
+        # One traversal: [anomaly probability, z-score] per row
+        outputs = predict_rows("anomaly_joint", joint_model, rows, shared=shared)
+        confidence = [float(out[0]) for out in outputs]
+        # Output 0 regresses the 0/1 label (a leaf's anomaly rate), so
+        # threshold it at 0.5 like the classifier's probability
+        is_anomaly = [p > 0.5 for p in confidence]
+        z_scores = [float(out[1]) for out in outputs]
+        spread = [None] * len(records)
+    else:
+        is_anomaly, confidence, spread, z_scores = _analyze_separately(records, rows, shared)
+
+    return [
+        {
+            "is_anomaly": flag,
+            "confidence_score": round(conf, 4),
+            "z_score": round(z, 4),
+            # Std of the per-tree anomaly probabilities; None without the classifier
+            "vote_spread": round(s, 4) if s is not None else None,
+        }
+        for flag, conf, s, z in zip(is_anomaly, confidence, spread, z_scores)
+    ]
+
+
 @app.route("/api/analyze", methods=["POST"])
 def analyze():
     """
@@ -87,76 +809,63 @@ def analyze():
         "warehouse_id": "WH-001",
         "metric_id": "poi"
     }
+    rolling_avg_7d may be left out once the series store holds the
+    (warehouse_id, metric_id) series.
     """
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error": "Request body is required"}), 400
+        record, error = validate_analyze_record(with_rolling_avg(data))
+        if error:
+            return jsonify({"error": error}), 400
 
-        # Required fields
-        required = ["score", "rolling_avg_7d", "hour_of_day", "orders_volume", "staff_count"]
-        missing = [f for f in required if f not in data]
-        if missing:
-            return jsonify({"error": f"Missing fields: {missing}"}), 400
+        return jsonify(score_analyze([record])[0])
 
-        import pandas as pd
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
 
-        # Anomaly Detection
-        is_anomaly = False
-        anomaly_confidence = 0.5
 
-        # Anomaly Detection
-        is_anomaly = False
-        anomaly_confidence = 0.5
-        
-        anomaly_model = get_model("anomaly")
-        if anomaly_model:
-            features = pd.DataFrame([{
-                "hour_of_day": data["hour_of_day"],
-                "day_of_week": data.get("day_of_week", 0),
-                "score": data["score"],
-                "orders_volume": data["orders_volume"],
-                "staff_count": data["staff_count"],
-                "rolling_avg_7d": data["rolling_avg_7d"],
-                "warehouse_id": data.get("warehouse_id", "WH-001"),
-                "metric_id": data.get("metric_id", "poi"),
-            }])
-            prediction = anomaly_model.predict(features)
-            is_anomaly = bool(prediction[0])
-
-            # Get probability if available
-            if hasattr(anomaly_model, "predict_proba"):
-                proba = anomaly_model.predict_proba(features)
-                anomaly_confidence = float(proba[0][1])  # Probability of anomaly class
-        else:
-            # Heuristic fallback
-            is_anomaly = data["score"] < 60
-            anomaly_confidence = 0.7 if is_anomaly else 0.3
-
-        # Z-Score Prediction
-        z_score = 0.0
-        z_score_model = get_model("z_score")
-        if z_score_model:
-            z_features = pd.DataFrame([{
-                "hour_of_day": data["hour_of_day"],
-                "day_of_week": data.get("day_of_week", 0),
-                "score": data["score"],
-                "orders_volume": data["orders_volume"],
-                "staff_count": data["staff_count"],
-                "rolling_avg_7d": data["rolling_avg_7d"],
-                "warehouse_id": data.get("warehouse_id", "WH-001"),
-                "metric_id": data.get("metric_id", "poi"),
-            }])
-            z_score = float(z_score_model.predict(z_features)[0])
-        else:
-            # Heuristic fallback
-            if data["rolling_avg_7d"] > 0:
-                z_score = (data["score"] - data["rolling_avg_7d"]) / max(data["rolling_avg_7d"] * 0.1, 1)
+@app.route("/api/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """
+    Score many metric snapshots in one call.
+    Expected input:
+    {
+        "records": [ { ...same fields as /api/analyze... }, ... ]
+    }
+    A bare JSON array of records is accepted too. Results come back in
+    input order; invalid records get an "error" entry instead of failing
+    the whole batch.
+    """
+    try:
+        data = request.get_json()
+        records = data.get("records") if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return jsonify({"error": "A non-empty 'records' array is required"}), 400
+        if len(records) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})"}), 413
+
+        records = [with_rolling_avg(record) for record in records]
+        results = [None] * len(records)
+        valid_index = []
+        for i, record in enumerate(records):
+            records[i], error = validate_analyze_record(record)
+            if error:
+                results[i] = {"error": error}
+            else:
+                valid_index.append(i)
+
+        if valid_index:
+            scored = score_analyze([records[i] for i in valid_index])
+            for i, result in zip(valid_index, scored):
+                results[i] = result
 
         return jsonify({
-            "is_anomaly": is_anomaly,
-            "confidence_score": round(anomaly_confidence, 4),
-            "z_score": round(z_score, 4),
+            "results": results,
+            "count": len(results),
+            "error_count": len(results) - len(valid_index),
         })
 
     except Exception as e:
@@ -167,6 +876,105 @@ def analyze():
 # =====================
 # ROOT CAUSE CLASSIFICATION
 # =====================
+# Recommendation per root cause class of the model
+ROOT_CAUSE_RECOMMENDATIONS = {
+    "label_issue": "Check label printer connectivity and API keys. Reset courier integration for affected zones.",
+    "pick_issue": "Review pick list accuracy and optimize warehouse layout. Consider staff retraining.",
+    "pack_issue": "Inspect packing station equipment and review packaging standards compliance.",
+    "transit_delay": "Renegotiate carrier SLAs and implement route optimization. Consider alternative carriers.",
+    "order_accuracy": "Audit order processing pipeline and implement additional validation checkpoints.",
+    "staff_shortage": "Rebalance staff allocation and consider temporary staffing during peak hours.",
+    "system_failure": "Check API integrations and system health. Initiate failover procedures if needed.",
+}
+
+
+def root_cause_features(data):
+    """Feature row for the root cause model."""
+    return {
+        "poi_score": data.get("poi_score", data.get("score", 50)),
+        "label_score": data.get("label_score", 50),
+        "pick_score": data.get("pick_score", 50),
+        "pack_score": data.get("pack_score", 50),
+        "tt_score": data.get("tt_score", 50),
+        "oa_score": data.get("oa_score", 50),
+        "orders_volume": data.get("orders_volume", 1000),
+        "warehouse_id": data.get("warehouse_id", "WH-001"),
+        "zone": data.get("zone", "North"),
+    }
+
+
+def classify_root_causes(records):
+    """
+    Root cause label, recommendation, confidence, class probabilities and
+    vote spread (std of the per-tree probabilities for the label) for each
+    snapshot. The model is called once for the whole list; results keep
+    input order.
+    """
+    root_cause_model = get_model("root_cause")
+    if not root_cause_model:
+        results = []
+        for data in records:
+            # Heuristic fallback
+            root_cause_label = "Unknown"
+            recommendation = "No specific recommendation available."
+            confidence = 0.5
+            score = data.get("score", 50)
+            if score < 30:
+                root_cause_label = "Critical System Failure"
+                recommendation = "Immediate intervention required. Escalate to operations management."
+                confidence = 0.8
+            elif score < 60:
+                root_cause_label = "Performance Degradation"
+                recommendation = "Monitor closely and implement preventive measures. Review recent changes."
+                confidence = 0.65
+            results.append({
+                "root_cause": root_cause_label,
+                "recommendation": recommendation,
+                "confidence": round(confidence, 4),
+                "probabilities": None,
+                "vote_spread": None,
+                "model_used": False,
+            })
+        return results
+
+    with metrics.stage("feature_build"):
+        rows = [root_cause_features(data) for data in records]
+
+    if hasattr(root_cause_model, "predict_proba"):
+        # Label, probabilities and tree disagreement from one forest pass
+        votes = predict_rows("root_cause", root_cause_model, rows, "predict_votes")
+        labels = [str(label) for label, _, _ in votes]
+        confidences = [float(max(proba)) for _, proba, _ in votes]
+        classes = [str(c) for c in root_cause_model.classes_]
+        probabilities = [{c: round(float(p), 4) for c, p in zip(classes, proba)} for _, proba, _ in votes]
+        spread = [round(float(s), 4) for _, _, s in votes]
+    else:
+        labels = [str(p) for p in predict_rows("root_cause", root_cause_model, rows)]
+        confidences = [0.5] * len(rows)
+        probabilities = spread = [None] * len(rows)
+
+    return [
+        {
+            "root_cause": label,
+            # Generate recommendation based on root cause
+            "recommendation": ROOT_CAUSE_RECOMMENDATIONS.get(
+                label.lower().replace(" ", "_"),
+                f"Investigate {label} and take corrective action based on historical patterns."
+            ),
+            "confidence": round(confidence, 4),
+            "probabilities": proba,
+            "vote_spread": s,
+            "model_used": True,
+        }
+        for label, confidence, proba, s in zip(labels, confidences, probabilities, spread)
+    ]
+
+
+def classify_root_cause(data):
+    """Root cause label, recommendation and confidence for one snapshot."""
+    return classify_root_causes([data])[0]
+
+
 @app.route("/api/root-cause", methods=["POST"])
 def root_cause():
     """
@@ -191,65 +999,7 @@ def root_cause():
         if not data:
             return jsonify({"error": "Request body is required"}), 400
 
-        root_cause_label = "Unknown"
-        recommendation = "No specific recommendation available."
-        confidence = 0.5
-
-        root_cause_model = get_model("root_cause")
-        if root_cause_model:
-            import pandas as pd
-
-            features = pd.DataFrame([{
-                "poi_score": data.get("poi_score", data.get("score", 50)),
-                "label_score": data.get("label_score", 50),
-                "pick_score": data.get("pick_score", 50),
-                "pack_score": data.get("pack_score", 50),
-                "tt_score": data.get("tt_score", 50),
-                "oa_score": data.get("oa_score", 50),
-                "orders_volume": data.get("orders_volume", 1000),
-                "warehouse_id": data.get("warehouse_id", "WH-001"),
-                "zone": data.get("zone", "North"),
-            }])
-
-            prediction = root_cause_model.predict(features)
-            root_cause_label = str(prediction[0])
-
-            if hasattr(root_cause_model, "predict_proba"):
-                proba = root_cause_model.predict_proba(features)
-                confidence = float(max(proba[0]))
-
-            # Generate recommendation based on root cause
-            recommendations = {
-                "label_issue": "Check label printer connectivity and API keys. Reset courier integration for affected zones.",
-                "pick_issue": "Review pick list accuracy and optimize warehouse layout. Consider staff retraining.",
-                "pack_issue": "Inspect packing station equipment and review packaging standards compliance.",
-                "transit_delay": "Renegotiate carrier SLAs and implement route optimization. Consider alternative carriers.",
-                "order_accuracy": "Audit order processing pipeline and implement additional validation checkpoints.",
-                "staff_shortage": "Rebalance staff allocation and consider temporary staffing during peak hours.",
-                "system_failure": "Check API integrations and system health. Initiate failover procedures if needed.",
-            }
-            recommendation = recommendations.get(
-                root_cause_label.lower().replace(" ", "_"),
-                f"Investigate {root_cause_label} and take corrective action based on historical patterns."
-            )
-        else:
-            # Heuristic fallback
-            score = data.get("score", 50)
-            if score < 30:
-                root_cause_label = "Critical System Failure"
-                recommendation = "Immediate intervention required. Escalate to operations management."
-                confidence = 0.8
-            elif score < 60:
-                root_cause_label = "Performance Degradation"
-                recommendation = "Monitor closely and implement preventive measures. Review recent changes."
-                confidence = 0.65
-
-        return jsonify({
-            "root_cause": root_cause_label,
-            "recommendation": recommendation,
-            "confidence": round(confidence, 4),
-            "model_used": root_cause_model is not None,
-        })
+        return jsonify(classify_root_cause(data))
 
     except Exception as e:
         traceback.print_exc()
@@ -268,22 +1018,22 @@ def predict_poi():
         if not poi_model:
             return jsonify({"error": "POI model not loaded"}), 503
 
-        import pandas as pd
-        features = pd.DataFrame([{
-            "day_of_week": data.get("day_of_week", 0),
-            "is_flash_sale_day": data.get("is_flash_sale_day", 0),
-            "orders_volume": data.get("orders_volume", 1000),
-            "poi_score_t_minus_1": data.get("poi_score_t_minus_1", 75),
-            "poi_score_t_minus_2": data.get("poi_score_t_minus_2", 75),
-            "poi_score_t_minus_3": data.get("poi_score_t_minus_3", 75),
-            "poi_score_t_minus_4": data.get("poi_score_t_minus_4", 75),
-            "poi_score_t_minus_5": data.get("poi_score_t_minus_5", 75),
-            "poi_score_t_minus_6": data.get("poi_score_t_minus_6", 75),
-            "poi_score_t_minus_7": data.get("poi_score_t_minus_7", 75),
-            "warehouse_id": data.get("warehouse_id", "WH-001"),
-        }])
-
-        prediction = float(poi_model.predict(features)[0])
+        with metrics.stage("feature_build"):
+            features = {
+                "day_of_week": data.get("day_of_week", 0),
+                "is_flash_sale_day": data.get("is_flash_sale_day", 0),
+                "orders_volume": data.get("orders_volume", 1000),
+                "poi_score_t_minus_1": data.get("poi_score_t_minus_1", 75),
+                "poi_score_t_minus_2": data.get("poi_score_t_minus_2", 75),
+                "poi_score_t_minus_3": data.get("poi_score_t_minus_3", 75),
+                "poi_score_t_minus_4": data.get("poi_score_t_minus_4", 75),
+                "poi_score_t_minus_5": data.get("poi_score_t_minus_5", 75),
+                "poi_score_t_minus_6": data.get("poi_score_t_minus_6", 75),
+                "poi_score_t_minus_7": data.get("poi_score_t_minus_7", 75),
+                "warehouse_id": data.get("warehouse_id", "WH-001"),
+            }
+
+        prediction = float(predict_rows("poi", poi_model, [features])[0])
         return jsonify({"poi_score_tomorrow": round(prediction, 2)})
 
     except Exception as e:
@@ -300,16 +1050,16 @@ def predict_poi_actual():
         if not poi_actual_model:
             return jsonify({"error": "POI Actual model not loaded"}), 503
 
-        import pandas as pd
-        features = pd.DataFrame([{
-            "label_score": data.get("label_score", 75),
-            "pick_score": data.get("pick_score", 75),
-            "pack_score": data.get("pack_score", 75),
-            "wpt_score_actual": data.get("wpt_score_actual", 75),
-            "tt_score": data.get("tt_score", 75),
-        }])
+        with metrics.stage("feature_build"):
+            features = {
+                "label_score": data.get("label_score", 75),
+                "pick_score": data.get("pick_score", 75),
+                "pack_score": data.get("pack_score", 75),
+                "wpt_score_actual": data.get("wpt_score_actual", 75),
+                "tt_score": data.get("tt_score", 75),
+            }
 
-        prediction = float(poi_actual_model.predict(features)[0])
+        prediction = float(predict_rows("poi_actual", poi_actual_model, [features])[0])
         return jsonify({"poi_actual_score": round(prediction, 2)})
 
     except Exception as e:
@@ -326,14 +1076,14 @@ def predict_wpt():
         if not wpt_model:
             return jsonify({"error": "WPT model not loaded"}), 503
 
-        import pandas as pd
-        features = pd.DataFrame([{
-            "label_score": data.get("label_score", 75),
-            "pick_score": data.get("pick_score", 75),
-            "pack_score": data.get("pack_score", 75),
-        }])
+        with metrics.stage("feature_build"):
+            features = {
+                "label_score": data.get("label_score", 75),
+                "pick_score": data.get("pick_score", 75),
+                "pack_score": data.get("pack_score", 75),
+            }
 
-        prediction = float(wpt_model.predict(features)[0])
+        prediction = float(predict_rows("wpt", wpt_model, [features])[0])
         return jsonify({"wpt_score": round(prediction, 2)})
 
     except Exception as e:
@@ -350,16 +1100,16 @@ def predict_otd():
         if not otd_model:
             return jsonify({"error": "OTD model not loaded"}), 503
 
-        import pandas as pd
-        features = pd.DataFrame([{
-            "label_score": data.get("label_score", 75),
-            "pick_score": data.get("pick_score", 75),
-            "pack_score": data.get("pack_score", 75),
-            "wpt_score_actual": data.get("wpt_score_actual", 75),
-            "tt_score": data.get("tt_score", 75),
-        }])
+        with metrics.stage("feature_build"):
+            features = {
+                "label_score": data.get("label_score", 75),
+                "pick_score": data.get("pick_score", 75),
+                "pack_score": data.get("pack_score", 75),
+                "wpt_score_actual": data.get("wpt_score_actual", 75),
+                "tt_score": data.get("tt_score", 75),
+            }
 
-        prediction = float(otd_model.predict(features)[0])
+        prediction = float(predict_rows("otd", otd_model, [features])[0])
         return jsonify({"otd_score": round(prediction, 2)})
 
     except Exception as e:
@@ -368,6 +1118,255 @@ def predict_otd():
 
 
 
+# =====================
+# METRIC TREE CASCADE
+# =====================
+# Worker threads for evaluating independent cascade nodes concurrently
+CASCADE_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ML_CASCADE_THREADS", 4)), thread_name_prefix="cascade"
+)
+
+
+class ModelNotLoaded(Exception):
+    pass
+
+
+def _submit(fn, *args):
+    """Run fn on the cascade pool, keeping the request's metrics endpoint label."""
+    endpoint = metrics.current_endpoint()
+
+    def task():
+        metrics.set_endpoint(endpoint)
+        try:
+            return fn(*args)
+        finally:
+            metrics.set_endpoint(None)
+
+    return CASCADE_POOL.submit(task)
+
+
+def _predict_score(model_name, features, shared=None):
+    model = get_model(model_name)
+    if model is None:
+        raise ModelNotLoaded(model_name)
+    return float(predict_rows(model_name, model, [features], shared=shared)[0])
+
+
+@app.route("/api/predict/cascade", methods=["POST"])
+def predict_cascade():
+    """
+    Evaluate the metric tree in one call: label/pick/pack -> WPT, then WPT
+    (with TT) -> OTD and POI actual concurrently, then optionally anomaly
+    detection and root cause on the predicted POI, also concurrently.
+    Every model runs once per node.
+    Expected input:
+    {
+        "label_score": 80.0,
+        "pick_score": 85.0,
+        "pack_score": 85.0,
+        "tt_score": 90.0,
+        "oa_score": 95.0,            # optional, passed through / root cause
+        "dfr_score": 97.0,           # optional, passed through
+        "warehouse_id": "WH-001",
+        "zone": "North",
+        "orders_volume": 1200,
+        "analyze": true,             # optional: anomaly + z-score on POI,
+        "rolling_avg_7d": 80.2,      #   needs the /api/analyze fields
+        "hour_of_day": 14,
+        "staff_count": 45,
+        "root_cause": true           # optional: root cause on POI
+    }
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required"}), 400
+
+        with metrics.stage("feature_build"):
+            label_score = data.get("label_score", 75)
+            pick_score = data.get("pick_score", 75)
+            pack_score = data.get("pack_score", 75)
+            tt_score = data.get("tt_score", 75)
+            base = {"label_score": label_score, "pick_score": pick_score, "pack_score": pack_score}
+
+        # WPT, OTD and POI actual share dataset4's preprocessor: encode the
+        # sub-metrics once, then fill in the predicted WPT column
+        shared = SharedEncoding([dict(base, tt_score=tt_score)])
+
+        # Level 1: WPT from its sub-metrics
+        wpt_score = _predict_score("wpt", base, shared)
+
+        # Level 2: OTD and POI actual both consume the predicted WPT
+        chained = dict(base, wpt_score_actual=wpt_score, tt_score=tt_score)
+        shared.set_column("wpt_score_actual", [wpt_score])
+        otd_future = _submit(_predict_score, "otd", chained, shared)
+        poi_future = _submit(_predict_score, "poi_actual", chained, shared)
+        otd_score = otd_future.result()
+        poi_score = poi_future.result()
+
+        # Level 3 (optional): anomaly and root cause on the predicted POI
+        analysis_future = root_cause_future = None
+        analysis_error = None
+        if data.get("analyze"):
+            record, analysis_error = validate_analyze_record(
+                with_rolling_avg(dict(data, score=poi_score, metric_id="poi")))
+            if not analysis_error:
+                analysis_future = _submit(lambda: score_analyze([record])[0])
+        if data.get("root_cause"):
+            rc_input = dict(data, poi_score=poi_score, score=poi_score, tt_score=tt_score)
+            root_cause_future = _submit(classify_root_cause, rc_input)
+
+        tree = {
+            "poi": {"score": round(poi_score, 2), "source": "model"},
+            "otd": {"score": round(otd_score, 2), "source": "model"},
+            "wpt": {"score": round(wpt_score, 2), "source": "model"},
+            "tt": {"score": tt_score, "source": "input"},
+            "label": {"score": label_score, "source": "input"},
+            "pick": {"score": pick_score, "source": "input"},
+            "pack": {"score": pack_score, "source": "input"},
+        }
+        for key in ("oa", "dfr"):
+            if f"{key}_score" in data:
+                tree[key] = {"score": data[f"{key}_score"], "source": "input"}
+
+        result = {
+            "tree": tree,
+            "wpt_score": round(wpt_score, 2),
+            "otd_score": round(otd_score, 2),
+            "poi_actual_score": round(poi_score, 2),
+        }
+        if data.get("analyze"):
+            result["analysis"] = analysis_future.result() if analysis_future else {"error": analysis_error}
+        if root_cause_future:
+            result["root_cause"] = root_cause_future.result()
+        return jsonify(result)
+
+    except ModelNotLoaded as e:
+        return jsonify({"error": f"{e} model not loaded"}), 503
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# =====================
+# STREAMING BULK SCORING
+# =====================
+# Records scored per model call when streaming NDJSON
+STREAM_CHUNK_SIZE = int(os.environ.get("ML_STREAM_CHUNK_SIZE", 500))
+# Bodies score_stream reads line by line. Anything else (e.g. a form,
+# which werkzeug would consume before the route sees it) is rejected
+STREAM_CONTENT_TYPES = {"", "application/x-ndjson", "application/jsonl", "application/json", "text/plain"}
+# Endpoints whose body _start_request_metrics must not parse up front
+STREAMED_ENDPOINTS = {"score_stream"}
+
+
+def _score_root_cause_chunk(records):
+    results = [None] * len(records)
+    valid_index = []
+    for i, record in enumerate(records):
+        if isinstance(record, dict):
+            valid_index.append(i)
+        else:
+            results[i] = {"error": "Record must be a JSON object"}
+    if valid_index:
+        for i, result in zip(valid_index, classify_root_causes([records[i] for i in valid_index])):
+            results[i] = result
+    return results
+
+
+def _score_analyze_chunk(records):
+    records = [with_rolling_avg(record) for record in records]
+    results = [None] * len(records)
+    valid_index = []
+    for i, record in enumerate(records):
+        records[i], error = validate_analyze_record(record)
+        if error:
+            results[i] = {"error": error}
+        else:
+            valid_index.append(i)
+    if valid_index:
+        for i, result in zip(valid_index, score_analyze([records[i] for i in valid_index])):
+            results[i] = result
+    return results
+
+
+STREAM_SCORERS = {
+    "analyze": _score_analyze_chunk,
+    "root-cause": _score_root_cause_chunk,
+}
+
+
+def _read_ndjson(stream):
+    """Yield one parsed record (or an error dict) per non-blank input line."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield True, json.loads(line)
+        except ValueError as e:
+            yield False, {"error": f"Invalid JSON: {e}"}
+
+
+def _score_stream(scorer, stream, chunk_size):
+    """Score parsed NDJSON records chunk by chunk, yielding output lines."""
+    index = 0
+    chunk = []
+
+    def flush():
+        # Error placeholders pass through; only parsed records are scored
+        records = [record for ok, record in chunk if ok]
+        try:
+            results = scorer(records) if records else []
+        except Exception as e:
+            # Headers are already sent, so report the failure per record
+            traceback.print_exc()
+            results = [{"error": str(e)}] * len(records)
+        scored = iter(results)
+        lines = []
+        for offset, (ok, record) in enumerate(chunk):
+            result = next(scored) if ok else record
+            lines.append(json.dumps({"index": index + offset, **result}) + "\n")
+        return "".join(lines)
+
+    for item in _read_ndjson(stream):
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield flush()
+            index += len(chunk)
+            chunk = []
+    if chunk:
+        yield flush()
+
+
+@app.route("/api/stream/<kind>", methods=["POST"])
+def score_stream(kind):
+    """
+    Bulk-score newline-delimited JSON for backfills.
+    POST one record per line (same fields as /api/analyze or
+    /api/root-cause) to /api/stream/analyze or /api/stream/root-cause.
+    The body is read incrementally and scored in chunks of
+    ML_STREAM_CHUNK_SIZE records (or ?chunk_size=N), and results stream
+    back as NDJSON in input order, one line per record:
+        {"index": 0, "is_anomaly": false, ...}
+        {"index": 1, "error": "Missing fields: ['score']"}
+    Memory use depends on the chunk size, not on the input size.
+    Send Content-Type application/x-ndjson (application/json and
+    text/plain are read the same way); other types get a 415.
+    """
+    scorer = STREAM_SCORERS.get(kind)
+    if scorer is None:
+        return jsonify({"error": f"Unknown stream '{kind}', expected one of {sorted(STREAM_SCORERS)}"}), 404
+    if request.mimetype not in STREAM_CONTENT_TYPES:
+        return jsonify({"error": f"Unsupported Content-Type '{request.mimetype}', send application/x-ndjson"}), 415
+    chunk_size = request.args.get("chunk_size", STREAM_CHUNK_SIZE, type=int)
+    if chunk_size <= 0:
+        return jsonify({"error": "chunk_size must be positive"}), 400
+
+    body = _score_stream(scorer, request.stream, chunk_size)
+    return Response(stream_with_context(body), mimetype="application/x-ndjson")
+
+
 # =====================
 # GENERAL SCORE CALCULATION
 # =====================
@@ -379,7 +1378,7 @@ def calculate_score_api():
             return jsonify({"error": "Request body is required"}), 400
 
         # Calculate score using the imported function
-        score = calculate_score(data)
+        score = calculate_score(data, rolling_avg_7d)
         
         return jsonify({
             "score": float(score),
@@ -394,10 +1393,68 @@ def calculate_score_api():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/calculate-score/batch", methods=["POST"])
+def calculate_score_batch():
+    """
+    Score many snapshots in one vectorized pass.
+    Expected input:
+    {
+        "records": [ { ...same fields as /api/calculate-score... }, ... ]
+    }
+    or columnar:
+    {
+        "columns": { "orders_volume": [1200, 800], "staff_count": [45, 30], ... }
+    }
+    A bare JSON array of records is accepted too. Results come back in
+    input order; rows that fail validation get an "error" entry.
+    """
+    try:
+        data = request.get_json()
+        if isinstance(data, dict) and isinstance(data.get("columns"), dict):
+            records = data["columns"]
+            lengths = {len(v) if isinstance(v, list) else -1 for v in records.values()}
+            if len(lengths) != 1 or -1 in lengths:
+                return jsonify({"error": "'columns' must map field names to arrays of equal length"}), 400
+            count = lengths.pop()
+        else:
+            records = data.get("records") if isinstance(data, dict) else data
+            if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                return jsonify({"error": "A non-empty 'records' array of objects is required"}), 400
+            count = len(records)
+        if count == 0:
+            return jsonify({"error": "A non-empty 'records' array of objects is required"}), 400
+        if count > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large: {count} records (max {MAX_BATCH_SIZE})"}), 413
+
+        with metrics.stage("predict"):
+            scores, errors = calculate_scores(records, rolling_avg_7d)
+
+        results = [
+            {"error": error} if error else {"score": float(score)}
+            for score, error in zip(scores, errors)
+        ]
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "error_count": sum(error is not None for error in errors),
+        })
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+STARTUP["import_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+
+
 # =====================
 # RUN SERVER
 # =====================
 if __name__ == "__main__":
     port = int(os.environ.get("ML_PORT", 5001))
+    if os.environ.get("ML_PRELOAD", "1") == "1":
+        preload_models()
+    REGISTRY.start_watcher(MODEL_WATCH_INTERVAL)
+    DETECTOR.start_snapshots(DETECTOR_STATE, DETECTOR_SNAPSHOT_INTERVAL)
     print(f"\nML Engine starting on port {port}")
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,320 @@
+"""
+Memory-mapped model artifacts.
+A ".flat" artifact stores a compiled model (feature encoder + flat forest)
+as a small JSON header followed by the raw tree arrays, each aligned to
+64 bytes. Loading maps the file read-only and wraps the arrays in place,
+so every process serving the model shares one page-cache copy and load
+time doesn't depend on model size.
+
+Models whose training metadata declares the same "preprocessor" (the
+dataset1 anomaly / z-score models, the dataset4 WPT / OTD / POI-actual
+models) share one fitted encoder, stored once as <name>.prep.json. Their
+artifacts reference it by name and sha256 instead of embedding a copy,
+and load as SharedFeatureViews of a single encoder, so callers can encode
+a request once for all of them.
+
+Convert the pickles written by the training scripts with:
+    python artifacts.py            # every saved_models/*.pkl
+    python artifacts.py poi_model.pkl
+
+Converting a single model rebuilds its shared preprocessor from every
+model declaring it; if that file changes, the other members are
+re-exported as well, and all their artifacts are loaded back and scored
+from a frame of just their own features as a check (exit code 1 if any
+fails).
+"""
+
+import json
+import os
+import pickle
+import sys
+import threading
+from hashlib import sha256
+
+import numpy as np
+
+from encoder import CompiledPipeline, FeatureEncoder, SharedFeatureView
+from fileio import atomic_write, layout, read_container, write_container
+from forest import FlatForest, FlatForestClassifier, flatten_forest
+from registry import read_metadata
+
+MAGIC = b"MLFLAT01"
+ARRAY_NAMES = ["feature", "threshold", "left", "right", "value", "roots"]
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saved_models")
+
+
+def artifact_path(pkl_path):
+    """The .flat artifact that sits next to a .pkl model file."""
+    return os.path.splitext(pkl_path)[0] + ".flat"
+
+
+def _encoder_spec(encoder):
+    return {
+        "num_columns": list(encoder.num_columns),
+        "medians": encoder.medians.tolist(),
+        "means": encoder.means.tolist(),
+        "scales": encoder.scales.tolist(),
+        "cat_columns": list(encoder.cat_columns),
+        "cat_fill": [np.asarray(v).item() for v in encoder.cat_fill],
+        "categories": [np.asarray(c).tolist() for c in encoder.categories],
+    }
+
+
+# =====================
+# SHARED PREPROCESSORS
+# =====================
+# (path, mtime_ns, size) -> (FeatureEncoder, sha256): every model loaded
+# against the same file gets the same encoder instance
+_SHARED = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def prep_path(models_dir, name):
+    """File holding the shared preprocessor called name."""
+    return os.path.join(models_dir, f"{name}.prep.json")
+
+
+def save_shared_encoder(encoder, path):
+    """
+    Write a shared FeatureEncoder (atomically) unless the file already
+    holds exactly it; returns (sha256, whether the file was written).
+    """
+    payload = json.dumps({"encoder": _encoder_spec(encoder)}).encode("utf-8")
+    digest = sha256(payload).hexdigest()
+    if os.path.exists(path) and load_shared_encoder(path)[1] == digest:
+        return digest, False
+    with atomic_write(path) as f:
+        f.write(payload)
+    return digest, True
+
+
+def load_shared_encoder(path):
+    """(FeatureEncoder, sha256) of a shared preprocessor file, cached per file version."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _SHARED_LOCK:
+        if key not in _SHARED:
+            with open(path, "rb") as f:
+                payload = f.read()
+            _SHARED[key] = (FeatureEncoder(**json.loads(payload)["encoder"]), sha256(payload).hexdigest())
+        return _SHARED[key]
+
+
+def share_encoder(model, path):
+    """
+    Swap a compiled model's own encoder for a view of the shared
+    preprocessor its metadata declares, if that file exists and encodes
+    identically. Used for models loaded from pickles; artifacts record
+    the reference themselves.
+    """
+    name = read_metadata(path).get("preprocessor")
+    if not name or not isinstance(model, CompiledPipeline):
+        return model
+    shared_path = prep_path(os.path.dirname(path), name)
+    if not os.path.exists(shared_path):
+        return model
+    view = SharedFeatureView.of(model.encoder, load_shared_encoder(shared_path)[0], name)
+    return CompiledPipeline(view, model.estimator) if view is not None else model
+
+
+# =====================
+# ARTIFACTS
+# =====================
+def save_artifact(model, path, shared_digest=None):
+    """
+    Write a CompiledPipeline (FeatureEncoder + FlatForest) as a .flat file.
+    A model whose encoder is a SharedFeatureView stores a reference to the
+    shared preprocessor (whose file has sha256 shared_digest) instead.
+    """
+    if isinstance(model.encoder, SharedFeatureView):
+        encoder_spec = {
+            "shared": model.encoder.name,
+            "sha256": shared_digest,
+            "num_columns": model.encoder.num_columns,
+            "cat_columns": model.encoder.cat_columns,
+        }
+    elif isinstance(model.encoder, FeatureEncoder):
+        encoder_spec = _encoder_spec(model.encoder)
+    else:
+        encoder_spec = None
+    if encoder_spec is None or not isinstance(model.estimator, FlatForest):
+        raise ValueError("Only compiled-feature, flat-forest models can be saved as artifacts")
+    forest = model.estimator
+
+    header = {
+        "encoder": encoder_spec,
+        "forest": {
+            "max_depth": forest.max_depth,
+            "n_features_in": forest.n_features_in_,
+        },
+        "arrays": {},
+    }
+    if isinstance(forest, FlatForestClassifier):
+        header["forest"]["classes"] = forest.classes_.tolist()
+        header["forest"]["classes_dtype"] = str(forest.classes_.dtype)
+
+    arrays = [np.ascontiguousarray(getattr(forest, name)) for name in ARRAY_NAMES]
+    offsets, _ = layout(array.nbytes for array in arrays)
+    for name, array, offset in zip(ARRAY_NAMES, arrays, offsets):
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+    write_container(path, MAGIC, header, zip(offsets, arrays))
+
+
+def load_artifact(path):
+    """Map a .flat artifact and rebuild the CompiledPipeline around it."""
+    header, buf, data_start = read_container(path, MAGIC, "model artifact")
+
+    # Read-only views straight onto the mapped pages; they keep the map alive
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        arrays[name] = np.frombuffer(
+            buf, dtype=dtype, count=count, offset=data_start + spec["offset"]
+        ).reshape(spec["shape"])
+
+    forest_spec = header["forest"]
+    kwargs = dict(arrays, max_depth=forest_spec["max_depth"], n_features_in=forest_spec["n_features_in"])
+    if "classes" in forest_spec:
+        classes = np.asarray(forest_spec["classes"], dtype=forest_spec["classes_dtype"])
+        forest = FlatForestClassifier(classes=classes, **kwargs)
+    else:
+        forest = FlatForest(**kwargs)
+
+    spec = header["encoder"]
+    if "shared" in spec:
+        shared, digest = load_shared_encoder(prep_path(os.path.dirname(path), spec["shared"]))
+        if digest != spec["sha256"]:
+            raise ValueError(f"Shared preprocessor '{spec['shared']}' changed since {os.path.basename(path)} was exported")
+        encoder = SharedFeatureView(shared, spec["shared"], spec["num_columns"], spec["cat_columns"])
+    else:
+        encoder = FeatureEncoder(**spec)
+    return CompiledPipeline(encoder, forest)
+
+
+def _read_pipeline(pkl_path):
+    with open(pkl_path, "rb") as f:
+        return pickle.load(f)
+
+
+def convert(pkl_path, pipeline=None):
+    """
+    Convert a pickled training Pipeline into a .flat artifact next to it,
+    referencing its declared shared preprocessor if that file covers it.
+    """
+    pipeline = pipeline if pipeline is not None else _read_pipeline(pkl_path)
+    encoder = FeatureEncoder.from_pipeline(pipeline)
+    digest = None
+    name = read_metadata(pkl_path).get("preprocessor")
+    shared_path = prep_path(os.path.dirname(pkl_path), name) if name else None
+    if shared_path and os.path.exists(shared_path):
+        shared, digest = load_shared_encoder(shared_path)
+        encoder = SharedFeatureView.of(encoder, shared, name) or encoder
+    model = CompiledPipeline(encoder, flatten_forest(pipeline.steps[-1][1]))
+    path = artifact_path(pkl_path)
+    save_artifact(model, path, digest)
+    return path
+
+
+def _declared_preprocessors(models_dir):
+    """{preprocessor name: [pkl names declaring it]} over every model in models_dir."""
+    groups = {}
+    for name in sorted(f for f in os.listdir(models_dir) if f.endswith(".pkl")):
+        prep = read_metadata(os.path.join(models_dir, name)).get("preprocessor")
+        if prep:
+            groups.setdefault(prep, []).append(name)
+    return groups
+
+
+def write_shared_preprocessors(models_dir, names, pipelines):
+    """
+    Write one <name>.prep.json per preprocessor declared by the named
+    models: the encoder of the member with the most input columns, as long
+    as it covers every other member. Members are all the models in
+    models_dir declaring that name, not just the named ones, so converting
+    one model never narrows the file its siblings' artifacts reference.
+    pipelines (name -> Pipeline) is filled in with any member read here.
+    Returns the preprocessor names whose file changed.
+    """
+    changed = set()
+    wanted = {read_metadata(os.path.join(models_dir, name)).get("preprocessor") for name in names}
+    for prep, members in _declared_preprocessors(models_dir).items():
+        if prep not in wanted:
+            continue
+        try:
+            for m in members:
+                if m not in pipelines:
+                    pipelines[m] = _read_pipeline(os.path.join(models_dir, m))
+            encoders = {m: FeatureEncoder.from_pipeline(pipelines[m]) for m in members}
+        except (OSError, pickle.UnpicklingError, ValueError, AttributeError) as e:
+            print(f"  [WARN] {prep}: not shareable ({e})")
+            continue
+        widest = max(members, key=lambda m: len(encoders[m].columns))
+        outliers = [m for m in members if not encoders[widest].covers(encoders[m])]
+        if outliers:
+            print(f"  [WARN] {prep}: {outliers} were fitted differently from {widest}; they keep their own encoders")
+        if save_shared_encoder(encoders[widest], prep_path(models_dir, prep))[1]:
+            changed.add(prep)
+        print(f"  [OK] {prep}.prep.json shared by {len(members) - len(outliers)} models")
+    return changed
+
+
+def check_shared_artifacts(models_dir, preps):
+    """
+    Load every artifact referencing one of preps and score a frame holding
+    only that model's own features through it; returns the names that fail.
+    """
+    import pandas as pd
+
+    failed = []
+    for prep in sorted(preps):
+        for name in _declared_preprocessors(models_dir).get(prep, []):
+            path = artifact_path(os.path.join(models_dir, name))
+            if not os.path.exists(path):
+                continue
+            try:
+                model = load_artifact(path)
+            except (OSError, ValueError) as e:
+                print(f"  [WARN] {os.path.basename(path)}: does not load against {prep}.prep.json ({e})")
+                failed.append(name)
+                continue
+            try:
+                model.predict(pd.DataFrame({column: [np.nan] for column in model.feature_names_in_}))
+            except (KeyError, ValueError) as e:
+                print(f"  [WARN] {os.path.basename(path)}: cannot score its own features via {prep}.prep.json ({e!r})")
+                failed.append(name)
+    return failed
+
+
+def convert_all(models_dir=MODELS_DIR, names=None):
+    """
+    Convert every (or the named) .pkl model in models_dir. When a shared
+    preprocessor file changes, every model referencing it is re-exported
+    too, then each of their artifacts is loaded back and scored as a check.
+    """
+    names = names or sorted(f for f in os.listdir(models_dir) if f.endswith(".pkl"))
+    pipelines = {}
+    for name in names:
+        try:
+            pipelines[name] = _read_pipeline(os.path.join(models_dir, name))
+        except (OSError, pickle.UnpicklingError) as e:
+            print(f"  [WARN] {name}: unreadable ({e})")
+    requested = list(pipelines)
+    changed = write_shared_preprocessors(models_dir, requested, pipelines)
+    groups = _declared_preprocessors(models_dir)
+    targets = set(requested).union(*(groups[p] for p in changed))
+    for name in sorted(targets):
+        pkl_path = os.path.join(models_dir, name)
+        try:
+            path = convert(pkl_path, pipelines.get(name))
+        except (ValueError, AttributeError, OSError) as e:
+            print(f"  [WARN] {name}: not convertible ({e})")
+            continue
+        size_kb = os.path.getsize(path) / 1024
+        print(f"  [OK] {name} -> {os.path.basename(path)} ({size_kb:.0f} KB)")
+    preps = {read_metadata(os.path.join(models_dir, name)).get("preprocessor") for name in targets} - {None}
+    return check_shared_artifacts(models_dir, preps)
+
+
+if __name__ == "__main__":
+    sys.exit(1 if convert_all(names=sys.argv[1:] or None) else 0)
@@ -0,0 +1,153 @@
+"""
+Offline batch scoring of CSV files, without the Flask server.
+Loads a model the same way the API does (get_model), maps the input
+through the columnar dataset cache (dataset.py) and scores it in chunks
+on a pool of worker processes, one per core by default. Workers slice
+their chunks out of the mapped file themselves, and results are appended
+to the output CSV as soon as each chunk finishes (in input order), so
+memory stays bounded by the chunk size and the number of chunks in
+flight.
+
+Usage:
+    python batch_score.py anomaly data/dataset1_anomaly_detection.csv scored.csv
+    python batch_score.py root_cause data/dataset3_rootcause_classifier.csv scored.csv --workers 4
+
+The input needs the model's feature columns (the dataset schemas under
+data/); any other columns are copied to the output unchanged. Classifiers
+add a "prediction" column plus one "proba_<class>" column per class,
+regressors just "prediction".
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+import app
+from dataset import load_dataset
+
+# Model and input being scored; set before the pool forks so workers inherit them
+_MODEL_NAME = None
+_MODEL = None
+_FRAME = None
+
+
+def score_chunk(start, stop):
+    """Predictions (and class probabilities, for classifiers) for rows start:stop."""
+    features = _FRAME.iloc[start:stop][list(_MODEL.feature_names_in_)]
+    if not hasattr(_MODEL, "predict_proba"):
+        return np.asarray(app.run_model(_MODEL_NAME, _MODEL, features)), None
+    # Label and probabilities from one pass over the trees
+    votes = app.run_model(_MODEL_NAME, _MODEL, features, "predict_votes")
+    predictions = np.asarray([label for label, _, _ in votes])
+    proba = np.asarray([p for _, p, _ in votes]).reshape(len(votes), len(_MODEL.classes_))
+    return predictions, proba
+
+
+def _output_frame(chunk, predictions, proba):
+    out = chunk.copy()
+    out["prediction"] = predictions
+    if proba is not None:
+        for j, cls in enumerate(_MODEL.classes_):
+            out[f"proba_{cls}"] = proba[:, j].round(4)
+    return out
+
+
+def _single_threaded(estimator):
+    # Worker processes already use every core; don't let each sklearn
+    # forest spawn its own threads on top
+    if hasattr(estimator, "n_jobs"):
+        estimator.n_jobs = 1
+
+
+def score_file(model_name, input_path, output_path, chunk_size=50000, workers=None):
+    """Score input_path with model_name, writing to output_path. Returns rows scored."""
+    global _MODEL_NAME, _MODEL, _FRAME
+    model = app.get_model(model_name)
+    if model is None:
+        raise RuntimeError(f"Model '{model_name}' is not available in {app.MODELS_DIR}")
+    _MODEL_NAME, _MODEL = model_name, model
+
+    header = pd.read_csv(input_path, nrows=0)
+    columns = set(header.columns.str.lower().str.strip())
+    missing = [c for c in _MODEL.feature_names_in_ if c not in columns]
+    if missing:
+        raise ValueError(f"Input is missing feature columns for {model_name}: {missing}")
+    # Workers read the features from the mapped cache; the pass-through
+    # columns are written from the CSV itself, parsed chunk by chunk in
+    # step with the results, so their values come out exactly as read
+    _FRAME = load_dataset(input_path, columns=list(_MODEL.feature_names_in_))
+    originals = pd.read_csv(input_path, chunksize=chunk_size)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        _single_threaded(getattr(model, "estimator", None) or model.steps[-1][1])
+
+    rows = 0
+    started = time.perf_counter()
+    first = True
+
+    def write(row_start, row_stop, result):
+        nonlocal rows, first
+        chunk = next(originals)
+        _output_frame(chunk, *result).to_csv(output_path, mode="w" if first else "a", header=first, index=False)
+        first = False
+        rows += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"  {rows:,} rows scored ({rows / elapsed:,.0f} rows/s)", flush=True)
+
+    chunks = [(start, min(start + chunk_size, len(_FRAME))) for start in range(0, len(_FRAME), chunk_size)]
+    if workers == 1:
+        for start, stop in chunks:
+            write(start, stop, score_chunk(start, stop))
+    else:
+        # Fork so workers share the already-loaded model and mapped input
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            # Keep a couple of chunks queued per worker, never the whole file
+            pending = deque()
+            for start, stop in chunks:
+                pending.append((start, stop, pool.submit(score_chunk, start, stop)))
+                if len(pending) >= 2 * workers:
+                    start, stop, future = pending.popleft()
+                    write(start, stop, future.result())
+            while pending:
+                start, stop, future = pending.popleft()
+                write(start, stop, future.result())
+
+    if first:
+        # Empty input: still leave a file with the output header
+        header.to_csv(output_path, index=False)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV file with one of the ML Engine models.")
+    parser.add_argument("model", choices=sorted(app.MODEL_FILES), help="model to score with")
+    parser.add_argument("input", help="input CSV file")
+    parser.add_argument("output", help="output CSV file (overwritten)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="rows per chunk (default 50000)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"[*] Scoring {args.input} with {args.model} ({workers} worker(s), {args.chunk_size:,} rows/chunk)")
+    start = time.perf_counter()
+    try:
+        rows = score_file(args.model, args.input, args.output, args.chunk_size, workers)
+    except (RuntimeError, ValueError) as e:
+        print(f"[WARN] {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+    print(f"[OK] {rows:,} rows -> {args.output} in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
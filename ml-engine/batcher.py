@@ -0,0 +1,103 @@
+"""
+Micro-batching scheduler for concurrent predictions.
+Requests for the same model arriving within a few milliseconds of each
+other are coalesced into one batched predict call and the results fanned
+back out. The first request of a window acts as the leader: it waits until
+the batch is full or max_wait has passed, runs the batch, and wakes the
+followers. No background threads are involved.
+"""
+
+import threading
+
+
+class _Batch:
+    def __init__(self):
+        self.rows = []
+        self.slices = []
+        self.results = None
+        self.errors = {}
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Coalesce concurrent row predictions per key into batched calls."""
+
+    def __init__(self, max_batch=64, max_wait=0.002):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches_run = 0
+        self.rows_run = 0
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def queue_depth(self):
+        """Rows waiting in open (not yet flushed) batches, per key."""
+        with self._lock:
+            return {key: len(batch.rows) for key, batch in self._open.items()}
+
+    def _close(self, key, batch):
+        # Caller holds the lock
+        if self._open.get(key) is batch:
+            del self._open[key]
+
+    def run(self, key, rows, fn):
+        """
+        Return fn(rows) as a list, possibly computed as part of a larger
+        batch shared with other threads submitting under the same key.
+        """
+        if len(rows) >= self.max_batch:
+            return list(fn(rows))
+
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+            start = len(batch.rows)
+            batch.rows.extend(rows)
+            batch.slices.append((start, len(rows)))
+            if len(batch.rows) >= self.max_batch:
+                self._close(key, batch)
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                self._close(key, batch)
+            self._flush(batch, fn)
+        else:
+            batch.done.wait()
+
+        if start in batch.errors:
+            raise batch.errors[start]
+        return batch.results[start:start + len(rows)]
+
+    def _flush(self, batch, fn):
+        try:
+            batch.results = list(fn(batch.rows))
+        except Exception:
+            # Don't let one bad request fail everyone in the batch: rerun
+            # each request's rows on their own and keep errors per request
+            batch.results = [None] * len(batch.rows)
+            for start, count in batch.slices:
+                try:
+                    batch.results[start:start + count] = list(fn(batch.rows[start:start + count]))
+                except Exception as e:
+                    batch.errors[start] = e
+        with self._lock:
+            self.batches_run += 1
+            self.rows_run += len(batch.rows)
+        batch.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches_run": self.batches_run,
+                "rows_run": self.rows_run,
+                "avg_batch_size": round(self.rows_run / self.batches_run, 2) if self.batches_run else 0.0,
+                "queue_depth": sum(len(b.rows) for b in self._open.values()),
+            }
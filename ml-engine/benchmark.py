@@ -0,0 +1,440 @@
+"""
+Benchmark suite for the ML Engine.
+Drives every route in app.py through the Flask test client (in-process)
+and through a real local gunicorn (over HTTP), each with a single client
+and with concurrent clients, and reports p50/p95/p99 latency, requests/s
+and peak RSS. It also micro-benchmarks each get_model() pipeline's
+predict() at batch sizes 1, 32 and 1024.
+
+Results are written as JSON. Pass a previous result as --baseline and
+the run fails (exit code 1) if any latency grew, or throughput dropped,
+by more than --threshold:
+    python benchmark.py --output bench-before.json
+    python benchmark.py --output bench-after.json --baseline bench-before.json --threshold 0.15
+
+Quick runs:
+    python benchmark.py --requests 50 --skip-gunicorn
+    python benchmark.py --only analyze,root-cause --skip-predict
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT, "data")
+
+BATCH_SIZES = [1, 32, 1024]
+
+# Compared against --baseline: (metric, True if higher is worse)
+COMPARED = [("p50_ms", True), ("p95_ms", True), ("rps", False)]
+
+# =====================
+# SCENARIOS
+# =====================
+ANALYZE_RECORD = {
+    "score": 62.5, "rolling_avg_7d": 80.2, "hour_of_day": 14, "day_of_week": 3,
+    "orders_volume": 1200, "staff_count": 45, "warehouse_id": "WH-001", "metric_id": "poi",
+}
+ROOT_CAUSE_RECORD = {
+    "poi_score": 55.0, "label_score": 30.0, "pick_score": 82.0, "pack_score": 85.0, "tt_score": 80.0,
+    "oa_score": 90.0, "orders_volume": 1500, "warehouse_id": "WH-002", "zone": "East",
+}
+SUB_METRICS = {"label_score": 78.0, "pick_score": 84.0, "pack_score": 87.0, "tt_score": 81.0}
+EVENT = {"warehouse_id": "WH-001", "metric_id": "poi", "value": 82.5, "hour_of_day": 14, "day_of_week": 3}
+
+
+def _ndjson(records):
+    return "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+
+
+# name -> (method, path, body, content type); run in this order, so the
+# series is ingested before it is read
+SCENARIOS = {
+    "health": ("GET", "/api/health", None, None),
+    "metrics": ("GET", "/api/metrics", None, None),
+    "models": ("GET", "/api/models", None, None),
+    "models-reload": ("POST", "/api/models/reload", {}, "application/json"),
+    "series-ingest": ("POST", "/api/series/ingest", {"events": [EVENT] * 10}, "application/json"),
+    "series": ("GET", "/api/series?warehouse_id=WH-001&metric_id=poi", None, None),
+    "detector-events": ("POST", "/api/detector/events", {"events": [EVENT] * 10}, "application/json"),
+    "detector": ("GET", "/api/detector", None, None),
+    "detector-snapshot": ("POST", "/api/detector/snapshot", {}, "application/json"),
+    "analyze": ("POST", "/api/analyze", ANALYZE_RECORD, "application/json"),
+    "analyze-batch": ("POST", "/api/analyze/batch", [ANALYZE_RECORD] * 32, "application/json"),
+    "root-cause": ("POST", "/api/root-cause", ROOT_CAUSE_RECORD, "application/json"),
+    "predict-poi": ("POST", "/api/predict/poi", {"warehouse_id": "WH-001", "orders_volume": 1200}, "application/json"),
+    "predict-poi-actual": ("POST", "/api/predict/poi-actual", SUB_METRICS, "application/json"),
+    "predict-wpt": ("POST", "/api/predict/wpt", SUB_METRICS, "application/json"),
+    "predict-otd": ("POST", "/api/predict/otd", SUB_METRICS, "application/json"),
+    "cascade": ("POST", "/api/predict/cascade",
+                dict(SUB_METRICS, **ANALYZE_RECORD, zone="North", analyze=True, root_cause=True), "application/json"),
+    "stream-analyze": ("POST", "/api/stream/analyze", _ndjson([ANALYZE_RECORD] * 100), "application/x-ndjson"),
+    "stream-root-cause": ("POST", "/api/stream/root-cause", _ndjson([ROOT_CAUSE_RECORD] * 100), "application/x-ndjson"),
+    "calculate-score": ("POST", "/api/calculate-score", {"orders_volume": 500, "staff_count": 10}, "application/json"),
+    "calculate-score-batch": ("POST", "/api/calculate-score/batch",
+                              [{"orders_volume": 500 + i, "staff_count": 10} for i in range(32)], "application/json"),
+}
+
+
+def _encode(body):
+    if body is None or isinstance(body, bytes):
+        return body
+    return json.dumps(body).encode("utf-8")
+
+
+# =====================
+# CLIENTS
+# =====================
+class TestClient:
+    """In-process requests through Flask's test client (one per thread)."""
+
+    name = "test_client"
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._local = threading.local()
+
+    def request(self, method, path, body, content_type):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, data=body, content_type=content_type)
+        response.get_data()  # drain streamed responses
+        return response.status_code
+
+    def peak_rss(self):
+        # ru_maxrss is in KB on Linux
+        return {"process_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+class HttpClient:
+    """Requests over HTTP to a server listening on 127.0.0.1:port."""
+
+    name = "gunicorn"
+
+    def __init__(self, port, master_pid=None):
+        self.port = port
+        self.master_pid = master_pid
+
+    def request(self, method, path, body, content_type):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            headers = {"Content-Type": content_type} if content_type else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    def peak_rss(self):
+        if self.master_pid is None:
+            return {}
+        workers = _child_pids(self.master_pid)
+        peaks = [_vm_hwm_mb(pid) for pid in workers]
+        peaks = [p for p in peaks if p is not None]
+        return {
+            "master_mb": _vm_hwm_mb(self.master_pid),
+            "worker_max_mb": max(peaks) if peaks else None,
+            "workers_total_mb": round(sum(peaks), 1) if peaks else None,
+        }
+
+
+def _vm_hwm_mb(pid):
+    """Peak resident set size of a process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _child_pids(pid):
+    children = []
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent pid; the command name may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, env, log_path, timeout=120):
+    """Start gunicorn on a free port and wait until /api/health answers 200."""
+    port = _free_port()
+    pid_file = os.path.join(os.path.dirname(log_path), "gunicorn.pid")
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}",
+           "-w", str(workers), "-p", pid_file, "app:app"]
+    log = open(log_path, "wb")
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    client = HttpClient(port, proc.pid)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {proc.returncode}, see {log_path}")
+        try:
+            if client.request("GET", "/api/health", None, None) == 200:
+                return proc, client
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"gunicorn did not become healthy within {timeout}s, see {log_path}")
+
+
+# =====================
+# MEASUREMENT
+# =====================
+def summarize(latencies, wall, errors):
+    """Latency percentiles (ms), throughput and error count of one run."""
+    ms = np.asarray(latencies) * 1000
+    if not len(ms):
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "rps": round(len(ms) / wall, 1) if wall > 0 else None,
+    }
+
+
+def run_load(client, scenario, n_requests, concurrency):
+    """Send n_requests of scenario from concurrency threads."""
+    method, path, body, content_type = scenario
+    body = _encode(body)
+    per_thread = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+
+    def worker(count):
+        latencies, errors = [], 0
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, body, content_type)
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - start)
+            if status is None or status >= 400:
+                errors += 1
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, [c for c in per_thread if c]))
+    wall = time.perf_counter() - started
+    return summarize([t for lat, _ in results for t in lat], wall, sum(e for _, e in results))
+
+
+def bench_routes(client, names, n_requests, concurrency):
+    """Single-client and concurrent runs of every scenario in names."""
+    results = {}
+    for name in names:
+        scenario = SCENARIOS[name]
+        client.request(*scenario[:2], _encode(scenario[2]), scenario[3])  # warm up
+        results[name] = {
+            "single": run_load(client, scenario, n_requests, 1),
+            "concurrent": run_load(client, scenario, n_requests, concurrency),
+            "peak_rss": client.peak_rss(),
+        }
+        single, conc = results[name]["single"], results[name]["concurrent"]
+        print(f"  {client.name:11s} {name:22s} p50 {single.get('p50_ms', 0):8.2f} ms  "
+              f"p99 {single.get('p99_ms', 0):8.2f} ms  x{concurrency}: {conc.get('rps') or 0:8.1f} req/s"
+              f"{'  errors ' + str(single['errors'] + conc['errors']) if single['errors'] + conc['errors'] else ''}")
+    return results
+
+
+def _sample_rows(app_module, model_name, model, n):
+    """n rows of the model's training dataset (repeated if it is smaller)."""
+    from dataset import load_dataset
+    from registry import read_metadata
+
+    path = app_module.resolve_model_path(app_module.MODEL_FILES[model_name])
+    dataset = read_metadata(path).get("dataset")
+    if not dataset or not os.path.exists(os.path.join(DATA_DIR, dataset)):
+        return None
+    df = load_dataset(os.path.join(DATA_DIR, dataset))[list(model.feature_names_in_)]
+    return df.iloc[np.arange(n) % len(df)].reset_index(drop=True)
+
+
+def bench_predict(app_module, batch_sizes=BATCH_SIZES, min_seconds=0.5, max_calls=500):
+    """predict() latency per call and rows/s for every model and batch size."""
+    results = {}
+    for model_name in app_module.MODEL_FILES:
+        model = app_module.get_model(model_name)
+        if model is None:
+            print(f"  [WARN] {model_name}: not loaded, skipped")
+            continue
+        rows = _sample_rows(app_module, model_name, model, max(batch_sizes))
+        if rows is None:
+            print(f"  [WARN] {model_name}: training dataset not found, skipped")
+            continue
+        results[model_name] = {}
+        for size in batch_sizes:
+            X = rows.iloc[:size]
+            model.predict(X)  # warm up
+            timings = []
+            deadline = time.perf_counter() + min_seconds
+            while len(timings) < 3 or (time.perf_counter() < deadline and len(timings) < max_calls):
+                start = time.perf_counter()
+                model.predict(X)
+                timings.append(time.perf_counter() - start)
+            stats = summarize(timings, sum(timings), 0)
+            stats["rows_per_s"] = round(size * len(timings) / sum(timings), 1)
+            results[model_name][str(size)] = stats
+            print(f"  predict {model_name:11s} batch {size:5d}  p50 {stats['p50_ms']:8.3f} ms  "
+                  f"{stats['rows_per_s']:12,.0f} rows/s")
+    return results
+
+
+# =====================
+# BASELINE COMPARISON
+# =====================
+def _flatten(tree, prefix=""):
+    for key, value in tree.items():
+        path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        else:
+            yield path, key, value
+
+
+def compare(result, baseline, threshold):
+    """Metrics that got worse than baseline by more than threshold (a fraction)."""
+    worse_if_higher = dict(COMPARED)
+    old = {path: value for path, _, value in _flatten(baseline.get("results", {}))}
+    regressions = []
+    for path, key, value in _flatten(result["results"]):
+        if key not in worse_if_higher or not isinstance(value, (int, float)):
+            continue
+        before = old.get(path)
+        if not isinstance(before, (int, float)) or before <= 0:
+            continue
+        change = (value - before) / before
+        if (change if worse_if_higher[key] else -change) > threshold:
+            regressions.append({"metric": path, "baseline": before, "current": value, "change": round(change, 3)})
+    return regressions
+
+
+# =====================
+# MAIN
+# =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ML Engine routes and model inference.")
+    parser.add_argument("--output", default="benchmark.json", help="result file (default benchmark.json)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and run (default 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients (default 8)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers (default 2)")
+    parser.add_argument("--only", help="comma-separated scenarios to run (default: all)")
+    parser.add_argument("--skip-test-client", action="store_true", help="don't benchmark through the test client")
+    parser.add_argument("--skip-gunicorn", action="store_true", help="don't benchmark through gunicorn")
+    parser.add_argument("--skip-predict", action="store_true", help="don't micro-benchmark predict()")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown vs --baseline as a fraction (default 0.10)")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}, expected some of {list(SCENARIOS)}")
+
+    # Keep benchmark side effects (detector snapshots) out of saved_models/
+    workdir = tempfile.mkdtemp(prefix="ml-bench-")
+    os.environ.setdefault("ML_DETECTOR_STATE", os.path.join(workdir, "online_detector.json"))
+    os.environ.setdefault("ML_DETECTOR_SNAPSHOT_INTERVAL", "0")
+    # Scenarios repeat the same payload; measure the models, not cache hits
+    os.environ.setdefault("ML_CACHE_SIZE", "0")
+
+    result = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "gunicorn_workers": args.workers,
+            "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith("ML_")},
+        },
+        "results": {},
+    }
+
+    sys.path.insert(0, ROOT)
+    import app as app_module
+
+    if not args.skip_test_client:
+        print("[*] Flask test client")
+        app_module.preload_models()
+        result["results"]["test_client"] = bench_routes(TestClient(app_module.app), names, args.requests,
+                                                        args.concurrency)
+
+    if not args.skip_gunicorn:
+        print(f"[*] gunicorn ({args.workers} worker(s))")
+        log_path = os.path.join(workdir, "gunicorn.log")
+        try:
+            proc, client = start_gunicorn(args.workers, dict(os.environ), log_path)
+        except (OSError, RuntimeError) as e:
+            print(f"[WARN] gunicorn benchmark skipped: {e}")
+        else:
+            try:
+                result["results"]["gunicorn"] = bench_routes(client, names, args.requests, args.concurrency)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    if not args.skip_predict:
+        print("[*] predict() micro-benchmarks")
+        result["results"]["predict"] = bench_predict(app_module)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        result["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "regressions": regressions}
+        for r in regressions:
+            print(f"[WARN] Regression: {r['metric']} {r['baseline']} -> {r['current']} ({r['change']:+.0%})")
+        if regressions:
+            status = 1
+        else:
+            print(f"[OK] No regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"[OK] Results -> {args.output}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
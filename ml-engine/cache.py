@@ -0,0 +1,101 @@
+"""
+Bounded LRU cache for model predictions.
+Entries are keyed by model name and version, prediction method and a
+canonicalized feature tuple (optionally with numeric features rounded),
+evicted by size and TTL, and dropped whenever the model they came from is
+reloaded.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+MISS = object()
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL cache of per-row model outputs."""
+
+    def __init__(self, max_size=10000, ttl=300.0, precision=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _canonical(self, value):
+        if isinstance(value, float):
+            if math.isnan(value):
+                return None
+            if self.precision is not None:
+                return round(value, self.precision)
+        elif self.precision is not None and isinstance(value, int) and not isinstance(value, bool):
+            return float(value)
+        return value
+
+    def key(self, model_name, method, row, version=None):
+        """Cache key for one feature row, or None if the row can't be hashed."""
+        key = (model_name, version, method, tuple(sorted((k, self._canonical(v)) for k, v in row.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        if key is None:
+            return MISS
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if key is None or not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model_name=None):
+        """Drop every entry for model_name (or everything)."""
+        with self._lock:
+            if model_name is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == model_name]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "precision": self.precision,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,188 @@
+"""
+Joint vs separate anomaly / z-score models.
+/api/analyze can score a record with the two dataset1 forests (the
+is_anomaly classifier and the z_score regressor) or with the single
+multi-output forest from training_scripts/train_anomaly_joint.py. This
+fits all three on the same train split of dataset1 and reports, on the
+held-out rows:
+
+  accuracy  - is_anomaly: accuracy, precision, recall, F1, ROC AUC
+              z_score:    MAE, RMSE, R^2
+  latency   - encode + traverse through the serving engine (FeatureEncoder
+              + flat forest) at batch sizes 1, 32 and 1024: the classifier's
+              predict_proba plus the regressor's predict, against one
+              predict of the joint forest
+
+Usage:
+    python compare_joint.py
+    python compare_joint.py --test-size 0.3 --output joint.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "training_scripts"))
+
+from dataset import load_dataset
+from encoder import compile_pipeline
+from forest import flatten_forest
+
+import train_anomaly
+import train_anomaly_joint
+import train_zscore
+
+DATA_DIR = os.path.join(ROOT, "data")
+BATCH_SIZES = (1, 32, 1024)
+
+
+def classification_report(y_true, proba):
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+
+    y_pred = (proba > 0.5).astype(int)
+    return {
+        "accuracy": round(float(accuracy_score(y_true, y_pred)), 4),
+        "precision": round(float(precision_score(y_true, y_pred, zero_division=0)), 4),
+        "recall": round(float(recall_score(y_true, y_pred, zero_division=0)), 4),
+        "f1": round(float(f1_score(y_true, y_pred, zero_division=0)), 4),
+        "roc_auc": round(float(roc_auc_score(y_true, proba)), 4),
+    }
+
+
+def regression_report(y_true, y_pred):
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    return {
+        "mae": round(float(mean_absolute_error(y_true, y_pred)), 4),
+        "rmse": round(float(np.sqrt(mean_squared_error(y_true, y_pred))), 4),
+        "r2": round(float(r2_score(y_true, y_pred)), 4),
+    }
+
+
+def p50_ms(fn, min_seconds=0.5, max_calls=500):
+    """Median wall time of fn() in milliseconds."""
+    fn()  # warm up
+    timings = []
+    deadline = time.perf_counter() + min_seconds
+    while len(timings) < 3 or (time.perf_counter() < deadline and len(timings) < max_calls):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return round(float(np.median(timings)) * 1000, 3)
+
+
+def fit_models(train, n_jobs):
+    """The three models fitted as their training scripts do; also returns the joint model's target scales."""
+    features = train_anomaly.num_features + train_anomaly.cat_features
+    X = train[features]
+    print(f"[*] Fitting on {len(train):,} rows...")
+    anomaly = train_anomaly.build_model(n_jobs).fit(X, train["is_anomaly"])
+    z_score = train_zscore.build_model(n_jobs).fit(X, train["z_score"])
+    joint = train_anomaly_joint.build_model(n_jobs)
+    scale = train_anomaly_joint.fit(joint, X, train[train_anomaly_joint.targets].astype(float))
+    return anomaly, z_score, joint, dict(zip(train_anomaly_joint.targets, scale.round(4).tolist()))
+
+
+def compare_accuracy(anomaly, z_score, joint, test):
+    features = train_anomaly.num_features + train_anomaly.cat_features
+    X = test[features]
+    y_anomaly, y_z = test["is_anomaly"].to_numpy(), test["z_score"].to_numpy()
+    joint_out = joint.predict(X)
+    return {
+        "separate": {
+            "is_anomaly": classification_report(y_anomaly, anomaly.predict_proba(X)[:, 1]),
+            "z_score": regression_report(y_z, z_score.predict(X)),
+        },
+        "joint": {
+            "is_anomaly": classification_report(y_anomaly, joint_out[:, 0]),
+            "z_score": regression_report(y_z, joint_out[:, 1]),
+        },
+    }
+
+
+def compare_latency(anomaly, z_score, joint, test, batch_sizes=BATCH_SIZES):
+    """p50 per call of the separate pair vs the joint forest, as served."""
+    anomaly, z_score, joint = (compile_pipeline(p, estimator=flatten_forest(p.steps[-1][1]))
+                               for p in (anomaly, z_score, joint))
+    rows = test[list(anomaly.feature_names_in_)]
+    rows = rows.iloc[np.arange(max(batch_sizes)) % len(rows)].reset_index(drop=True)
+
+    def separate(X):
+        # Same preprocessor: encode once, as score_analyze does
+        Xt = anomaly.transform(X)
+        anomaly.estimator.predict_proba(Xt)
+        z_score.estimator.predict(Xt)
+
+    def single(X):
+        joint.estimator.predict(joint.transform(X))
+
+    results = {}
+    for size in batch_sizes:
+        X = rows.iloc[:size]
+        results[str(size)] = {
+            "separate_ms": p50_ms(lambda: separate(X)),
+            "joint_ms": p50_ms(lambda: single(X)),
+        }
+        results[str(size)]["speedup"] = round(results[str(size)]["separate_ms"] / results[str(size)]["joint_ms"], 2)
+    return results
+
+
+def report(accuracy, latency, target_scale):
+    scales = ", ".join(f"{name} / {scale}" for name, scale in target_scale.items())
+    print(f"\n  note: the joint forest is fitted on standardized targets ({scales}) so that\n"
+          f"  neither output dominates the MSE splits they share; its leaves are scaled back")
+    print("\n  is_anomaly         accuracy  precision  recall      f1  roc_auc")
+    for name in ("separate", "joint"):
+        m = accuracy[name]["is_anomaly"]
+        print(f"  {name:16s} {m['accuracy']:10.4f} {m['precision']:10.4f} {m['recall']:7.4f} "
+              f"{m['f1']:7.4f} {m['roc_auc']:8.4f}")
+    print("\n  z_score               mae      rmse        r2")
+    for name in ("separate", "joint"):
+        m = accuracy[name]["z_score"]
+        print(f"  {name:16s} {m['mae']:9.4f} {m['rmse']:9.4f} {m['r2']:9.4f}")
+    print("\n  latency (p50)      separate     joint   speedup")
+    for size, m in latency.items():
+        print(f"  batch {size:>5s}    {m['separate_ms']:9.3f}ms {m['joint_ms']:8.3f}ms {m['speedup']:8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the joint anomaly + z-score model with the separate ones.")
+    parser.add_argument("--data", default=os.path.join(DATA_DIR, train_anomaly.DATASET), help="dataset1 CSV")
+    parser.add_argument("--test-size", type=float, default=0.2, help="held-out fraction (default 0.2)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="forest n_jobs while fitting (default -1)")
+    parser.add_argument("--skip-latency", action="store_true")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.data):
+        print(f"[WARN] Dataset not found: {args.data} (run train_all.py to generate it)")
+        return 1
+    df = load_dataset(args.data)
+    df.columns = df.columns.str.lower().str.strip()
+    test = df.sample(frac=args.test_size, random_state=42)
+    train = df.drop(test.index)
+
+    anomaly, z_score, joint, target_scale = fit_models(train, args.n_jobs)
+    result = {"rows": {"train": len(train), "test": len(test)},
+              "joint_target_scale": target_scale,
+              "accuracy": compare_accuracy(anomaly, z_score, joint, test)}
+    if not args.skip_latency:
+        print("[*] Timing inference...")
+        result["latency"] = compare_latency(anomaly, z_score, joint, test)
+    report(result["accuracy"], result.get("latency", {}), target_scale)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n[OK] Results -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,40 +2,73 @@
 Generate synthetic datasets for training all 7 ML models.
 Run: python data/generate_datasets.py
 Outputs 4 CSV files into data/ folder.
+
+Sizes are configurable for load testing, e.g. 50M rows over 5,000
+warehouses and 40 zones on 8 processes:
+    python data/generate_datasets.py --rows 50000000 --warehouses 5000 --zones 40 --workers 8
+
+Rows are generated in chunks, each from its own child of one
+np.random.SeedSequence, so the output depends only on --seed and
+--chunk-size (not on --workers). Chunks are built and formatted in
+parallel and written to the CSV in order as they finish, so memory stays
+bounded however many rows are requested.
 """
 
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
-import os
 
-np.random.seed(42)
 OUT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+sys.path.insert(0, os.path.dirname(OUT_DIR))
+from fileio import atomic_write
+
+SEED = 42
+CHUNK_SIZE = 250_000
+
+METRICS = ["poi", "otd", "oa", "dfr", "wpt", "tt", "pick", "label", "pack"]
+ZONES = ["North", "South", "East", "West", "Central"]
+ROOT_CAUSES = [
+    "label_issue", "pick_issue", "pack_issue",
+    "transit_delay", "order_accuracy", "staff_shortage", "system_failure"
+]
+
+
+def warehouse_ids(n):
+    return np.array([f"WH-{str(i).zfill(3)}" for i in range(1, n + 1)])
+
+
+def zone_names(n):
+    """The five named zones, then Zone-6, Zone-7, ... for larger fleets."""
+    return np.array(ZONES[:n] + [f"Zone-{i}" for i in range(len(ZONES) + 1, n + 1)])
+
+
 # =====================================================
 # Dataset 1: Anomaly Detection (10,000 rows)
 # Used by: Anomaly Detection model, Z-Score model
 # =====================================================
-def generate_dataset1():
-    n = 10000
-    warehouses = [f"WH-{str(i).zfill(3)}" for i in range(1, 11)]
-    metrics = ["poi", "otd", "oa", "dfr", "wpt", "tt", "pick", "label", "pack"]
-
+def dataset1_chunk(rng, n, n_warehouses=10, n_zones=5):
     data = {
-        "warehouse_id": np.random.choice(warehouses, n),
-        "metric_id": np.random.choice(metrics, n),
-        "hour_of_day": np.random.randint(0, 24, n),
-        "day_of_week": np.random.randint(0, 7, n),
-        "orders_volume": np.random.randint(200, 3000, n),
-        "staff_count": np.random.randint(10, 120, n),
+        "warehouse_id": rng.choice(warehouse_ids(n_warehouses), n),
+        "metric_id": rng.choice(METRICS, n),
+        "hour_of_day": rng.integers(0, 24, n),
+        "day_of_week": rng.integers(0, 7, n),
+        "orders_volume": rng.integers(200, 3000, n),
+        "staff_count": rng.integers(10, 120, n),
     }
 
     # Generate scores with realistic distribution
-    base_scores = np.random.normal(78, 15, n).clip(5, 100)
+    base_scores = rng.normal(78, 15, n).clip(5, 100)
     data["score"] = np.round(base_scores, 1)
 
     # Rolling average is smoothed version of score
     data["rolling_avg_7d"] = np.round(
-        base_scores + np.random.normal(0, 3, n), 1
+        base_scores + rng.normal(0, 3, n), 1
     ).clip(5, 100)
 
     # Z-score = (score - rolling_avg) / std
@@ -48,146 +81,115 @@ def generate_dataset1():
     ).astype(int)
 
     # Add some noise to make it realistic
-    flip_mask = np.random.random(n) < 0.05
+    flip_mask = rng.random(n) < 0.05
     data["is_anomaly"] = np.where(flip_mask, 1 - data["is_anomaly"], data["is_anomaly"])
 
-    df = pd.DataFrame(data)
-    path = os.path.join(OUT_DIR, "dataset1_anomaly_detection.csv")
-    df.to_csv(path, index=False)
-    print(f"[OK] Dataset 1: {len(df)} rows -> {path}")
-    return df
+    return pd.DataFrame(data)
 
 
 # =====================================================
 # Dataset 2: Score Forecasting (5,000 rows)
 # Used by: POI Forecasting model
 # =====================================================
-def generate_dataset2():
-    n = 5000
-    warehouses = [f"WH-{str(i).zfill(3)}" for i in range(1, 11)]
-
+def dataset2_chunk(rng, n, n_warehouses=10, n_zones=5):
     data = {
-        "warehouse_id": np.random.choice(warehouses, n),
-        "day_of_week": np.random.randint(0, 7, n),
-        "is_flash_sale_day": np.random.choice([0, 1], n, p=[0.85, 0.15]),
-        "orders_volume": np.random.randint(300, 2500, n),
+        "warehouse_id": rng.choice(warehouse_ids(n_warehouses), n),
+        "day_of_week": rng.integers(0, 7, n),
+        "is_flash_sale_day": rng.choice([0, 1], n, p=[0.85, 0.15]),
+        "orders_volume": rng.integers(300, 2500, n),
     }
 
     # Generate 7-day lag features with autocorrelation
-    base = np.random.normal(75, 12, n).clip(10, 100)
+    base = rng.normal(75, 12, n).clip(10, 100)
     for lag in range(1, 8):
-        noise = np.random.normal(0, 3, n)
+        noise = rng.normal(0, 3, n)
         data[f"poi_score_t_minus_{lag}"] = np.round((base + noise * lag * 0.3).clip(10, 100), 1)
 
     # Tomorrow's score is correlated with recent history
     recent_avg = np.mean([data[f"poi_score_t_minus_{i}"] for i in range(1, 4)], axis=0)
-    flash_penalty = np.where(np.array(data["is_flash_sale_day"]) == 1, -5, 0)
+    flash_penalty = np.where(data["is_flash_sale_day"] == 1, -5, 0)
     data["poi_score_tomorrow"] = np.round(
-        recent_avg + np.random.normal(0, 4, n) + flash_penalty, 1
+        recent_avg + rng.normal(0, 4, n) + flash_penalty, 1
     ).clip(10, 100)
 
-    df = pd.DataFrame(data)
-    path = os.path.join(OUT_DIR, "dataset2_score_forecasting.csv")
-    df.to_csv(path, index=False)
-    print(f"[OK] Dataset 2: {len(df)} rows -> {path}")
-    return df
+    return pd.DataFrame(data)
 
 
 # =====================================================
 # Dataset 3: Root Cause Classification (5,000 rows)
 # Used by: Root Cause model
 # =====================================================
-def generate_dataset3():
-    n = 5000
-    warehouses = [f"WH-{str(i).zfill(3)}" for i in range(1, 11)]
-    zones = ["North", "South", "East", "West", "Central"]
-    root_causes = [
-        "label_issue", "pick_issue", "pack_issue",
-        "transit_delay", "order_accuracy", "staff_shortage", "system_failure"
-    ]
-
+def dataset3_chunk(rng, n, n_warehouses=10, n_zones=5):
     data = {
-        "warehouse_id": np.random.choice(warehouses, n),
-        "zone": np.random.choice(zones, n),
-        "orders_volume": np.random.randint(200, 3000, n),
+        "warehouse_id": rng.choice(warehouse_ids(n_warehouses), n),
+        "zone": rng.choice(zone_names(n_zones), n),
+        "orders_volume": rng.integers(200, 3000, n),
     }
 
     # Generate scores that correlate with root causes
-    root_cause_arr = np.random.choice(root_causes, n)
+    root_cause_arr = rng.choice(ROOT_CAUSES, n)
     data["root_cause"] = root_cause_arr
 
     # Create scores that are realistic based on root cause
-    base_poi = np.random.normal(72, 15, n).clip(10, 100)
-    base_label = np.random.normal(80, 12, n).clip(5, 100)
-    base_pick = np.random.normal(85, 10, n).clip(10, 100)
-    base_pack = np.random.normal(88, 8, n).clip(10, 100)
-    base_tt = np.random.normal(82, 11, n).clip(10, 100)
-    base_oa = np.random.normal(90, 7, n).clip(10, 100)
+    base = {
+        "poi": rng.normal(72, 15, n).clip(10, 100),
+        "label": rng.normal(80, 12, n).clip(5, 100),
+        "pick": rng.normal(85, 10, n).clip(10, 100),
+        "pack": rng.normal(88, 8, n).clip(10, 100),
+        "tt": rng.normal(82, 11, n).clip(10, 100),
+        "oa": rng.normal(90, 7, n).clip(10, 100),
+    }
 
     # Degrade specific scores based on root cause
-    for i in range(n):
-        rc = root_cause_arr[i]
-        if rc == "label_issue":
-            base_label[i] = np.random.uniform(5, 35)
-        elif rc == "pick_issue":
-            base_pick[i] = np.random.uniform(15, 45)
-        elif rc == "pack_issue":
-            base_pack[i] = np.random.uniform(20, 45)
-        elif rc == "transit_delay":
-            base_tt[i] = np.random.uniform(10, 40)
-        elif rc == "order_accuracy":
-            base_oa[i] = np.random.uniform(15, 50)
-        elif rc == "staff_shortage":
-            base_pick[i] = np.random.uniform(25, 55)
-            base_pack[i] = np.random.uniform(25, 55)
-        elif rc == "system_failure":
-            base_label[i] = np.random.uniform(5, 25)
-            base_poi[i] = np.random.uniform(10, 35)
-
-    data["poi_score"] = np.round(base_poi, 1)
-    data["label_score"] = np.round(base_label, 1)
-    data["pick_score"] = np.round(base_pick, 1)
-    data["pack_score"] = np.round(base_pack, 1)
-    data["tt_score"] = np.round(base_tt, 1)
-    data["oa_score"] = np.round(base_oa, 1)
-
-    df = pd.DataFrame(data)
-    path = os.path.join(OUT_DIR, "dataset3_rootcause_classifier.csv")
-    df.to_csv(path, index=False)
-    print(f"[OK] Dataset 3: {len(df)} rows -> {path}")
-    return df
+    degrade = {
+        "label_issue": [("label", 5, 35)],
+        "pick_issue": [("pick", 15, 45)],
+        "pack_issue": [("pack", 20, 45)],
+        "transit_delay": [("tt", 10, 40)],
+        "order_accuracy": [("oa", 15, 50)],
+        "staff_shortage": [("pick", 25, 55), ("pack", 25, 55)],
+        "system_failure": [("label", 5, 25), ("poi", 10, 35)],
+    }
+    for root_cause, ranges in degrade.items():
+        mask = root_cause_arr == root_cause
+        count = int(mask.sum())
+        for score, low, high in ranges:
+            base[score][mask] = rng.uniform(low, high, count)
+
+    for score in ["poi", "label", "pick", "pack", "tt", "oa"]:
+        data[f"{score}_score"] = np.round(base[score], 1)
+
+    return pd.DataFrame(data)
 
 
 # =====================================================
 # Dataset 4: Weight Regression (5,000 rows)
 # Used by: WPT, OTD, POI Actual models
 # =====================================================
-def generate_dataset4():
-    n = 5000
-
-    label_score = np.round(np.random.normal(78, 18, n).clip(5, 100), 1)
-    pick_score = np.round(np.random.normal(85, 12, n).clip(10, 100), 1)
-    pack_score = np.round(np.random.normal(88, 10, n).clip(10, 100), 1)
-    tt_score = np.round(np.random.normal(82, 14, n).clip(10, 100), 1)
+def dataset4_chunk(rng, n, n_warehouses=10, n_zones=5):
+    label_score = np.round(rng.normal(78, 18, n).clip(5, 100), 1)
+    pick_score = np.round(rng.normal(85, 12, n).clip(10, 100), 1)
+    pack_score = np.round(rng.normal(88, 10, n).clip(10, 100), 1)
+    tt_score = np.round(rng.normal(82, 14, n).clip(10, 100), 1)
 
     # WPT = weighted combination of pick/pack/label
     wpt_score_actual = np.round(
-        0.30 * pick_score + 0.40 * label_score + 0.30 * pack_score + np.random.normal(0, 3, n), 1
+        0.30 * pick_score + 0.40 * label_score + 0.30 * pack_score + rng.normal(0, 3, n), 1
     ).clip(5, 100)
 
     # OTD = weighted combination of wpt + tt
     otd_score_actual = np.round(
-        0.55 * wpt_score_actual + 0.45 * tt_score + np.random.normal(0, 3, n), 1
+        0.55 * wpt_score_actual + 0.45 * tt_score + rng.normal(0, 3, n), 1
     ).clip(5, 100)
 
     # POI Actual = weighted OTD + OA + DFR (simulate OA and DFR)
-    oa_score = np.round(np.random.normal(92, 6, n).clip(10, 100), 1)
-    dfr_score = np.round(np.random.normal(95, 4, n).clip(10, 100), 1)
+    oa_score = np.round(rng.normal(92, 6, n).clip(10, 100), 1)
+    dfr_score = np.round(rng.normal(95, 4, n).clip(10, 100), 1)
     poi_score_actual = np.round(
-        0.60 * otd_score_actual + 0.25 * oa_score + 0.15 * dfr_score + np.random.normal(0, 2, n), 1
+        0.60 * otd_score_actual + 0.25 * oa_score + 0.15 * dfr_score + rng.normal(0, 2, n), 1
     ).clip(5, 100)
 
-    df = pd.DataFrame({
+    return pd.DataFrame({
         "label_score": label_score,
         "pick_score": pick_score,
         "pack_score": pack_score,
@@ -197,22 +199,91 @@ def generate_dataset4():
         "poi_score_actual": poi_score_actual,
     })
 
-    path = os.path.join(OUT_DIR, "dataset4_weight_regression.csv")
-    df.to_csv(path, index=False)
-    print(f"[OK] Dataset 4: {len(df)} rows -> {path}")
-    return df
+
+# number -> (chunk builder, output file, default rows)
+DATASETS = {
+    1: (dataset1_chunk, "dataset1_anomaly_detection.csv", 10000),
+    2: (dataset2_chunk, "dataset2_score_forecasting.csv", 5000),
+    3: (dataset3_chunk, "dataset3_rootcause_classifier.csv", 5000),
+    4: (dataset4_chunk, "dataset4_weight_regression.csv", 5000),
+}
+
+
+def _render_chunk(number, seed_seq, n, n_warehouses, n_zones, header):
+    """Build one chunk from its own seed and return it as CSV text."""
+    chunk_fn = DATASETS[number][0]
+    df = chunk_fn(np.random.default_rng(seed_seq), n, n_warehouses, n_zones)
+    return df.to_csv(index=False, header=header)
+
+
+def generate(number, rows=None, n_warehouses=10, n_zones=5, seed=SEED, chunk_size=CHUNK_SIZE,
+             workers=1, out_dir=OUT_DIR):
+    """Write dataset <number> in chunks; returns the number of rows written."""
+    _, filename, default_rows = DATASETS[number]
+    rows = default_rows if rows is None else rows
+    sizes = [min(chunk_size, rows - start) for start in range(0, rows, chunk_size)]
+    # Separate streams per dataset and per chunk, all derived from seed
+    seeds = np.random.SeedSequence([seed, number]).spawn(len(sizes))
+    args = [(number, s, n, n_warehouses, n_zones, i == 0) for i, (s, n) in enumerate(zip(seeds, sizes))]
+
+    path = os.path.join(out_dir, filename)
+    # Readers (and the dataset cache) only ever see a complete file
+    with atomic_write(path, "w", newline="") as f:
+        if workers <= 1 or len(args) <= 1:
+            for a in args:
+                f.write(_render_chunk(*a))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Keep a couple of chunks in flight per worker, in order
+                pending = deque()
+                for a in args:
+                    pending.append(pool.submit(_render_chunk, *a))
+                    if len(pending) >= 2 * workers:
+                        f.write(pending.popleft().result())
+                while pending:
+                    f.write(pending.popleft().result())
+    print(f"[OK] Dataset {number}: {rows} rows -> {path}")
+    return rows
+
+
+def generate_dataset1(**kwargs):
+    return generate(1, **kwargs)
+
+
+def generate_dataset2(**kwargs):
+    return generate(2, **kwargs)
+
+
+def generate_dataset3(**kwargs):
+    return generate(3, **kwargs)
+
+
+def generate_dataset4(**kwargs):
+    return generate(4, **kwargs)
 
 
 # =====================================================
 # MAIN
 # =====================================================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic training datasets.")
+    parser.add_argument("--datasets", type=int, nargs="+", choices=sorted(DATASETS), default=sorted(DATASETS),
+                        help="which datasets to generate (default: all)")
+    parser.add_argument("--rows", type=int, default=None,
+                        help="rows per dataset (default: 10,000 for dataset 1, 5,000 for the others)")
+    parser.add_argument("--warehouses", type=int, default=10, help="number of warehouses (default 10)")
+    parser.add_argument("--zones", type=int, default=5, help="number of zones (default 5)")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"root random seed (default {SEED})")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"rows per chunk (default {CHUNK_SIZE:,})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)")
+    parser.add_argument("--out-dir", default=OUT_DIR, help="output directory (default: data/)")
+    args = parser.parse_args()
+
     print("=" * 50)
     print("Generating synthetic training datasets...")
     print("=" * 50)
-    generate_dataset1()
-    generate_dataset2()
-    generate_dataset3()
-    generate_dataset4()
+    for number in args.datasets:
+        generate(number, rows=args.rows, n_warehouses=args.warehouses, n_zones=args.zones, seed=args.seed,
+                 chunk_size=args.chunk_size, workers=args.workers, out_dir=args.out_dir)
     print("\n[OK] All datasets generated successfully!")
-    print(f"Output directory: {OUT_DIR}")
+    print(f"Output directory: {args.out_dir}")
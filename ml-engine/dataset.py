@@ -0,0 +1,304 @@
+"""
+Columnar binary cache for CSV datasets.
+The first load of a CSV converts it to a typed columnar file under
+data/.cache/, named after the CSV's sha256, so an edited CSV gets a fresh
+cache automatically. Columns hold exactly the values pd.read_csv parses:
+float columns are stored as float32 when that represents every value
+exactly and as float64 otherwise, integer columns as the narrowest of
+int32/int64 that holds them, and text columns
+(warehouse_id, metric_id, zone, root_cause, ...) dictionary-encoded as
+int32 codes. Later loads map the file read-only and wrap the columns in
+place, so no parsing happens and unchanged pages are shared between
+processes. Caches are built from ML_DATASET_CHUNK_ROWS rows at a time,
+so converting a large CSV never holds all of it in memory.
+
+File layout: the container format of fileio.py (shared with the .flat
+model artifacts), one array per column.
+
+Prebuild caches with:
+    python dataset.py                       # every data/*.csv
+    python dataset.py data/dataset1_anomaly_detection.csv
+
+which also checks every cached value against pd.read_csv (exit code 1
+on any mismatch).
+"""
+
+import glob
+import mmap
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from fileio import layout, read_container, write_container
+from registry import file_sha256
+
+MAGIC = b"MLCOLS01"
+# Part of the cache file name: bumped whenever the encoding changes, so
+# caches written by older code are rebuilt instead of reused
+CACHE_VERSION = 2
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+
+
+def cache_path(csv_path, digest):
+    """Cache file for a CSV with the given content hash."""
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{digest[:16]}-v{CACHE_VERSION}.cols")
+
+
+def _fits_float32(values):
+    """Whether float32 holds every one of the float64 values exactly."""
+    with np.errstate(over="ignore"):
+        return bool(np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True))
+
+
+def _encode_column(series):
+    """(array, spec) for one column: float32/float64, int32/int64 or dictionary codes."""
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=np.int8), {"kind": "int"}
+    if pd.api.types.is_integer_dtype(series):
+        values = series.to_numpy()
+        fits = values.size == 0 or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max)
+        return values.astype(np.int32 if fits else np.int64), {"kind": "int"}
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype=np.float64)
+        return values.astype(np.float32) if _fits_float32(values) else values, {"kind": "float"}
+    # Text: dictionary-encode, -1 marks missing values
+    codes, categories = pd.factorize(series, sort=True, use_na_sentinel=True)
+    return codes.astype(np.int32), {"kind": "category", "categories": [str(c) for c in categories]}
+
+
+def write_cache(df, path, source=None):
+    """Write a DataFrame as a columnar cache file (atomically)."""
+    header = {"source": source, "rows": len(df), "columns": []}
+    encoded = [_encode_column(df[name]) for name in df.columns]
+    arrays = [np.ascontiguousarray(array) for array, _ in encoded]
+    offsets, _ = layout(array.nbytes for array in arrays)
+    for name, array, (_, spec), offset in zip(df.columns, arrays, encoded, offsets):
+        spec.update(name=str(name), dtype=array.dtype.str, offset=offset)
+        header["columns"].append(spec)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_container(path, MAGIC, header, zip(offsets, arrays))
+
+
+def read_cache(path, columns=None):
+    """Map a columnar cache file as a DataFrame (read-only, zero-copy columns)."""
+    header, buf, data_start = read_container(path, MAGIC, "dataset cache")
+    rows = header["rows"]
+
+    data = {}
+    for spec in header["columns"]:
+        if columns is not None and spec["name"] not in columns:
+            continue
+        array = np.frombuffer(buf, dtype=np.dtype(spec["dtype"]), count=rows, offset=data_start + spec["offset"])
+        if spec["kind"] == "category":
+            array = pd.Categorical.from_codes(array, categories=spec["categories"])
+        data[spec["name"]] = array
+    return pd.DataFrame(data, copy=False)
+
+
+# CSV rows parsed at a time while building a cache
+BUILD_CHUNK_ROWS = int(os.environ.get("ML_DATASET_CHUNK_ROWS", 100000))
+
+
+def _chunk_kind(series):
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    return "category"
+
+
+def _merge_kind(a, b):
+    """Column kind over two chunks, as pandas would infer it for the whole file."""
+    if a is None or a == b:
+        return b
+    if {a, b} == {"int", "float"}:
+        return "float"
+    return "category"  # text in either, or bools mixed with numbers
+
+
+def _scan_csv(csv_path, chunk_rows):
+    """
+    First pass: row count, column names and, per column, its kind, integer
+    range and whether float32 would hold it exactly.
+    """
+    rows, columns = 0, None
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        if columns is None:
+            columns = {name: {"kind": None, "min": 0, "max": 0, "float32": True} for name in chunk.columns}
+        for name, stats in columns.items():
+            series = chunk[name]
+            stats["kind"] = _merge_kind(stats["kind"], _chunk_kind(series))
+            if stats["kind"] == "int" and len(series):
+                stats["min"] = min(stats["min"], int(series.min()))
+                stats["max"] = max(stats["max"], int(series.max()))
+            if stats["kind"] in ("int", "float") and stats["float32"]:
+                stats["float32"] = _fits_float32(series.to_numpy(dtype=np.float64))
+        rows += len(chunk)
+    if columns is None:
+        # Header-only CSV: read_csv yields no chunks
+        columns = {name: {"kind": "category", "min": 0, "max": 0, "float32": True}
+                   for name in pd.read_csv(csv_path, nrows=0).columns}
+    return rows, columns
+
+
+def _column_dtype(stats):
+    if stats["kind"] == "bool":
+        return np.dtype(np.int8)
+    if stats["kind"] == "int":
+        fits = stats["min"] >= np.iinfo(np.int32).min and stats["max"] <= np.iinfo(np.int32).max
+        return np.dtype(np.int32 if fits else np.int64)
+    if stats["kind"] == "float":
+        return np.dtype(np.float32 if stats["float32"] else np.float64)
+    return np.dtype(np.int32)
+
+
+def _build_cache_chunked(csv_path, path, chunk_rows=BUILD_CHUNK_ROWS):
+    """
+    write_cache() for a CSV without ever holding all of it in memory: one
+    pass finds each column's type, a second encodes chunk by chunk into
+    the data section, and text codes are renumbered in place once the
+    full (sorted) category list is known.
+    """
+    rows, columns = _scan_csv(csv_path, chunk_rows)
+    names = list(columns)
+    text = [name for name in names if columns[name]["kind"] == "category"]
+    header = {"source": os.path.basename(csv_path), "rows": rows, "columns": []}
+    dtypes = [_column_dtype(columns[name]) for name in names]
+    offsets, data_size = layout(dtype.itemsize * rows for dtype in dtypes)
+    for name, dtype, offset in zip(names, dtypes, offsets):
+        kind = "int" if columns[name]["kind"] == "bool" else columns[name]["kind"]
+        # Same key order as write_cache(); categories are filled in at the end
+        spec = {"kind": kind, "categories": None} if kind == "category" else {"kind": kind}
+        spec.update(name=str(name).lower().strip(), dtype=dtype.str, offset=offset)
+        header["columns"].append(spec)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data_path = f"{path}.{os.getpid()}.data"
+    try:
+        with open(data_path, "wb+") as f:
+            f.truncate(data_size)
+            if data_size:
+                with mmap.mmap(f.fileno(), 0) as buf:
+                    seen = _encode_chunks(csv_path, buf, header["columns"], names, text, chunk_rows)
+                    _sort_categories(buf, header["columns"], names, seen, rows, chunk_rows)
+            for spec in header["columns"]:
+                if spec["kind"] == "category" and spec["categories"] is None:
+                    spec["categories"] = []  # no rows
+
+        with open(data_path, "rb") as data:
+            write_container(path, MAGIC, header, data_file=data)
+    finally:
+        if os.path.exists(data_path):
+            os.remove(data_path)
+
+
+def _encode_chunks(csv_path, buf, specs, names, text, chunk_rows):
+    """
+    Second pass: write every column of every chunk into the mapped data
+    section. Text columns get codes in order of first appearance; returns
+    {column: {value: code}} for them.
+    """
+    seen = {name: {} for name in text}
+    row = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype={name: str for name in text}):
+        for spec, name in zip(specs, names):
+            dtype = np.dtype(spec["dtype"])
+            out = np.frombuffer(buf, dtype=dtype, count=len(chunk), offset=spec["offset"] + row * dtype.itemsize)
+            if name in seen:
+                codes, uniques = pd.factorize(chunk[name], use_na_sentinel=True)
+                lookup = seen[name]
+                # Trailing -1 so missing values (code -1) stay -1
+                remap = np.array([lookup.setdefault(v, len(lookup)) for v in uniques] + [-1], dtype=np.int32)
+                out[:] = remap[codes]
+            else:
+                out[:] = chunk[name].to_numpy()
+        row += len(chunk)
+    return seen
+
+
+def _sort_categories(buf, specs, names, seen, rows, chunk_rows):
+    """Renumber text codes in place to the sorted category order read_cache expects."""
+    for spec, name in zip(specs, names):
+        if name not in seen:
+            continue
+        categories = sorted(seen[name])
+        order = np.full(len(categories) + 1, -1, dtype=np.int32)
+        for code, value in enumerate(categories):
+            order[seen[name][value]] = code
+        codes = np.frombuffer(buf, dtype=np.int32, count=rows, offset=spec["offset"])
+        for start in range(0, rows, chunk_rows):
+            codes[start:start + chunk_rows] = order[codes[start:start + chunk_rows]]
+        spec["categories"] = categories
+
+
+def verify_cache(csv_path, path, chunk_rows=BUILD_CHUNK_ROWS):
+    """Names of the columns whose cached values differ from what pd.read_csv parses, element-wise."""
+    cached = read_cache(path)
+    text = [name for name in pd.read_csv(csv_path, nrows=0).columns
+            if isinstance(cached[str(name).lower().strip()].dtype, pd.CategoricalDtype)]
+    mismatched, row = set(), 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype={name: str for name in text}):
+        for name in chunk.columns:
+            key = str(name).lower().strip()
+            dtype = object if name in text else np.float64
+            got = cached[key].iloc[row:row + len(chunk)].astype(dtype).reset_index(drop=True)
+            if not got.equals(chunk[name].astype(dtype).reset_index(drop=True)):
+                mismatched.add(key)
+        row += len(chunk)
+    if row != len(cached):
+        mismatched.add("<rows>")
+    return sorted(mismatched)
+
+
+def build_cache(csv_path):
+    """Convert csv_path to its columnar cache (if not already there); returns the cache path."""
+    path = cache_path(csv_path, file_sha256(csv_path))
+    if os.path.exists(path):
+        return path
+    _build_cache_chunked(csv_path, path)
+
+    # Drop caches of older versions of the same CSV
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    for old in glob.glob(os.path.join(CACHE_DIR, f"{stem}-*.cols")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+def load_dataset(csv_path, columns=None):
+    """
+    Load a CSV dataset through the columnar cache, with lowercased and
+    stripped column names. Falls back to parsing the CSV if the cache
+    directory isn't writable.
+    """
+    try:
+        return read_cache(build_cache(csv_path), columns)
+    except OSError as e:
+        print(f"[WARN] Dataset cache unavailable for {csv_path}, parsing CSV: {e}")
+        df = pd.read_csv(csv_path)
+        df.columns = df.columns.str.lower().str.strip()
+        return df[columns] if columns is not None else df
+
+
+if __name__ == "__main__":
+    failed = False
+    for csv_file in sys.argv[1:] or sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))):
+        cached = build_cache(csv_file)
+        mismatched = verify_cache(csv_file, cached)
+        if mismatched:
+            failed = True
+            print(f"  [WARN] {os.path.basename(csv_file)}: cache differs from the CSV in {', '.join(mismatched)}")
+            continue
+        print(f"  [OK] {os.path.basename(csv_file)} -> {os.path.relpath(cached, DATA_DIR)} "
+              f"({os.path.getsize(cached) / 1024:.0f} KB, CSV {os.path.getsize(csv_file) / 1024:.0f} KB)")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,340 @@
+"""
+Online streaming anomaly detector.
+Keeps an exponentially decayed mean and variance per (warehouse_id,
+metric_id), plus one per hour_of_day and per day_of_week bucket for
+seasonality, and scores each event against them in O(1) with constant
+memory per series - no forest involved. State can be snapshotted to a
+JSON file and restored on startup so restarts keep their baselines.
+
+The detector is per process. Under gunicorn every worker learns only from
+the events routed to it, and all of them snapshot to the same file: save()
+takes an exclusive lock on <path>.lock and merges into what is already
+there instead of overwriting it. Each worker writes only the series it
+has updated since its last save or restore, slot by slot keeping
+whichever copy has seen more events, and keeps every other worker's
+series. It also adopts the merged baselines for the series it hasn't
+touched, so the workers converge at every snapshot interval. For exact
+baselines, send detector events to a single worker.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: single-process dev server, no locking
+    fcntl = None
+
+from fileio import atomic_write
+from timeseries import parse_timestamp
+
+# Slot layout of every series' stats: overall, then 24 hours, then 7 days
+GLOBAL = 0
+HOUR_BASE = 1
+DOW_BASE = HOUR_BASE + 24
+N_SLOTS = DOW_BASE + 7
+
+STATE_VERSION = 1
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared by every process saving to path."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class _SeriesStats:
+    """EWMA mean / variance / count for every slot of one series."""
+
+    __slots__ = ("means", "variances", "counts")
+
+    def __init__(self, means=None, variances=None, counts=None):
+        self.means = means or [0.0] * N_SLOTS
+        self.variances = variances or [0.0] * N_SLOTS
+        self.counts = counts or [0] * N_SLOTS
+
+    def merged(self, other):
+        """Per slot, the stats of whichever of self / other has seen more events."""
+        merged = _SeriesStats(list(self.means), list(self.variances), list(self.counts))
+        for slot in range(N_SLOTS):
+            if other.counts[slot] > merged.counts[slot]:
+                merged.means[slot] = other.means[slot]
+                merged.variances[slot] = other.variances[slot]
+                merged.counts[slot] = other.counts[slot]
+        return merged
+
+    def update(self, slot, value, alpha):
+        count = self.counts[slot] + 1
+        self.counts[slot] = count
+        if count == 1:
+            self.means[slot] = value
+            self.variances[slot] = 0.0
+            return
+        # Plain running average until there are 1/alpha points, then decay
+        a = max(alpha, 1.0 / count)
+        diff = value - self.means[slot]
+        incr = a * diff
+        self.means[slot] += incr
+        self.variances[slot] = (1 - a) * (self.variances[slot] + diff * incr)
+
+
+class OnlineAnomalyDetector:
+    """
+    Seasonal EWMA z-score detector.
+    alpha: decay per event (higher adapts faster)
+    threshold: |z| at or above which an event is an anomaly
+    min_count: events a slot needs before it is used as a baseline
+    min_std: floor on the standard deviation, so flat series don't flag
+             every tiny change
+    """
+
+    def __init__(self, alpha=0.05, threshold=3.0, min_count=10, min_std=1.0):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_count = min_count
+        self.min_std = min_std
+        self.events = 0
+        self.anomalies = 0
+        self._series = {}
+        self._lock = threading.Lock()
+        self._saver = None
+        # Series updated, and event counts, since the last save / restore
+        self._dirty = set()
+        self._saved_events = 0
+        self._saved_anomalies = 0
+
+    def __len__(self):
+        return len(self._series)
+
+    # ---------------------
+    # Scoring
+    # ---------------------
+    @staticmethod
+    def _calendar(event):
+        """hour_of_day and day_of_week from the event, else from its timestamp."""
+        hour = event.get("hour_of_day")
+        dow = event.get("day_of_week")
+        if hour is None or dow is None:
+            when = datetime.fromtimestamp(parse_timestamp(event.get("timestamp")), timezone.utc)
+            hour = when.hour if hour is None else hour
+            dow = when.weekday() if dow is None else dow
+        hour, dow = int(hour), int(dow)
+        if not 0 <= hour <= 23 or not 0 <= dow <= 6:
+            raise ValueError("hour_of_day must be 0-23 and day_of_week 0-6")
+        return hour, dow
+
+    def _baseline(self, stats, hour, dow):
+        """Expected value, standard deviation and whether seasonality was used."""
+        if stats.counts[GLOBAL] < self.min_count:
+            return None, None, False
+        hour_slot, dow_slot = HOUR_BASE + hour, DOW_BASE + dow
+        seasonal = False
+        if stats.counts[hour_slot] >= self.min_count:
+            expected, variance = stats.means[hour_slot], stats.variances[hour_slot]
+            seasonal = True
+        else:
+            expected, variance = stats.means[GLOBAL], stats.variances[GLOBAL]
+        if stats.counts[dow_slot] >= self.min_count:
+            # Weekday effect as an offset from the overall level
+            expected += stats.means[dow_slot] - stats.means[GLOBAL]
+            seasonal = True
+        return expected, max(math.sqrt(variance), self.min_std), seasonal
+
+    def _result(self, value, expected, std, seasonal, count):
+        if expected is None:
+            return {"z_score": 0.0, "is_anomaly": False, "expected": None, "std": None,
+                    "seasonal": False, "count": count, "warm": False}
+        z = (value - expected) / std
+        return {
+            "z_score": round(z, 4),
+            "is_anomaly": abs(z) >= self.threshold,
+            "expected": round(expected, 4),
+            "std": round(std, 4),
+            "seasonal": seasonal,
+            "count": count,
+            "warm": True,
+        }
+
+    def score(self, warehouse_id, metric_id, value, hour_of_day=None, day_of_week=None, timestamp=None):
+        """Score a value against the current baseline without learning from it."""
+        hour, dow = self._calendar({"hour_of_day": hour_of_day, "day_of_week": day_of_week, "timestamp": timestamp})
+        value = float(value)
+        with self._lock:
+            stats = self._series.get((str(warehouse_id), str(metric_id)))
+            if stats is None:
+                return self._result(value, None, None, False, 0)
+            expected, std, seasonal = self._baseline(stats, hour, dow)
+            return self._result(value, expected, std, seasonal, stats.counts[GLOBAL])
+
+    def observe(self, event):
+        """
+        Score one event against its series' baseline, then update the
+        baseline with it. Event fields: warehouse_id, metric_id, value (or
+        score), and hour_of_day / day_of_week or a timestamp.
+        """
+        key = (str(event["warehouse_id"]), str(event["metric_id"]))
+        value = event.get("value", event.get("score"))
+        if value is None or isinstance(value, bool):
+            raise ValueError("value must be numeric")
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError("value must be finite")
+        hour, dow = self._calendar(event)
+
+        with self._lock:
+            stats = self._series.get(key)
+            if stats is None:
+                stats = self._series[key] = _SeriesStats()
+            expected, std, seasonal = self._baseline(stats, hour, dow)
+            result = self._result(value, expected, std, seasonal, stats.counts[GLOBAL])
+
+            # Learn from a clipped value so one outlier can't drag the baseline
+            learn = value
+            if expected is not None:
+                bound = self.threshold * std
+                learn = min(max(value, expected - bound), expected + bound)
+            for slot in (GLOBAL, HOUR_BASE + hour, DOW_BASE + dow):
+                stats.update(slot, learn, self.alpha)
+            self._dirty.add(key)
+
+            self.events += 1
+            if result["is_anomaly"]:
+                self.anomalies += 1
+        return result
+
+    def observe_many(self, events):
+        """observe() every event; failures become {"error": ...} entries."""
+        results = []
+        for event in events:
+            try:
+                results.append(self.observe(event))
+            except (KeyError, TypeError, ValueError) as e:
+                results.append({"error": f"{type(e).__name__}: {e}"})
+        return results
+
+    def describe(self, warehouse_id, metric_id):
+        with self._lock:
+            stats = self._series.get((str(warehouse_id), str(metric_id)))
+            if stats is None:
+                return None
+
+            def slot(i):
+                return {"mean": round(stats.means[i], 4), "std": round(math.sqrt(stats.variances[i]), 4),
+                        "count": stats.counts[i]}
+
+            return {
+                "warehouse_id": str(warehouse_id),
+                "metric_id": str(metric_id),
+                "overall": slot(GLOBAL),
+                "hour_of_day": {h: slot(HOUR_BASE + h) for h in range(24) if stats.counts[HOUR_BASE + h]},
+                "day_of_week": {d: slot(DOW_BASE + d) for d in range(7) if stats.counts[DOW_BASE + d]},
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "events": self.events,
+                "anomalies": self.anomalies,
+                "alpha": self.alpha,
+                "threshold": self.threshold,
+            }
+
+    # ---------------------
+    # Snapshot / restore
+    # ---------------------
+    def save(self, path):
+        """
+        Merge every series' baseline into the snapshot at path (atomically,
+        under a lock shared with the other workers); returns the number of
+        series saved.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _file_lock(path):
+            on_disk = self._read_state(path) if os.path.exists(path) else None
+            with self._lock:
+                series = dict(on_disk["series"]) if on_disk else {}
+                for key in self._dirty:
+                    ours = self._series[key]
+                    series[key] = ours.merged(series[key]) if key in series else ours
+                # Pick up what the other workers learned about series we haven't touched
+                for key, stats in series.items():
+                    if key not in self._dirty:
+                        self._series[key] = _SeriesStats(list(stats.means), list(stats.variances), list(stats.counts))
+                events = (on_disk["events"] if on_disk else 0) + self.events - self._saved_events
+                anomalies = (on_disk["anomalies"] if on_disk else 0) + self.anomalies - self._saved_anomalies
+                state = {
+                    "version": STATE_VERSION,
+                    "saved_at": datetime.now(timezone.utc).isoformat(),
+                    "events": events,
+                    "anomalies": anomalies,
+                    "series": [
+                        [warehouse_id, metric_id, stats.means, stats.variances, stats.counts]
+                        for (warehouse_id, metric_id), stats in series.items()
+                    ],
+                }
+                payload = json.dumps(state)
+                self._dirty.clear()
+                self._saved_events, self._saved_anomalies = self.events, self.anomalies
+            with atomic_write(path, "w") as f:
+                f.write(payload)
+        return len(state["series"])
+
+    @staticmethod
+    def _read_state(path):
+        """{"series": {key: _SeriesStats}, "events": n, "anomalies": n} from a snapshot file."""
+        with open(path) as f:
+            state = json.load(f)
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported detector state version: {state.get('version')}")
+        series = {}
+        for warehouse_id, metric_id, means, variances, counts in state["series"]:
+            if len(means) != N_SLOTS or len(variances) != N_SLOTS or len(counts) != N_SLOTS:
+                raise ValueError(f"Bad slot count for {warehouse_id}/{metric_id}")
+            series[(warehouse_id, metric_id)] = _SeriesStats(
+                [float(v) for v in means], [float(v) for v in variances], [int(v) for v in counts]
+            )
+        return {"series": series, "events": state.get("events", 0), "anomalies": state.get("anomalies", 0)}
+
+    def restore(self, path):
+        """Replace the current baselines with the ones saved at path."""
+        state = self._read_state(path)
+        with self._lock:
+            self._series = state["series"]
+            self.events = self._saved_events = state["events"]
+            self.anomalies = self._saved_anomalies = state["anomalies"]
+            self._dirty.clear()
+        return len(self._series)
+
+    def start_snapshots(self, path, interval):
+        """Save to path every interval seconds from a background thread."""
+        if self._saver is not None or interval <= 0 or not path:
+            return
+
+        def save_loop():
+            last_events = None
+            while True:
+                time.sleep(interval)
+                if self.events == last_events:
+                    continue
+                try:
+                    self.save(path)
+                    last_events = self.events
+                except OSError as e:
+                    print(f"[WARN] Detector snapshot failed: {e}")
+
+        self._saver = threading.Thread(target=save_loop, name="detector-snapshots", daemon=True)
+        self._saver.start()
@@ -0,0 +1,249 @@
+"""
+Compiled feature encoder for single-row and small-batch inference.
+Extracts the fitted imputer / scaler / one-hot parameters from a saved
+Pipeline's ColumnTransformer and applies them with plain numpy, going
+straight from request dicts to the float32 matrix the forest consumes.
+Outputs match the sklearn preprocessing path exactly.
+"""
+
+import numpy as np
+
+
+def _is_missing(value):
+    """Mirror SimpleImputer's default missing_values=np.nan check."""
+    return isinstance(value, float) and value != value
+
+
+def _column(X, name):
+    """Pull one column out of a list of dicts or a column mapping (DataFrame)."""
+    if isinstance(X, list):
+        return [row.get(name, np.nan) for row in X]
+    if name not in X:
+        # Absent like a missing dict key: a shared encoder's input holds
+        # columns only the other models read
+        return np.full(len(X), np.nan)
+    return X[name]
+
+
+class FeatureEncoder:
+    """Flat numpy version of the training scripts' ColumnTransformer."""
+
+    def __init__(self, num_columns, medians, means, scales, cat_columns, cat_fill, categories):
+        self.num_columns = list(num_columns)
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.cat_columns = list(cat_columns)
+        self.cat_fill = list(cat_fill)
+        self.categories = [list(c) for c in categories]
+
+        # Output column of every known category value, per categorical column
+        offset = len(self.num_columns)
+        self._lookup = []
+        self._cat_offsets = []
+        for cats in self.categories:
+            self._lookup.append({value: offset + i for i, value in enumerate(cats)})
+            self._cat_offsets.append(offset)
+            offset += len(cats)
+        self.n_features_out = offset
+
+    @property
+    def columns(self):
+        """Input feature names, in the order the pipeline was fitted on."""
+        return self.num_columns + self.cat_columns
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Compile the preprocessor of a fitted training Pipeline."""
+        preprocessor = pipeline.steps[0][1]
+        if not hasattr(preprocessor, "transformers_"):
+            raise ValueError("Pipeline does not start with a fitted ColumnTransformer")
+
+        num_columns, medians, means, scales = [], [], [], []
+        cat_columns, cat_fill, categories = [], [], []
+        seen_cat = False
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop" or len(columns) == 0:
+                continue
+            steps = dict(transformer.steps) if hasattr(transformer, "steps") else {}
+            imputer = steps.get("imputer")
+            if imputer is None:
+                raise ValueError(f"Transformer '{name}' has no imputer step")
+
+            if "encoder" in steps:
+                seen_cat = True
+                encoder = steps["encoder"]
+                if encoder.handle_unknown != "ignore" or encoder.drop is not None:
+                    raise ValueError(f"Unsupported OneHotEncoder settings in '{name}'")
+                cat_columns.extend(columns)
+                cat_fill.extend(imputer.statistics_)
+                categories.extend(encoder.categories_)
+            else:
+                # Output layout is numeric block first, then one-hot blocks
+                if seen_cat:
+                    raise ValueError("Numeric transformers must come before categorical ones")
+                scaler = steps.get("scaler")
+                n = len(columns)
+                num_columns.extend(columns)
+                medians.extend(imputer.statistics_)
+                means.extend(scaler.mean_ if scaler is not None and scaler.mean_ is not None else np.zeros(n))
+                scales.extend(scaler.scale_ if scaler is not None and scaler.scale_ is not None else np.ones(n))
+        return cls(num_columns, medians, means, scales, cat_columns, cat_fill, categories)
+
+    def output_index(self, num_columns, cat_columns):
+        """
+        Positions in this encoder's output of the columns an encoder over
+        just num_columns + cat_columns would produce, in its order.
+        """
+        index = [self.num_columns.index(name) for name in num_columns]
+        for name in cat_columns:
+            j = self.cat_columns.index(name)
+            index.extend(range(self._cat_offsets[j], self._cat_offsets[j] + len(self.categories[j])))
+        return np.asarray(index, dtype=np.intp)
+
+    def covers(self, other):
+        """Whether other encodes exactly like this encoder restricted to other's columns."""
+        if not set(other.num_columns) <= set(self.num_columns) or not set(other.cat_columns) <= set(self.cat_columns):
+            return False
+        num = [self.num_columns.index(name) for name in other.num_columns]
+        cat = [self.cat_columns.index(name) for name in other.cat_columns]
+        return (
+            np.array_equal(self.medians[num], other.medians)
+            and np.array_equal(self.means[num], other.means)
+            and np.array_equal(self.scales[num], other.scales)
+            and [self.cat_fill[j] for j in cat] == other.cat_fill
+            and [self.categories[j] for j in cat] == other.categories
+        )
+
+    def encode_numeric(self, name, values):
+        """One numeric input column encoded exactly as transform() would (float32)."""
+        j = self.num_columns.index(name)
+        v = np.asarray(values, dtype=np.float64)
+        v = np.where(np.isnan(v), self.medians[j], v)
+        return ((v - self.means[j]) / self.scales[j]).astype(np.float32)
+
+    def transform(self, X):
+        """Encode a list of feature dicts (or a DataFrame) to a float32 matrix."""
+        n_rows = len(X)
+        out = np.zeros((n_rows, self.n_features_out), dtype=np.float32)
+
+        if self.num_columns:
+            num = np.empty((n_rows, len(self.num_columns)), dtype=np.float64)
+            for j, name in enumerate(self.num_columns):
+                num[:, j] = np.asarray(_column(X, name), dtype=np.float64)
+            num = np.where(np.isnan(num), self.medians, num)
+            num -= self.means
+            num /= self.scales
+            out[:, :len(self.num_columns)] = num
+
+        rows = np.arange(n_rows)
+        for name, fill, lookup in zip(self.cat_columns, self.cat_fill, self._lookup):
+            values = _column(X, name)
+            cols = np.fromiter(
+                (lookup.get(fill if _is_missing(v) else v, -1) for v in values),
+                dtype=np.intp, count=n_rows,
+            )
+            known = cols >= 0
+            out[rows[known], cols[known]] = 1.0
+
+        return out
+
+
+class SharedFeatureView:
+    """
+    A model's view of a FeatureEncoder shared by several models (fitted on
+    the same data): its feature matrix is a column selection of the shared
+    encoder's output, so callers that score several of these models can
+    encode once and select() per model.
+    """
+
+    def __init__(self, shared, name, num_columns, cat_columns):
+        self.shared = shared
+        self.name = name
+        self.num_columns = list(num_columns)
+        self.cat_columns = list(cat_columns)
+        self.index = shared.output_index(self.num_columns, self.cat_columns)
+        self.n_features_out = len(self.index)
+        # Same columns in the same order: use the shared output as-is
+        self._identity = np.array_equal(self.index, np.arange(shared.n_features_out))
+
+    @classmethod
+    def of(cls, encoder, shared, name):
+        """View of shared standing in for encoder, or None if it doesn't encode the same way."""
+        if not isinstance(encoder, FeatureEncoder) or not shared.covers(encoder):
+            return None
+        return cls(shared, name, encoder.num_columns, encoder.cat_columns)
+
+    @property
+    def columns(self):
+        return self.num_columns + self.cat_columns
+
+    def select(self, Xt):
+        """This model's columns of a matrix produced by the shared encoder."""
+        return Xt if self._identity else Xt[:, self.index]
+
+    def transform(self, X):
+        return self.select(self.shared.transform(X))
+
+
+class FramePreprocessor:
+    """Adapter giving a pipeline's sklearn preprocessing the FeatureEncoder interface."""
+
+    def __init__(self, pipeline):
+        self.preprocessor = pipeline[:-1]
+
+    @property
+    def columns(self):
+        return list(self.preprocessor.feature_names_in_)
+
+    def transform(self, X):
+        import pandas as pd
+
+        if isinstance(X, list):
+            X = pd.DataFrame(X)
+        Xt = self.preprocessor.transform(X)
+        if hasattr(Xt, "toarray"):
+            Xt = Xt.toarray()
+        return np.asarray(Xt, dtype=np.float32)
+
+
+class CompiledPipeline:
+    """A fitted estimator fed by a FeatureEncoder instead of a ColumnTransformer."""
+
+    def __init__(self, encoder, estimator):
+        self.encoder = encoder
+        self.estimator = estimator
+        # Only classifiers expose predict_proba, so hasattr() checks keep working
+        if hasattr(estimator, "predict_proba"):
+            self.predict_proba = self._predict_proba
+
+    @property
+    def classes_(self):
+        return self.estimator.classes_
+
+    @property
+    def feature_names_in_(self):
+        return self.encoder.columns
+
+    def transform(self, X):
+        return self.encoder.transform(X)
+
+    def predict(self, X):
+        return self.estimator.predict(self.encoder.transform(X))
+
+    def _predict_proba(self, X):
+        return self.estimator.predict_proba(self.encoder.transform(X))
+
+
+def compile_pipeline(pipeline, compiled_features=True, estimator=None):
+    """
+    Wrap a fitted training Pipeline into a CompiledPipeline.
+    compiled_features=False keeps sklearn preprocessing behind the same
+    interface; estimator replaces the pipeline's own final step (e.g. a
+    FlatForest built from it).
+    """
+    if compiled_features:
+        encoder = FeatureEncoder.from_pipeline(pipeline)
+    else:
+        encoder = FramePreprocessor(pipeline)
+    return CompiledPipeline(encoder, estimator if estimator is not None else pipeline.steps[-1][1])
@@ -0,0 +1,102 @@
+"""
+File helpers shared by the model artifacts, the dataset cache and the
+other files the engine writes while something may be reading them.
+
+atomic_write() writes to a temp file next to the target and renames it
+into place, so readers (the model watcher, the dataset cache, other
+workers) only ever see a complete file.
+
+The binary container used by .flat artifacts (artifacts.py) and .cols
+dataset caches (dataset.py) is: an 8-byte magic, a uint64 header length,
+a JSON header, then the data section starting at the next 64-byte
+boundary. Offsets in the header are relative to the data section and
+arrays in it are 64-byte aligned, so they can be mapped in place.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+ALIGNMENT = 64
+
+
+def align(offset):
+    """offset rounded up to the next ALIGNMENT boundary."""
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+@contextmanager
+def atomic_write(path, mode="wb", **kwargs):
+    """
+    Open a temp file for writing and move it over path once the block
+    completes. The temp name is per process and thread, so concurrent
+    writers of the same path don't clobber each other's temp file; on
+    error it is removed and path is left untouched.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def layout(sizes):
+    """Aligned data-section offsets for blocks of the given byte sizes, and the section size."""
+    offsets, offset = [], 0
+    for size in sizes:
+        offset = align(offset)
+        offsets.append(offset)
+        offset += size
+    return offsets, offset
+
+
+def write_container(path, magic, header, arrays=(), data_file=None):
+    """
+    Write a container file atomically. arrays are (offset, ndarray) pairs
+    placed at those data-section offsets; data_file, if given, is an open
+    file holding the whole data section, copied in as is.
+    """
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = align(len(magic) + 8 + len(header_bytes))
+    with atomic_write(path) as f:
+        f.write(magic)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        if data_file is not None:
+            f.seek(data_start)
+            shutil.copyfileobj(data_file, f, 1 << 20)
+        end = data_start
+        for offset, array in arrays:
+            f.seek(data_start + offset)
+            f.write(np.ascontiguousarray(array).tobytes())
+            end = max(end, data_start + offset + array.nbytes)
+        # Readers map every offset, even of empty arrays, so the file
+        # always reaches the data section
+        if f.seek(0, os.SEEK_END) < end:
+            f.truncate(end)
+
+
+def read_container(path, magic, what="container"):
+    """
+    Map a container file read-only: (header, buffer, data_start). Arrays
+    built on the buffer with np.frombuffer keep the map alive.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    if buf[:len(magic)] != magic:
+        raise ValueError(f"Not a {what}: {path}")
+    (header_len,) = struct.unpack_from("<Q", buf, len(magic))
+    header_start = len(magic) + 8
+    header = json.loads(bytes(buf[header_start:header_start + header_len]))
+    return header, buf, align(header_start + header_len)
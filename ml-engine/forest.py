@@ -0,0 +1,167 @@
+"""
+Flattened-array random forest inference.
+Exports the fitted trees of a RandomForestClassifier / RandomForestRegressor
+into contiguous node arrays (feature, threshold, left, right, value) and
+walks every tree for every row at once with vectorized numpy indexing.
+This skips sklearn's per-call validation and joblib dispatch, which is
+most of the cost of a one-row predict.
+"""
+
+import numpy as np
+
+
+class FlatForest:
+    """All trees of a fitted forest packed into shared node arrays."""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features_in):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features_in)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_estimator(cls, estimator, **extra):
+        """Pack the fitted trees of a sklearn forest into flat arrays."""
+        trees = [est.tree_ for est in estimator.estimators_]
+        offsets = np.cumsum([0] + [t.node_count for t in trees])
+
+        features, thresholds, lefts, rights, values = [], [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            # Leaves point back at themselves, so a step that doesn't move
+            # means the row has reached its leaf in that tree
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+            values.append(cls._node_values(tree.value))
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.int32),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.int32),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.int32),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.ascontiguousarray(offsets[:-1], dtype=np.int32),
+            max_depth=max(t.max_depth for t in trees),
+            n_features_in=estimator.n_features_in_,
+            **extra,
+        )
+
+    @staticmethod
+    def _node_values(value):
+        """Per-node outputs, shape (n_nodes, n_outputs)."""
+        return value[:, :, 0]
+
+    def apply(self, X):
+        """Leaf node index reached in every tree, shape (n_rows, n_trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+
+        nodes = np.tile(self.roots, n_rows)
+        row_base = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, self.n_trees)
+        # Only (row, tree) pairs still on an internal node take another step
+        active = np.arange(nodes.size)
+        for _ in range(self.max_depth):
+            current = nodes[active]
+            x = flat_X[row_base[active] + self.feature[current]]
+            # float32 inputs compared against float64 thresholds, as sklearn does
+            step = np.where(x <= self.threshold[current], self.left[current], self.right[current])
+            nodes[active] = step
+            active = active[step != current]
+            if not active.size:
+                break
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def _tree_mean(self, X):
+        """Average the per-tree leaf values, summed tree by tree like sklearn."""
+        leaf_values = self.value[self.apply(X)]
+        return leaf_values.cumsum(axis=1)[:, -1] / self.n_trees
+
+    def predict(self, X):
+        out = self._tree_mean(X)
+        return out[:, 0] if out.shape[1] == 1 else out
+
+
+class FlatForestClassifier(FlatForest):
+    """FlatForest for RandomForestClassifier: leaf values are class fractions."""
+
+    def __init__(self, *args, classes=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.classes_ = np.asarray(classes)
+
+    @staticmethod
+    def _node_values(value):
+        proba = value[:, 0, :].astype(np.float64)
+        normalizer = proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        return proba / normalizer
+
+    def predict_proba(self, X):
+        return self._tree_mean(X)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def predict_votes(self, X):
+        """predict, predict_proba and the vote spread from one traversal (see votes())."""
+        tree_proba = self.value[self.apply(X)]
+        return votes(self.classes_, tree_proba.cumsum(axis=1)[:, -1] / self.n_trees, tree_proba)
+
+
+def votes(classes, proba, tree_proba):
+    """
+    One (label, proba, spread) tuple per row. proba is the row's averaged
+    class probabilities and label its argmax class, as predict_proba /
+    predict return them; spread is the standard deviation across trees of
+    each tree's probability for that class: 0 when every tree agrees,
+    up to 0.5 when they split evenly. tree_proba is (n_rows, n_trees,
+    n_classes).
+    """
+    best = np.argmax(proba, axis=1)
+    spread = np.take_along_axis(tree_proba, best[:, None, None], axis=2)[:, :, 0].std(axis=1)
+    return list(zip(classes[best], proba, spread))
+
+
+def predict_votes(estimator, X):
+    """
+    predict_votes() of any fitted forest classifier: FlatForestClassifier's
+    own, or the per-tree probabilities of a sklearn forest summed in
+    estimator order, as its predict_proba does.
+    """
+    if hasattr(estimator, "predict_votes"):
+        return estimator.predict_votes(X)
+    tree_proba = np.stack([tree.predict_proba(X) for tree in estimator.estimators_], axis=1)
+    return votes(estimator.classes_, tree_proba.cumsum(axis=1)[:, -1] / len(estimator.estimators_), tree_proba)
+
+
+def scale_outputs(trees, scale):
+    """
+    Multiply the leaf values of fitted sklearn regression trees by scale
+    (one factor per output), in place. Leaves hold target means, so trees
+    fitted on targets divided by scale then predict the original targets.
+    """
+    scale = np.asarray(scale, dtype=np.float64).reshape(1, -1, 1)
+    for tree in trees:
+        tree.tree_.value[...] *= scale
+
+
+def flatten_forest(estimator):
+    """Build the FlatForest matching a fitted sklearn forest."""
+    if not hasattr(estimator, "estimators_"):
+        raise ValueError(f"{type(estimator).__name__} is not a fitted forest")
+    if hasattr(estimator, "classes_"):
+        if getattr(estimator, "n_outputs_", 1) != 1:
+            raise ValueError("Multi-output classifiers are not supported")
+        return FlatForestClassifier.from_estimator(estimator, classes=estimator.classes_)
+    return FlatForest.from_estimator(estimator)
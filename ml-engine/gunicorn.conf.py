@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for the ML Engine.
+Models are loaded and warmed once in the master process, then workers are
+forked from it so the model arrays are shared copy-on-write. Set
+ML_PRELOAD=0 to fall back to lazy per-worker loading.
+"""
+
+import gc
+import os
+
+preload_app = os.environ.get("ML_PRELOAD", "1") == "1"
+
+# Micro-batching (ML_MICROBATCH=1) only coalesces requests that are in
+# flight at the same time, which needs threaded workers
+if os.environ.get("ML_MICROBATCH", "0") == "1":
+    worker_class = "gthread"
+    threads = int(os.environ.get("ML_WORKER_THREADS", 8))
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import app
+
+    app.preload_models()
+    # Move everything allocated so far out of the collector's reach so that
+    # garbage collection in the workers doesn't write to (and copy) the
+    # pages holding the preloaded models
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Background threads don't survive fork, so each worker starts its own
+    import app
+
+    app.REGISTRY.start_watcher(app.MODEL_WATCH_INTERVAL)
+    # Workers share the snapshot file; each save merges into it under a lock
+    app.DETECTOR.start_snapshots(app.DETECTOR_STATE, app.DETECTOR_SNAPSHOT_INTERVAL)
+    # Each live series update reaches one worker only, so with several no
+    # worker's series store is complete (the backend falls back to the DB)
+    if server.cfg.workers > 1:
+        app.SERIES.complete_since = None
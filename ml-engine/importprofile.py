@@ -0,0 +1,96 @@
+"""
+Import-time profile of the ML Engine.
+Imports a module (app by default) in a fresh interpreter with
+`python -X importtime` and reports what its import costs: the slowest
+modules by cumulative time, and the total per top-level package, so a
+heavy import that sneaks into the serving path shows up immediately.
+
+Usage:
+    python importprofile.py                  # import app
+    python importprofile.py score --top 15
+    python importprofile.py app --json imports.json
+
+A running server reports its own import and warm-up times under
+"startup" in GET /api/health.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def profile_imports(module="app", env=None):
+    """
+    [(module, self_us, cumulative_us, depth)] for every import triggered
+    by importing module, in the order the interpreter reported them.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def by_package(entries):
+    """Self time summed per top-level package, in microseconds."""
+    totals = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        totals[name.split(".")[0]] += self_us
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def report(module, entries, top=20):
+    total_us = sum(self_us for _, self_us, _, _ in entries)
+    print(f"[*] import {module}: {total_us / 1e6:.3f}s over {len(entries)} modules")
+    print(f"\n  {'slowest modules (cumulative)':48s} {'cumulative':>11s} {'self':>9s}")
+    for name, self_us, cumulative_us, _ in sorted(entries, key=lambda e: -e[2])[:top]:
+        print(f"  {name:48s} {cumulative_us / 1000:9.1f}ms {self_us / 1000:7.1f}ms")
+    print(f"\n  {'by package (self time)':48s} {'total':>11s} {'share':>9s}")
+    for package, self_us in list(by_package(entries).items())[:top]:
+        print(f"  {package:48s} {self_us / 1000:9.1f}ms {self_us / max(total_us, 1):8.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report what importing an ML Engine module costs.")
+    parser.add_argument("module", nargs="?", default="app", help="module to import (default app)")
+    parser.add_argument("--top", type=int, default=20, help="rows per table (default 20)")
+    parser.add_argument("--json", help="also write the full profile as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        entries = profile_imports(args.module)
+    except RuntimeError as e:
+        print(f"[WARN] {e}")
+        return 1
+    report(args.module, entries, args.top)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "module": args.module,
+                "total_us": sum(e[1] for e in entries),
+                "packages_us": by_package(entries),
+                "modules": [{"module": n, "self_us": s, "cumulative_us": c, "depth": d} for n, s, c, d in entries],
+            }, f, indent=2)
+        print(f"\n[OK] Profile -> {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,450 @@
+"""
+Load generator replaying the backend's traffic mix against the ML Engine.
+Synthesises the calls the backend makes - /api/ml/sync (the metric tree
+cascade), /api/ml/analyze and /api/ml/root-cause from routes/ml.ts, and
+calculate-score from routes/admin.ts warehouse setup - and sends them
+with asyncio as an open-loop Poisson stream whose rate follows a profile:
+
+    diurnal     one simulated day over the run, peaking mid-afternoon
+    flash-sale  the diurnal day with a flash-sale spike: several times the
+                traffic, more sync calls, higher volumes and lower scores
+    ramp        rate rising linearly from start_rps to peak_rps, to find
+                the point where the engine saturates
+
+Arrivals don't wait for earlier responses, so an overloaded engine shows
+up as growing latency and errors instead of a politely slower client.
+Latency distributions and error rates are reported per endpoint and per
+time window; a window is saturated when its p95 exceeds --slo-ms, its
+error rate exceeds --max-error-rate or requests had to be dropped at
+--max-inflight. The capacity estimate is the highest offered rate of a
+window that was not saturated.
+
+Usage:
+    python loadtest.py --profile ramp --peak-rps 400 --duration 120 --start 4
+    python loadtest.py --profile flash-sale --url http://127.0.0.1:5001 --output flash.json
+    python loadtest.py --profile-file peak_season.json   # overrides a built-in profile
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+METRICS = ["poi", "otd", "oa", "dfr", "wpt", "tt", "pick", "label", "pack"]
+ZONES = ["North", "South", "East", "West", "Central"]
+
+# =====================
+# PROFILES
+# =====================
+# mix: share of each backend call; peak_hour/width shape the diurnal curve
+# (a Gaussian around peak_hour over a floor); flash_sale multiplies the
+# rate between start_hour and end_hour of the simulated day
+PROFILES = {
+    "diurnal": {
+        "shape": "diurnal", "peak_rps": 50, "floor": 0.15, "peak_hour": 14, "width": 4.5,
+        "mix": {"sync": 0.15, "analyze": 0.45, "root-cause": 0.15, "calculate-score": 0.25},
+        "warehouses": 50, "flash_sale": None,
+    },
+    "flash-sale": {
+        "shape": "diurnal", "peak_rps": 50, "floor": 0.15, "peak_hour": 14, "width": 4.5,
+        "mix": {"sync": 0.25, "analyze": 0.45, "root-cause": 0.2, "calculate-score": 0.1},
+        "warehouses": 50,
+        "flash_sale": {"start_hour": 10, "end_hour": 13, "multiplier": 4.0},
+    },
+    "ramp": {
+        "shape": "ramp", "start_rps": 5, "peak_rps": 300,
+        "mix": {"sync": 0.15, "analyze": 0.45, "root-cause": 0.15, "calculate-score": 0.25},
+        "warehouses": 50, "flash_sale": None,
+    },
+}
+
+
+def offered_rate(profile, t, duration):
+    """Target requests/s at t seconds into the run."""
+    if profile["shape"] == "ramp":
+        return profile["start_rps"] + (profile["peak_rps"] - profile["start_rps"]) * t / duration
+    hour = simulated_hour(t, duration)
+    distance = min(abs(hour - profile["peak_hour"]), 24 - abs(hour - profile["peak_hour"]))
+    shape = profile["floor"] + (1 - profile["floor"]) * math.exp(-(distance / profile["width"]) ** 2)
+    return profile["peak_rps"] * shape * (flash_multiplier(profile, hour) or 1.0)
+
+
+def simulated_hour(t, duration):
+    """The run covers one simulated day, midnight to midnight."""
+    return 24.0 * t / duration
+
+
+def flash_multiplier(profile, hour):
+    sale = profile.get("flash_sale")
+    if sale and sale["start_hour"] <= hour < sale["end_hour"]:
+        return sale["multiplier"]
+    return None
+
+
+# =====================
+# PAYLOADS
+# =====================
+# What the backend sends for each call: (path, body builder)
+def _clip(value, low=5.0, high=100.0):
+    return round(min(max(value, low), high), 1)
+
+
+def sync_body(rng, ctx):
+    """routes/ml.ts /sync: sub-metric scores of the latest snapshot -> cascade."""
+    drop = 12 if ctx["flash"] else 0
+    return {
+        "label_score": _clip(rng.gauss(80 - drop, 12)),
+        "pick_score": _clip(rng.gauss(85 - drop, 10)),
+        "pack_score": _clip(rng.gauss(87 - drop, 8)),
+        "tt_score": _clip(rng.gauss(82 - drop, 11)),
+        "oa_score": _clip(rng.gauss(92, 6)),
+        "dfr_score": _clip(rng.gauss(95, 4)),
+        "warehouse_id": ctx["warehouse_id"],
+    }
+
+
+def analyze_body(rng, ctx):
+    """routes/ml.ts /analyze, as the dashboards call it."""
+    rolling = _clip(rng.gauss(80, 8))
+    score = _clip(rolling + rng.gauss(-10 if ctx["flash"] else 0, 8))
+    return {
+        "score": score,
+        "rolling_avg_7d": rolling,
+        "hour_of_day": ctx["hour"],
+        "day_of_week": ctx["day_of_week"],
+        "orders_volume": ctx["orders_volume"],
+        "staff_count": rng.randint(10, 120),
+        "warehouse_id": ctx["warehouse_id"],
+        "metric_id": rng.choice(METRICS),
+    }
+
+
+def root_cause_body(rng, ctx):
+    drop = 15 if ctx["flash"] else 0
+    return {
+        "poi_score": _clip(rng.gauss(72 - drop, 15)),
+        "label_score": _clip(rng.gauss(80, 12)),
+        "pick_score": _clip(rng.gauss(85 - drop, 10)),
+        "pack_score": _clip(rng.gauss(88 - drop, 8)),
+        "tt_score": _clip(rng.gauss(82, 11)),
+        "oa_score": _clip(rng.gauss(90, 7)),
+        "orders_volume": ctx["orders_volume"],
+        "warehouse_id": ctx["warehouse_id"],
+        "zone": rng.choice(ZONES),
+    }
+
+
+def calculate_score_body(rng, ctx):
+    """routes/admin.ts warehouse setup -> /api/calculate-score."""
+    return {
+        "metric_id": rng.choice(METRICS),
+        "rolling_avg_7d": _clip(rng.gauss(80, 8)),
+        "staff_count": rng.randint(10, 120),
+        "hour_of_day": ctx["hour"],
+        "day_of_week": ctx["day_of_week"],
+        "orders_volume": ctx["orders_volume"],
+    }
+
+
+CALLS = {
+    "sync": ("/api/predict/cascade", sync_body),
+    "analyze": ("/api/analyze", analyze_body),
+    "root-cause": ("/api/root-cause", root_cause_body),
+    "calculate-score": ("/api/calculate-score", calculate_score_body),
+}
+
+
+def make_request(rng, profile, t, duration):
+    """(call name, path, JSON body) for one arrival at t."""
+    hour = simulated_hour(t, duration)
+    flash = flash_multiplier(profile, hour) is not None
+    mix = profile["mix"]
+    call = rng.choices(list(mix), weights=list(mix.values()))[0]
+    ctx = {
+        "hour": int(hour) % 24,
+        "day_of_week": rng.randint(0, 6),
+        "flash": flash,
+        "warehouse_id": f"WH-{rng.randint(1, profile['warehouses']):03d}",
+        "orders_volume": rng.randint(1500, 6000) if flash else rng.randint(200, 3000),
+    }
+    path, build = CALLS[call]
+    return call, path, json.dumps(build(rng, ctx)).encode("utf-8")
+
+
+# =====================
+# HTTP
+# =====================
+async def post(host, port, path, body, timeout):
+    """POST a JSON body over a fresh connection; returns the status code."""
+    async def exchange():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+            return int(status_line.split()[1])
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+# =====================
+# RECORDING
+# =====================
+class Recorder:
+    """Latency and outcome of every request, by endpoint and by second sent."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)      # call -> seconds
+        self.errors = defaultdict(lambda: defaultdict(int))  # call -> kind -> count
+        self.seconds = defaultdict(lambda: {"offered": 0, "dropped": 0, "errors": 0, "latencies": []})
+        self.inflight = 0
+        self.peak_inflight = 0
+
+    def offered(self, second):
+        self.seconds[second]["offered"] += 1
+
+    def dropped(self, call, second):
+        self.seconds[second]["dropped"] += 1
+        self.errors[call]["dropped"] += 1
+
+    def done(self, call, second, latency, error=None):
+        bucket = self.seconds[second]
+        if error:
+            self.errors[call][error] += 1
+            bucket["errors"] += 1
+        else:
+            self.latencies[call].append(latency)
+            bucket["latencies"].append(latency)
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {}
+    ms = np.asarray(latencies) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 2) for q in (50, 90, 95, 99)} | {
+        "max_ms": round(float(ms.max()), 2)
+    }
+
+
+def endpoint_report(recorder):
+    report = {}
+    for call in sorted(set(recorder.latencies) | set(recorder.errors)):
+        ok = len(recorder.latencies[call])
+        errors = dict(recorder.errors[call])
+        total = ok + sum(errors.values())
+        report[call] = {
+            "requests": total,
+            "ok": ok,
+            "errors": errors,
+            "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+            **_percentiles(recorder.latencies[call]),
+        }
+    return report
+
+
+def window_report(recorder, window, duration, slo_ms, max_error_rate):
+    """Per-window offered/achieved rate, latency and saturation flag."""
+    windows = []
+    for start in range(0, int(math.ceil(duration)), window):
+        buckets = [recorder.seconds[s] for s in range(start, start + window) if s in recorder.seconds]
+        offered = sum(b["offered"] for b in buckets)
+        if not offered:
+            continue
+        latencies = [lat for b in buckets for lat in b["latencies"]]
+        errors = sum(b["errors"] for b in buckets)
+        dropped = sum(b["dropped"] for b in buckets)
+        error_rate = (errors + dropped) / offered
+        stats = _percentiles(latencies)
+        reasons = []
+        if stats and stats["p95_ms"] > slo_ms:
+            reasons.append("latency")
+        if error_rate > max_error_rate:
+            reasons.append("errors")
+        if dropped:
+            reasons.append("client_inflight_limit")
+        windows.append({
+            "start_s": start,
+            "offered_rps": round(offered / window, 1),
+            "achieved_rps": round(len(latencies) / window, 1),
+            "error_rate": round(error_rate, 4),
+            **{k: v for k, v in stats.items() if k in ("p50_ms", "p95_ms", "p99_ms")},
+            "saturated": bool(reasons),
+            "reasons": reasons,
+        })
+    return windows
+
+
+def saturation_summary(windows):
+    healthy = [w["offered_rps"] for w in windows if not w["saturated"]]
+    first = next((w for w in windows if w["saturated"]), None)
+    return {
+        "capacity_rps": max(healthy) if healthy else None,
+        "first_saturated_window": first,
+        "saturated_windows": sum(w["saturated"] for w in windows),
+    }
+
+
+# =====================
+# RUN
+# =====================
+async def run_load(host, port, profile, duration, seed, timeout, max_inflight, recorder):
+    """Send arrivals for duration seconds, then wait for the stragglers."""
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    async def one(call, path, body, second):
+        recorder.inflight += 1
+        recorder.peak_inflight = max(recorder.peak_inflight, recorder.inflight)
+        start = time.perf_counter()
+        try:
+            status = await post(host, port, path, body, timeout)
+            error = None if status < 400 else f"http_{status}"
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except (OSError, ValueError, IndexError) as e:
+            error = type(e).__name__
+        finally:
+            recorder.inflight -= 1
+        recorder.done(call, second, time.perf_counter() - start, error)
+
+    started = loop.time()
+    t = 0.0
+    while t < duration:
+        delay = started + t - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        call, path, body = make_request(rng, profile, t, duration)
+        second = int(t)
+        recorder.offered(second)
+        if recorder.inflight >= max_inflight:
+            recorder.dropped(call, second)
+        else:
+            task = asyncio.create_task(one(call, path, body, second))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        rate = offered_rate(profile, t, duration)
+        t += rng.expovariate(rate) if rate > 0 else 0.1
+    if tasks:
+        await asyncio.gather(*tasks)
+    return loop.time() - started
+
+
+def load_profile(name, profile_file=None, **overrides):
+    profile = json.loads(json.dumps(PROFILES[name]))
+    if profile_file:
+        with open(profile_file) as f:
+            profile.update(json.load(f))
+    profile.update({k: v for k, v in overrides.items() if v is not None})
+    unknown = [call for call in profile["mix"] if call not in CALLS]
+    if unknown:
+        raise ValueError(f"Unknown calls in mix: {unknown}, expected some of {list(CALLS)}")
+    return profile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the backend's traffic mix against the ML Engine.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="diurnal", help="traffic profile (default diurnal)")
+    parser.add_argument("--profile-file", help="JSON file with profile fields overriding the built-in ones")
+    parser.add_argument("--peak-rps", type=float, help="peak offered rate (overrides the profile)")
+    parser.add_argument("--duration", type=float, default=60, help="run length in seconds; one simulated day (default 60)")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="engine to load (default http://127.0.0.1:5001)")
+    parser.add_argument("--start", type=int, metavar="WORKERS",
+                        help="start a local gunicorn with this many workers instead of using --url")
+    parser.add_argument("--timeout", type=float, default=10, help="per-request timeout in seconds (default 10)")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="drop arrivals beyond this many open requests")
+    parser.add_argument("--window", type=int, default=5, help="seconds per saturation window (default 5)")
+    parser.add_argument("--slo-ms", type=float, default=250, help="p95 latency above which a window is saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="error rate above which a window is saturated")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for arrivals and payloads (default 42)")
+    parser.add_argument("--output", help="write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        profile = load_profile(args.profile, args.profile_file, peak_rps=args.peak_rps)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARN] Bad profile: {e}")
+        return 2
+
+    proc = None
+    if args.start:
+        from benchmark import start_gunicorn
+
+        log_path = os.path.join(tempfile.mkdtemp(prefix="ml-load-"), "gunicorn.log")
+        print(f"[*] Starting gunicorn with {args.start} worker(s) (log: {log_path})")
+        proc, client = start_gunicorn(args.start, dict(os.environ), log_path)
+        host, port = "127.0.0.1", client.port
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+
+    print(f"[*] {args.profile}: {args.duration:.0f}s against {host}:{port}, peak {profile['peak_rps']} req/s")
+    recorder = Recorder()
+    try:
+        elapsed = asyncio.run(run_load(host, port, profile, args.duration, args.seed, args.timeout,
+                                       args.max_inflight, recorder))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    endpoints = endpoint_report(recorder)
+    windows = window_report(recorder, args.window, args.duration, args.slo_ms, args.max_error_rate)
+    saturation = saturation_summary(windows)
+
+    for call, stats in endpoints.items():
+        print(f"  {call:16s} {stats['requests']:7d} req  errors {stats['error_rate']:6.1%}  "
+              f"p50 {stats.get('p50_ms', 0):8.1f}  p95 {stats.get('p95_ms', 0):8.1f}  p99 {stats.get('p99_ms', 0):8.1f} ms")
+    for w in windows:
+        flag = f"  SATURATED ({', '.join(w['reasons'])})" if w["saturated"] else ""
+        print(f"  t={w['start_s']:4d}s offered {w['offered_rps']:7.1f}  achieved {w['achieved_rps']:7.1f} req/s  "
+              f"p95 {w.get('p95_ms', 0):8.1f} ms  errors {w['error_rate']:6.1%}{flag}")
+    if saturation["capacity_rps"] is not None:
+        print(f"[OK] Highest unsaturated offered rate: {saturation['capacity_rps']} req/s "
+              f"(peak in-flight {recorder.peak_inflight})")
+    if saturation["first_saturated_window"]:
+        first = saturation["first_saturated_window"]
+        print(f"[WARN] Saturated from t={first['start_s']}s at {first['offered_rps']} req/s offered")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "started_at": datetime.now(timezone.utc).isoformat(),
+                    "profile": args.profile,
+                    "profile_config": profile,
+                    "duration_s": args.duration,
+                    "elapsed_s": round(elapsed, 2),
+                    "target": f"{host}:{port}",
+                    "slo_ms": args.slo_ms,
+                    "max_error_rate": args.max_error_rate,
+                    "seed": args.seed,
+                },
+                "endpoints": endpoints,
+                "windows": windows,
+                "saturation": dict(saturation, peak_inflight=recorder.peak_inflight),
+            }, f, indent=2)
+        print(f"[OK] Report -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
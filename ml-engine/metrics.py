@@ -0,0 +1,176 @@
+"""
+Request, stage and model metrics in Prometheus text format.
+Every thread records into its own counter / histogram dicts, so the hot
+path takes no locks; /api/metrics sums the per-thread tables when scraped.
+Tables of threads that have exited (the dev server starts one per
+request) are folded into one retired table, so memory and scrape cost
+follow the number of live threads, not the requests served.
+Values are per process: under gunicorn each worker reports its own.
+"""
+
+import bisect
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HELP = {
+    "ml_requests_total": ("counter", "HTTP requests handled, by endpoint and status code."),
+    "ml_request_errors_total": ("counter", "HTTP requests that returned a 5xx status, by endpoint."),
+    "ml_request_duration_seconds": ("histogram", "End-to-end request latency, by endpoint."),
+    "ml_stage_duration_seconds": ("histogram", "Time spent per request stage, by endpoint and stage."),
+}
+
+# (weakref to owning thread, table) per thread that has recorded anything
+_tables = []
+_tables_lock = threading.Lock()
+_local = threading.local()
+_gauges = {}
+
+
+class _ThreadTable:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def merge(self, other):
+        """Add other's counts into this table."""
+        # dict() copies are atomic under the GIL, so no lock is needed
+        for key, value in dict(other.counters).items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, hist in dict(other.histograms).items():
+            total = self.histograms.setdefault(key, [0] * len(hist[:-1]) + [0.0])
+            for i, v in enumerate(list(hist)):
+                total[i] += v
+
+
+# Counts of threads that have exited
+_retired = _ThreadTable()
+
+
+def _reap():
+    """Fold the tables of exited threads into _retired; caller holds _tables_lock."""
+    live = []
+    for thread_ref, table in _tables:
+        thread = thread_ref()
+        if thread is not None and thread.is_alive():
+            live.append((thread_ref, table))
+        else:
+            # Its thread can't write any more, so merging is race-free
+            _retired.merge(table)
+    _tables[:] = live
+
+
+def _table():
+    table = getattr(_local, "table", None)
+    if table is None:
+        table = _local.table = _ThreadTable()
+        with _tables_lock:
+            _reap()
+            _tables.append((weakref.ref(threading.current_thread()), table))
+    return table
+
+
+def inc(name, labels=(), value=1):
+    counters = _table().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, seconds, labels=()):
+    histograms = _table().histograms
+    key = (name, labels)
+    hist = histograms.get(key)
+    if hist is None:
+        # [per-bucket counts..., +Inf count, sum]
+        hist = histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+    hist[bisect.bisect_left(BUCKETS, seconds)] += 1
+    hist[-1] += seconds
+
+
+def set_endpoint(endpoint):
+    """Label subsequent stage timings on this thread with endpoint."""
+    _local.endpoint = endpoint
+
+
+def current_endpoint():
+    return getattr(_local, "endpoint", None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        endpoint = getattr(_local, "endpoint", None) or "none"
+        observe("ml_stage_duration_seconds", time.perf_counter() - start, (("endpoint", endpoint), ("stage", name)))
+
+
+def register_gauge(name, kind, help_text, collect):
+    """
+    Register a metric computed at scrape time. collect() returns a list of
+    (labels, value) pairs, labels being a tuple of (key, value) pairs.
+    """
+    _gauges[name] = (kind, help_text, collect)
+
+
+def _format_labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    total = _ThreadTable()
+    with _tables_lock:
+        _reap()
+        total.merge(_retired)
+        tables = [table for _, table in _tables]
+    for table in tables:
+        total.merge(table)
+    counters, histograms = total.counters, total.histograms
+
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append(("counter", labels, value))
+    for (name, labels), hist in histograms.items():
+        by_name.setdefault(name, []).append(("histogram", labels, hist))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = HELP.get(name, (by_name[name][0][0], name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for _, labels, value in sorted(by_name[name], key=lambda item: item[1]):
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), value[:-1]):
+                cumulative += count
+                le = (("le", _format_value(bound) if bound == float("inf") else repr(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+    for name, (kind, help_text, collect) in sorted(_gauges.items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in collect():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,193 @@
+"""
+Versioned model registry with hot reload.
+Tracks which file each model was loaded from (path, sha256, mtime, size,
+training metadata). New versions are loaded and warmed next to the one in
+service and then swapped in with a single dict assignment, so in-flight
+requests finish on the old version and nothing pays a cold start.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_metadata(path):
+    """Training metadata sidecar (<stem>.meta.json) for a model file, if any."""
+    meta_path = os.path.splitext(path)[0] + ".meta.json"
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+class ModelVersion:
+    """One loaded version of a model and the file it came from."""
+
+    def __init__(self, name, version, path, load_seconds):
+        stat = os.stat(path)
+        self.name = name
+        self.version = version
+        self.path = path
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.sha256 = file_sha256(path)
+        self.metadata = read_metadata(path)
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+
+    @property
+    def fingerprint(self):
+        return (self.path, self.mtime_ns, self.size)
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "file": os.path.basename(self.path),
+            "sha256": self.sha256,
+            "mtime": datetime.fromtimestamp(self.mtime_ns / 1e9, timezone.utc).isoformat(),
+            "size_bytes": self.size,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 4),
+            "metadata": self.metadata,
+        }
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+class ModelRegistry:
+    """
+    Serves the current version of each named model.
+    resolve(name) -> path of the file to load (or None if missing)
+    load(name, path) -> ready-to-serve model
+    warm(model) -> run a dummy prediction before the model takes traffic
+    on_swap(name) -> called after a new version is swapped in
+    """
+
+    def __init__(self, names, resolve, load, warm=None, on_swap=None):
+        self.names = list(names)
+        self.models = {}
+        self.versions = {}
+        self.errors = {}
+        # name -> (model, ModelVersion), replaced as one so a reader never
+        # pairs a model with another version's details
+        self._current = {}
+        self._resolve = resolve
+        self._load = load
+        self._warm = warm
+        self._on_swap = on_swap
+        # One lock per model so concurrent threads never load the same file twice
+        self._locks = {name: threading.Lock() for name in self.names}
+        self._watcher = None
+
+    def get(self, name):
+        """Current model for name, loading it on first use."""
+        if name in self.models:
+            return self.models[name]
+        if name not in self._locks:
+            return None
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited
+            if name not in self.models:
+                self._load_version(name)
+        return self.models[name]
+
+    def _load_version(self, name):
+        # Caller holds self._locks[name]
+        path = self._resolve(name)
+        if path is None:
+            self.models.setdefault(name, None)
+            return False
+
+        start = time.perf_counter()
+        try:
+            model = self._load(name, path)
+            if model is not None and self._warm is not None:
+                self._warm(model)
+        except Exception as e:
+            # Keep serving whatever version we had
+            self.errors[name] = f"{type(e).__name__}: {e}"
+            print(f"[WARN] Failed to load {name} from {path}: {e}")
+            self.models.setdefault(name, None)
+            return False
+        current = self.versions.get(name)
+        version = ModelVersion(name, current.version + 1 if current else 1, path, time.perf_counter() - start)
+
+        # Atomic swap: requests that already hold the old model finish on it
+        self.models[name] = model
+        self.versions[name] = version
+        self._current[name] = (model, version)
+        self.errors.pop(name, None)
+        if self._on_swap is not None:
+            self._on_swap(name)
+        return True
+
+    def version_of(self, name, model):
+        """ModelVersion of model if it is the version of name in service, else None."""
+        current = self._current.get(name)
+        return current[1] if current is not None and current[0] is model else None
+
+    def changed(self, name):
+        """Whether the file that would be loaded for name differs from the one in service."""
+        path = self._resolve(name)
+        if path is None:
+            return False
+        current = self.versions.get(name)
+        return current is None or current.fingerprint != file_fingerprint(path)
+
+    def reload(self, names=None, force=False):
+        """Load, warm and swap in new versions; returns the names swapped."""
+        reloaded = []
+        for name in names or self.names:
+            if name not in self._locks:
+                continue
+            with self._locks[name]:
+                if (force or self.changed(name)) and self._load_version(name):
+                    reloaded.append(name)
+        if reloaded:
+            print(f"[OK] Reloaded models: {', '.join(reloaded)}")
+        return reloaded
+
+    def reload_async(self, names=None, force=False):
+        thread = threading.Thread(target=self.reload, args=(names, force), daemon=True)
+        thread.start()
+        return thread
+
+    def start_watcher(self, interval):
+        """Poll model files every interval seconds and hot-swap changed ones."""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"[WARN] Model watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def describe(self):
+        return {
+            name: {
+                **(self.versions[name].to_dict() if name in self.versions else {"version": None}),
+                "loaded": self.models.get(name) is not None,
+                "error": self.errors.get(name),
+            }
+            for name in self.names
+        }
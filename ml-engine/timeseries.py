@@ -0,0 +1,253 @@
+"""
+In-process rolling-window time-series store.
+Keeps one ring buffer of time buckets per (warehouse, metric) and window
+(1h, 24h, 7d), each with a running sum and count, so adding a point and
+reading a window mean are O(1) no matter how much history is held.
+Windows are exact to one bucket (1 minute, 15 minutes and 1 hour
+respectively): points drop out a bucket at a time.
+
+The store is per process. Under gunicorn each worker keeps its own copy,
+so fill it from a snapshot export at startup (ML_SERIES_SNAPSHOTS) and
+send live updates to every worker, or run a single worker. complete_since
+records from when the store has seen every point, and describe() flags
+the windows that reach back no further than that; callers with another
+source of history (the backend's metric_snapshots scan) should only
+trust complete windows.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# name -> (span in seconds, number of buckets)
+WINDOWS = {
+    "1h": (3600, 60),
+    "24h": (86400, 96),
+    "7d": (7 * 86400, 168),
+}
+
+
+def parse_timestamp(value):
+    """Epoch seconds from epoch seconds, a datetime or an ISO 8601 string."""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    raise ValueError(f"Unsupported timestamp: {value!r}")
+
+
+class RollingWindow:
+    """Sum and count of the points in the last span seconds, bucketed."""
+
+    def __init__(self, span, n_buckets):
+        self.span = span
+        self.n_buckets = n_buckets
+        self.width = span / n_buckets
+        self.sums = [0.0] * n_buckets
+        self.counts = [0] * n_buckets
+        self.total = 0.0
+        self.count = 0
+        self.head = None  # absolute index of the newest bucket
+
+    def _advance(self, index):
+        """Move the newest bucket to index, expiring the buckets it passes."""
+        if self.head is None or index >= self.head + self.n_buckets:
+            self.sums = [0.0] * self.n_buckets
+            self.counts = [0] * self.n_buckets
+            self.total = 0.0
+            self.count = 0
+            self.head = index
+            return
+        for i in range(self.head + 1, index + 1):
+            slot = i % self.n_buckets
+            self.total -= self.sums[slot]
+            self.count -= self.counts[slot]
+            self.sums[slot] = 0.0
+            self.counts[slot] = 0
+        if self.count == 0:
+            # Don't let float error accumulate in an empty window
+            self.total = 0.0
+        self.head = max(self.head, index)
+
+    def add(self, t, value):
+        """Add a point at epoch time t; points older than the window are dropped."""
+        index = int(t // self.width)
+        if self.head is None or index > self.head:
+            self._advance(index)
+        elif index <= self.head - self.n_buckets:
+            return False
+        slot = index % self.n_buckets
+        self.sums[slot] += value
+        self.counts[slot] += 1
+        self.total += value
+        self.count += 1
+        return True
+
+    def expire(self, now):
+        if self.head is not None and int(now // self.width) > self.head:
+            self._advance(int(now // self.width))
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class _Series:
+    def __init__(self, windows):
+        self.windows = {name: RollingWindow(span, n) for name, (span, n) in windows.items()}
+        self.last_value = None
+        self.last_time = None
+
+    def add(self, t, value):
+        for window in self.windows.values():
+            window.add(t, value)
+        if self.last_time is None or t >= self.last_time:
+            self.last_time = t
+            self.last_value = value
+
+
+class TimeSeriesStore:
+    """Rolling 1h / 24h / 7d windows per (warehouse_id, metric_id)."""
+
+    def __init__(self, windows=WINDOWS):
+        self.window_spec = dict(windows)
+        self.points = 0
+        self.oldest = None
+        # Every point from here on arrives as a live update; None once some
+        # of them may go elsewhere (another gunicorn worker)
+        self.complete_since = time.time()
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._series)
+
+    def add(self, warehouse_id, metric_id, value, timestamp=None):
+        """Record one observation (timestamp defaults to now)."""
+        t = parse_timestamp(timestamp)
+        value = float(value)
+        key = (str(warehouse_id), str(metric_id))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.window_spec)
+            series.add(t, value)
+            self.points += 1
+            if self.oldest is None or t < self.oldest:
+                self.oldest = t
+
+    def add_many(self, events):
+        """
+        Record a list of {"warehouse_id", "metric_id", "value", "timestamp"}
+        events. Returns a list with an error message (or None) per event.
+        """
+        errors = []
+        for event in events:
+            try:
+                self.add(event["warehouse_id"], event["metric_id"], event["value"], event.get("timestamp"))
+                errors.append(None)
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f"{type(e).__name__}: {e}")
+        return errors
+
+    def mean(self, warehouse_id, metric_id, window="7d", now=None):
+        """Mean of the window ending now, or None if it holds no points."""
+        now = time.time() if now is None else now
+        with self._lock:
+            series = self._series.get((str(warehouse_id), str(metric_id)))
+            if series is None:
+                return None
+            rolling = series.windows[window]
+            rolling.expire(now)
+            return rolling.mean()
+
+    def covers(self, window, now=None):
+        """Whether the store has seen every point of the window ending now."""
+        now = time.time() if now is None else now
+        return self.complete_since is not None and self.complete_since <= now - self.window_spec[window][0]
+
+    def describe(self, warehouse_id, metric_id, now=None):
+        """Mean, point count and completeness of every window, plus the latest value."""
+        now = time.time() if now is None else now
+        with self._lock:
+            series = self._series.get((str(warehouse_id), str(metric_id)))
+            if series is None:
+                return None
+            windows = {}
+            for name, rolling in series.windows.items():
+                rolling.expire(now)
+                mean = rolling.mean()
+                windows[name] = {
+                    "mean": round(mean, 4) if mean is not None else None,
+                    "count": rolling.count,
+                    "complete": self.covers(name, now),
+                }
+            return {
+                "warehouse_id": str(warehouse_id),
+                "metric_id": str(metric_id),
+                "last_value": series.last_value,
+                "last_timestamp": (
+                    datetime.fromtimestamp(series.last_time, timezone.utc).isoformat()
+                    if series.last_time is not None else None
+                ),
+                "windows": windows,
+            }
+
+    def stats(self):
+        with self._lock:
+            complete_since = (
+                datetime.fromtimestamp(self.complete_since, timezone.utc).isoformat()
+                if self.complete_since is not None else None
+            )
+            return {"series": len(self._series), "points": self.points, "complete_since": complete_since}
+
+    # ---------------------
+    # Bulk loading
+    # ---------------------
+    def load_snapshots(self, snapshots):
+        """
+        Load rows of a metric_snapshots export. metric_tree is either the
+        full tree ({"poi": {"score": ...}, "otd": {...}, ...}) or the single
+        metric written by /api/ingest ({"id": "poi", "score": ...}), as a
+        dict or a JSON string. Returns the number of points added.
+        """
+        added = 0
+        for snapshot in snapshots:
+            warehouse_id = snapshot.get("warehouse_id")
+            tree = snapshot.get("metric_tree")
+            if isinstance(tree, str):
+                tree = json.loads(tree) if tree.strip() else None
+            if warehouse_id is None or not isinstance(tree, dict):
+                continue
+            t = parse_timestamp(snapshot.get("timestamp"))
+
+            if "id" in tree and "score" in tree:
+                nodes = {tree["id"]: tree}
+            else:
+                nodes = tree
+            for metric_id, node in nodes.items():
+                if isinstance(node, dict) and isinstance(node.get("score"), (int, float)):
+                    self.add(warehouse_id, metric_id, node["score"], t)
+                    added += 1
+        return added
+
+    def load_file(self, path):
+        """Load a snapshot export saved as .json, .ndjson/.jsonl or .csv."""
+        ext = os.path.splitext(path)[1].lower()
+        with open(path, newline="") as f:
+            if ext == ".csv":
+                return self.load_snapshots(csv.DictReader(f))
+            if ext in (".ndjson", ".jsonl"):
+                return self.load_snapshots(json.loads(line) for line in f if line.strip())
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("snapshots", [])
+        return self.load_snapshots(data)
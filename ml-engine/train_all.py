@@ -4,7 +4,8 @@ Run: python train_all.py
 
 Steps:
   1. Generate synthetic datasets (if missing)
-  2. Train all 7 models in sequence
+  2. Load each dataset once, then train all 7 models in parallel
+     (plus the joint anomaly + z-score model with ML_TRAIN_JOINT=1)
   3. Save .pkl files to saved_models/
 """
 
@@ -15,6 +16,84 @@ import time
 ROOT = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, ROOT)
 
+# Training plan: dataset -> training scripts that fit on it. Models don't
+# depend on each other at training time, so every script can run as soon
+# as its dataset is loaded.
+PLAN = {
+    "dataset1_anomaly_detection.csv": ["train_anomaly", "train_zscore"],
+    "dataset2_score_forecasting.csv": ["train_poi_forecast"],
+    "dataset3_rootcause_classifier.csv": ["train_root_cause"],
+    "dataset4_weight_regression.csv": ["train_poi_actual", "train_wpt", "train_otd"],
+}
+
+# The joint anomaly + z-score model (see train_anomaly_joint.py) is opt-in
+if os.environ.get("ML_TRAIN_JOINT", "0") == "1":
+    PLAN["dataset1_anomaly_detection.csv"].append("train_anomaly_joint")
+
+# Datasets loaded by the parent; forked workers read them copy-on-write
+DATASETS = {}
+
+
+def load_datasets(data_dir):
+    """Load every dataset in PLAN exactly once, through the columnar cache."""
+    from dataset import load_dataset
+
+    for name in PLAN:
+        DATASETS[name] = load_dataset(os.path.join(data_dir, name))
+
+
+def plan_cores(n_tasks, cores=None):
+    """
+    Split cores between concurrent trainings and each forest's n_jobs so
+    that workers * n_jobs never exceeds the core count.
+    ML_TRAIN_WORKERS overrides the number of concurrent trainings.
+    """
+    cores = cores or os.cpu_count() or 1
+    workers = int(os.environ.get("ML_TRAIN_WORKERS", 0)) or min(n_tasks, cores)
+    workers = max(1, min(workers, n_tasks, cores))
+    return workers, max(1, cores // workers)
+
+
+def run_training(script, dataset, n_jobs):
+    """Train one model on an already-loaded dataset; returns (script, seconds)."""
+    import importlib
+
+    started = time.time()
+    module = importlib.import_module(f"training_scripts.{script}")
+    module.train(DATASETS[dataset], n_jobs=n_jobs)
+    return script, time.time() - started
+
+
+def train_models(data_dir):
+    """Train every model in PLAN, concurrently where the cores allow."""
+    load_started = time.time()
+    load_datasets(data_dir)
+    print(f"\n[OK] Loaded {len(DATASETS)} datasets in {time.time() - load_started:.1f}s")
+
+    # Biggest datasets first so the longest trainings don't start last
+    tasks = sorted(
+        ((script, dataset) for dataset, scripts in PLAN.items() for script in scripts),
+        key=lambda task: -len(DATASETS[task[1]]),
+    )
+    workers, n_jobs = plan_cores(len(tasks))
+
+    import multiprocessing
+    if workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        print(f"\n[*] Training {len(tasks)} models sequentially (n_jobs={n_jobs})...\n")
+        for script, dataset in tasks:
+            run_training(script, dataset, n_jobs)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    print(f"\n[*] Training {len(tasks)} models on {workers} processes x {n_jobs} forest job(s)...\n")
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(run_training, script, dataset, n_jobs) for script, dataset in tasks]
+        for future in as_completed(futures):
+            script, seconds = future.result()
+            print(f"     {script} took {seconds:.1f}s")
+
 def main():
     print("=" * 60)
     print("  ML Engine -- Master Training Pipeline")
@@ -23,12 +102,7 @@ def main():
 
     # Step 1: Generate datasets if not present
     data_dir = os.path.join(ROOT, "data")
-    datasets = [
-        "dataset1_anomaly_detection.csv",
-        "dataset2_score_forecasting.csv",
-        "dataset3_rootcause_classifier.csv",
-        "dataset4_weight_regression.csv",
-    ]
+    datasets = list(PLAN)
 
     missing = [d for d in datasets if not os.path.exists(os.path.join(data_dir, d))]
     if missing:
@@ -49,23 +123,14 @@ def main():
         print("\n[OK] All datasets already present")
 
     # Step 2: Train all models
-    print("\n[*] Training models...\n")
-
-    from training_scripts.train_anomaly import train as train_anomaly
-    from training_scripts.train_zscore import train as train_zscore
-    from training_scripts.train_poi_forecast import train as train_poi
-    from training_scripts.train_poi_actual import train as train_poi_actual
-    from training_scripts.train_wpt import train as train_wpt
-    from training_scripts.train_otd import train as train_otd
-    from training_scripts.train_root_cause import train as train_root_cause
-
-    train_anomaly()
-    train_zscore()
-    train_poi()
-    train_poi_actual()
-    train_wpt()
-    train_otd()
-    train_root_cause()
+    models_started = time.time()
+    train_models(data_dir)
+    print(f"\n[OK] Training finished in {time.time() - models_started:.1f}s")
+
+    # Step 3: Export memory-mapped serving artifacts (see artifacts.py)
+    print("\n[*] Exporting memory-mapped model artifacts...\n")
+    from artifacts import convert_all
+    convert_all()
 
     elapsed = time.time() - start
 
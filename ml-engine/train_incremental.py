@@ -0,0 +1,201 @@
+"""
+Incremental (warm-start) retraining.
+Instead of refitting a forest from scratch, load the model currently in
+saved_models/, grow extra trees on only the rows added to its dataset
+since the last run, and retire the oldest trees once the forest exceeds
+a cap. The fitted preprocessor is kept as-is so old and new trees see the
+same feature encoding.
+
+Which rows each tree was fitted on is recorded in the model's
+<stem>.meta.json under "tree_windows", oldest first:
+    {"dataset": ..., "rows": [start, stop], "trees": n, "trained_at": ...}
+A model trained by train_all.py counts as one window covering the rows it
+was trained on. The next run starts after the highest row already seen
+from the same dataset, so appending rows to a CSV and rerunning only
+trains on the appended rows.
+
+Usage:
+    python train_incremental.py                      # every saved_models/*.pkl
+    python train_incremental.py Anomaly_model.pkl --add-trees 25 --max-trees 200
+    python train_incremental.py model_otd.pkl --data data/new_rows.csv
+
+The serving registry picks the new pickle / .flat artifact up on its next
+poll (ML_MODEL_WATCH_INTERVAL) or on POST /api/models/reload.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from artifacts import convert
+from dataset import load_dataset
+from fileio import atomic_write
+from forest import scale_outputs
+
+DATA_DIR = os.path.join(ROOT, "data")
+MODELS_DIR = os.path.join(ROOT, "saved_models")
+
+ADD_TREES = int(os.environ.get("ML_INCREMENTAL_TREES", 25))
+MAX_TREES = int(os.environ.get("ML_MAX_TREES", 200))
+
+
+def meta_path(pkl_path):
+    return os.path.splitext(pkl_path)[0] + ".meta.json"
+
+
+def tree_windows(meta):
+    """Per-window tree record, synthesising one for models trained from scratch."""
+    if "tree_windows" in meta:
+        return [dict(w) for w in meta["tree_windows"]]
+    return [{
+        "dataset": meta["dataset"],
+        "rows": [0, meta["rows"]],
+        "trees": meta["n_estimators"],
+        "trained_at": meta.get("trained_at"),
+    }]
+
+
+def next_row(windows, dataset):
+    """First row of dataset that no window has covered yet."""
+    return max((w["rows"][1] for w in windows if w["dataset"] == dataset), default=0)
+
+
+def retire_oldest(windows, n):
+    """Drop the n oldest trees from the window record."""
+    for window in windows:
+        dropped = min(n, window["trees"])
+        window["trees"] -= dropped
+        n -= dropped
+    return [w for w in windows if w["trees"] > 0]
+
+
+def grow(pkl_path, data_path=None, add_trees=ADD_TREES, max_trees=MAX_TREES, n_jobs=-1):
+    """
+    Add add_trees trees fitted on the new rows of the model's dataset,
+    then keep only the newest max_trees. Returns the number of trees
+    added (0 if there were no new rows).
+    """
+    with open(pkl_path, "rb") as f:
+        pipeline = pickle.load(f)
+    with open(meta_path(pkl_path)) as f:
+        meta = json.load(f)
+    if "target" not in meta or "dataset" not in meta:
+        raise ValueError(f"{os.path.basename(meta_path(pkl_path))} has no dataset/target; retrain from scratch")
+    if add_trees >= max_trees:
+        raise ValueError(f"add_trees ({add_trees}) must be below max_trees ({max_trees})")
+
+    data_path = data_path or os.path.join(DATA_DIR, meta["dataset"])
+    dataset = os.path.basename(data_path)
+    features = list(pipeline.feature_names_in_)
+    # Multi-output models (train_anomaly_joint.py) list several targets
+    target = meta["target"]
+    targets = target if isinstance(target, list) else [target]
+    df = load_dataset(data_path, columns=features + targets)
+
+    windows = tree_windows(meta)
+    start = next_row(windows, dataset)
+    if len(df) <= start:
+        print(f"  [OK] {os.path.basename(pkl_path)}: no new rows in {dataset} (seen {start:,})")
+        return 0
+    new = df.iloc[start:]
+    X = new[features]
+    y = new[targets].astype(float) if isinstance(target, list) else new[target]
+
+    forest = pipeline.steps[-1][1]
+    # Multi-output models fitted on standardized targets (train_anomaly_joint.py)
+    scale = np.asarray(meta["target_scale"], dtype=np.float64) if "target_scale" in meta else None
+    if scale is not None:
+        y = y / scale
+    if hasattr(forest, "classes_"):
+        # The new trees' class columns must line up with the old trees'
+        seen = set(y.unique().tolist())
+        missing = [c for c in forest.classes_.tolist() if c not in seen]
+        unknown = sorted(str(c) for c in seen.difference(forest.classes_.tolist()))
+        if missing or unknown:
+            raise ValueError(f"new rows must cover exactly the model's classes "
+                             f"(missing {missing}, unknown {unknown}); retrain from scratch")
+
+    # Same feature encoding as the existing trees: transform, don't refit
+    Xt = pipeline[:-1].transform(X)
+    generation = meta.get("generation", 0) + 1
+    n_old = len(forest.estimators_)
+    forest.set_params(
+        warm_start=True,
+        n_estimators=len(forest.estimators_) + add_trees,
+        random_state=42 + generation,  # fresh bootstrap / feature draws per run
+        n_jobs=n_jobs,
+    )
+    forest.fit(Xt, y)
+    if scale is not None:
+        scale_outputs(forest.estimators_[n_old:], scale)
+
+    windows.append({
+        "dataset": dataset,
+        "rows": [start, len(df)],
+        "trees": add_trees,
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+    })
+    excess = len(forest.estimators_) - max_trees
+    if excess > 0:
+        forest.estimators_ = forest.estimators_[excess:]
+        windows = retire_oldest(windows, excess)
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+
+    meta.update(
+        trained_at=datetime.now(timezone.utc).isoformat(),
+        rows=sum(w["rows"][1] - w["rows"][0] for w in windows),
+        n_estimators=len(forest.estimators_),
+        generation=generation,
+        tree_windows=windows,
+    )
+    # The model watcher only ever picks up complete files
+    with atomic_write(pkl_path) as f:
+        pickle.dump(pipeline, f)
+    with atomic_write(meta_path(pkl_path), "w") as f:
+        json.dump(meta, f, indent=2)
+    try:
+        convert(pkl_path)
+    except (ValueError, AttributeError) as e:
+        print(f"  [WARN] {os.path.basename(pkl_path)}: not convertible ({e})")
+
+    retired = f", retired {excess}" if excess > 0 else ""
+    print(f"  [OK] {os.path.basename(pkl_path)}: +{add_trees} trees on rows {start:,}-{len(df):,} "
+          f"of {dataset}{retired} -> {len(forest.estimators_)} trees")
+    return add_trees
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grow saved models with trees fitted on new data only.")
+    parser.add_argument("models", nargs="*", help="model files in saved_models/ (default: every .pkl)")
+    parser.add_argument("--data", help="dataset to read new rows from (default: the model's training dataset)")
+    parser.add_argument("--add-trees", type=int, default=ADD_TREES, help=f"trees to add per model (default {ADD_TREES})")
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES,
+                        help=f"forest size cap; oldest trees are retired beyond it (default {MAX_TREES})")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="forest n_jobs while fitting (default -1)")
+    args = parser.parse_args(argv)
+
+    names = args.models or sorted(f for f in os.listdir(MODELS_DIR) if f.endswith(".pkl"))
+    print(f"[*] Incremental training of {len(names)} model(s)...")
+    started = time.time()
+    failed = 0
+    for name in names:
+        try:
+            grow(os.path.join(MODELS_DIR, name), args.data, args.add_trees, args.max_trees, args.n_jobs)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"  [WARN] {name}: {e}")
+            failed += 1
+    print(f"[OK] Done in {time.time() - started:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
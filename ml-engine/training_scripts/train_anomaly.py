@@ -4,9 +4,11 @@ Input: dataset1_anomaly_detection.csv
 Output: saved_models/Anomaly_model.pkl
 """
 
-import pandas as pd
 import pickle
+import json
 import os
+import sys
+from datetime import datetime, timezone
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.pipeline import Pipeline
@@ -17,26 +19,48 @@ DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__
 MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "saved_models")
 os.makedirs(MODELS_DIR, exist_ok=True)
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import load_dataset
+
+DATASET = "dataset1_anomaly_detection.csv"
+# Fitted preprocessor shared with the z-score model
+PREPROCESSOR = "dataset1_features"
+
 num_features = ["hour_of_day", "day_of_week", "score", "orders_volume", "staff_count", "rolling_avg_7d"]
 cat_features = ["warehouse_id", "metric_id"]
 
-def train():
-    df = pd.read_csv(os.path.join(DATA_DIR, "dataset1_anomaly_detection.csv"))
+def build_model(n_jobs=-1):
+    """The unfitted pipeline (also used by compare_joint.py)."""
+    num_pipe = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
+    cat_pipe = Pipeline([("imputer", SimpleImputer(strategy="most_frequent")), ("encoder", OneHotEncoder(handle_unknown="ignore"))])
+    preprocessor = ColumnTransformer([("num", num_pipe, num_features), ("cat", cat_pipe, cat_features)])
+    return Pipeline([("preprocessor", preprocessor), ("model", RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs))])
+
+def train(df=None, n_jobs=-1):
+    """Fit and save the model; df is the already-loaded dataset, if any."""
+    if df is None:
+        df = load_dataset(os.path.join(DATA_DIR, DATASET))
     df.columns = df.columns.str.lower().str.strip()
 
     X = df[num_features + cat_features]
     y = df["is_anomaly"]
 
-    num_pipe = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
-    cat_pipe = Pipeline([("imputer", SimpleImputer(strategy="most_frequent")), ("encoder", OneHotEncoder(handle_unknown="ignore"))])
-    preprocessor = ColumnTransformer([("num", num_pipe, num_features), ("cat", cat_pipe, cat_features)])
-
-    model = Pipeline([("preprocessor", preprocessor), ("model", RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1))])
+    model = build_model(n_jobs)
     model.fit(X, y)
 
     path = os.path.join(MODELS_DIR, "Anomaly_model.pkl")
     with open(path, "wb") as f:
         pickle.dump(model, f)
+    with open(os.path.join(MODELS_DIR, "Anomaly_model.meta.json"), "w") as f:
+        json.dump({
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+            "dataset": DATASET,
+            "rows": len(df),
+            "features": num_features + cat_features,
+            "target": "is_anomaly",
+            "n_estimators": 100,
+            "preprocessor": PREPROCESSOR,
+        }, f, indent=2)
     print(f"  [OK] Anomaly Detection -> {path}")
     return model
 
@@ -0,0 +1,92 @@
+"""
+Train the joint Anomaly + Z-Score model (multi-output RandomForest Regressor)
+Input: dataset1_anomaly_detection.csv
+Output: saved_models/anomaly_joint_model.pkl
+
+One forest predicts [is_anomaly, z_score] per row: output 0 is the mean
+of the 0/1 anomaly labels in the leaves (the anomaly probability), output
+1 the z-score, so /api/analyze gets both from a single traversal instead
+of running the anomaly classifier and the z-score regressor. Both outputs
+share each split's MSE criterion, so the targets are fitted divided by
+their standard deviations (neither dominates the splits) and the leaf
+values scaled back afterwards: the saved forest predicts raw targets, and
+meta "target_scale" lets train_incremental.py grow it the same way. Optional:
+train_all.py only trains it with ML_TRAIN_JOINT=1, and analyze falls back
+to the separate models when it's absent. compare_joint.py measures its
+accuracy and latency against them.
+"""
+
+import pickle
+import json
+import os
+import sys
+import numpy as np
+from datetime import datetime, timezone
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "saved_models")
+os.makedirs(MODELS_DIR, exist_ok=True)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import load_dataset
+from forest import scale_outputs
+
+DATASET = "dataset1_anomaly_detection.csv"
+# Fitted preprocessor shared with the anomaly and z-score models
+PREPROCESSOR = "dataset1_features"
+
+num_features = ["hour_of_day", "day_of_week", "score", "orders_volume", "staff_count", "rolling_avg_7d"]
+cat_features = ["warehouse_id", "metric_id"]
+targets = ["is_anomaly", "z_score"]
+
+def build_model(n_jobs=-1):
+    """The unfitted pipeline (also used by compare_joint.py)."""
+    num_pipe = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
+    cat_pipe = Pipeline([("imputer", SimpleImputer(strategy="most_frequent")), ("encoder", OneHotEncoder(handle_unknown="ignore"))])
+    preprocessor = ColumnTransformer([("num", num_pipe, num_features), ("cat", cat_pipe, cat_features)])
+    return Pipeline([("preprocessor", preprocessor), ("model", RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs))])
+
+def fit(model, X, y):
+    """Fit model on standardized targets, then rescale its leaves; returns the per-target scales."""
+    scale = y.std().to_numpy(dtype=np.float64, copy=True)
+    scale[~(scale > 0)] = 1.0  # constant target
+    model.fit(X, y / scale)
+    scale_outputs(model.steps[-1][1].estimators_, scale)
+    return scale
+
+def train(df=None, n_jobs=-1):
+    """Fit and save the model; df is the already-loaded dataset, if any."""
+    if df is None:
+        df = load_dataset(os.path.join(DATA_DIR, DATASET))
+    df.columns = df.columns.str.lower().str.strip()
+
+    X = df[num_features + cat_features]
+    y = df[targets].astype(float)
+
+    model = build_model(n_jobs)
+    scale = fit(model, X, y)
+
+    path = os.path.join(MODELS_DIR, "anomaly_joint_model.pkl")
+    with open(path, "wb") as f:
+        pickle.dump(model, f)
+    with open(os.path.join(MODELS_DIR, "anomaly_joint_model.meta.json"), "w") as f:
+        json.dump({
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+            "dataset": DATASET,
+            "rows": len(df),
+            "features": num_features + cat_features,
+            "target": targets,
+            "target_scale": scale.tolist(),
+            "n_estimators": 100,
+            "preprocessor": PREPROCESSOR,
+        }, f, indent=2)
+    print(f"  [OK] Joint Anomaly + Z-Score -> {path}")
+    return model
+
+if __name__ == "__main__":
+    train()
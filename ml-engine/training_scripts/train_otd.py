@@ -4,9 +4,11 @@ Input: dataset4_weight_regression.csv
 Output: saved_models/model_otd.pkl
 """
 
-import pandas as pd
 import pickle
+import json
 import os
+import sys
+from datetime import datetime, timezone
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.pipeline import Pipeline
@@ -17,10 +19,19 @@ DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__
 MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "saved_models")
 os.makedirs(MODELS_DIR, exist_ok=True)
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import load_dataset
+
+DATASET = "dataset4_weight_regression.csv"
+# Fitted preprocessor shared with WPT and POI actual
+PREPROCESSOR = "dataset4_features"
+
 num_features = ["label_score", "pick_score", "pack_score", "wpt_score_actual", "tt_score"]
 
-def train():
-    df = pd.read_csv(os.path.join(DATA_DIR, "dataset4_weight_regression.csv"))
+def train(df=None, n_jobs=-1):
+    """Fit and save the model; df is the already-loaded dataset, if any."""
+    if df is None:
+        df = load_dataset(os.path.join(DATA_DIR, DATASET))
     df.columns = df.columns.str.lower().str.strip()
 
     X = df[num_features]
@@ -29,12 +40,22 @@ def train():
     num_pipe = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
     preprocessor = ColumnTransformer([("num", num_pipe, num_features)])
 
-    model = Pipeline([("preprocessor", preprocessor), ("model", RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1))])
+    model = Pipeline([("preprocessor", preprocessor), ("model", RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs))])
     model.fit(X, y)
 
     path = os.path.join(MODELS_DIR, "model_otd.pkl")
     with open(path, "wb") as f:
         pickle.dump(model, f)
+    with open(os.path.join(MODELS_DIR, "model_otd.meta.json"), "w") as f:
+        json.dump({
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+            "dataset": DATASET,
+            "rows": len(df),
+            "features": num_features,
+            "target": "otd_score_actual",
+            "n_estimators": 100,
+            "preprocessor": PREPROCESSOR,
+        }, f, indent=2)
     print(f"  [OK] OTD Score -> {path}")
     return model
 
@@ -4,9 +4,11 @@ Input: dataset3_rootcause_classifier.csv
 Output: saved_models/root_cause_model.pkl
 """
 
-import pandas as pd
 import pickle
+import json
 import os
+import sys
+from datetime import datetime, timezone
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.pipeline import Pipeline
@@ -17,11 +19,18 @@ DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__
 MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "saved_models")
 os.makedirs(MODELS_DIR, exist_ok=True)
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import load_dataset
+
+DATASET = "dataset3_rootcause_classifier.csv"
+
 num_features = ["poi_score", "label_score", "pick_score", "pack_score", "tt_score", "oa_score", "orders_volume"]
 cat_features = ["warehouse_id", "zone"]
 
-def train():
-    df = pd.read_csv(os.path.join(DATA_DIR, "dataset3_rootcause_classifier.csv"))
+def train(df=None, n_jobs=-1):
+    """Fit and save the model; df is the already-loaded dataset, if any."""
+    if df is None:
+        df = load_dataset(os.path.join(DATA_DIR, DATASET))
     df.columns = df.columns.str.lower().str.strip()
 
     X = df[num_features + cat_features]
@@ -31,12 +40,21 @@ def train():
     cat_pipe = Pipeline([("imputer", SimpleImputer(strategy="most_frequent")), ("encoder", OneHotEncoder(handle_unknown="ignore"))])
     preprocessor = ColumnTransformer([("num", num_pipe, num_features), ("cat", cat_pipe, cat_features)])
 
-    model = Pipeline([("preprocessor", preprocessor), ("classifier", RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1))])
+    model = Pipeline([("preprocessor", preprocessor), ("classifier", RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs))])
     model.fit(X, y)
 
     path = os.path.join(MODELS_DIR, "root_cause_model.pkl")
     with open(path, "wb") as f:
         pickle.dump(model, f)
+    with open(os.path.join(MODELS_DIR, "root_cause_model.meta.json"), "w") as f:
+        json.dump({
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+            "dataset": DATASET,
+            "rows": len(df),
+            "features": num_features + cat_features,
+            "target": "root_cause",
+            "n_estimators": 100,
+        }, f, indent=2)
     print(f"  [OK] Root Cause Classification -> {path}")
     return model
 